@@ -0,0 +1,37 @@
+"""llm response cache
+
+Revision ID: 0df3b3a3e724
+Revises: 387725f571b0
+Create Date: 2026-10-18 11:24:37.102215
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0df3b3a3e724'
+down_revision: Union[str, None] = '387725f571b0'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('llm_cache',
+    sa.Column('key', sa.String(length=64), nullable=False),
+    sa.Column('value', sa.JSON(), nullable=False),
+    sa.Column('size', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('expires_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('key')
+    )
+    op.create_index(op.f('ix_llm_cache_created_at'), 'llm_cache', ['created_at'], unique=False)
+    op.create_index(op.f('ix_llm_cache_expires_at'), 'llm_cache', ['expires_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_llm_cache_expires_at'), table_name='llm_cache')
+    op.drop_index(op.f('ix_llm_cache_created_at'), table_name='llm_cache')
+    op.drop_table('llm_cache')
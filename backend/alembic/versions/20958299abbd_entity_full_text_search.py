@@ -0,0 +1,114 @@
+"""entity full text search
+
+Revision ID: 20958299abbd
+Revises: 954d1d3d9470
+Create Date: 2026-10-18 12:31:56.870412
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '20958299abbd'
+down_revision: Union[str, None] = '954d1d3d9470'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+POSTGRES_SEARCH_CONFIG = 'english'
+
+# entities_fts, kept in sync with entities by triggers
+SQLITE_SEARCH_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS entities_fts USING fts5(
+        name, description, attributes, tokenize = 'porter unicode61'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS entities_fts_insert AFTER INSERT ON entities
+    BEGIN
+        INSERT INTO entities_fts (rowid, name, description, attributes)
+        VALUES (
+            new.rowid,
+            new.name,
+            coalesce(new.description, ''),
+            (SELECT coalesce(group_concat(value, ' '), '')
+             FROM json_tree(new.attributes) WHERE type = 'text')
+        );
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS entities_fts_update AFTER UPDATE ON entities
+    BEGIN
+        DELETE FROM entities_fts WHERE rowid = old.rowid;
+        INSERT INTO entities_fts (rowid, name, description, attributes)
+        VALUES (
+            new.rowid,
+            new.name,
+            coalesce(new.description, ''),
+            (SELECT coalesce(group_concat(value, ' '), '')
+             FROM json_tree(new.attributes) WHERE type = 'text')
+        );
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS entities_fts_delete AFTER DELETE ON entities
+    BEGIN
+        DELETE FROM entities_fts WHERE rowid = old.rowid;
+    END
+    """,
+    # Index rows written before the triggers existed
+    """
+    INSERT INTO entities_fts (rowid, name, description, attributes)
+    SELECT
+        entities.rowid,
+        entities.name,
+        coalesce(entities.description, ''),
+        (SELECT coalesce(group_concat(value, ' '), '')
+         FROM json_tree(entities.attributes) WHERE type = 'text')
+    FROM entities
+    WHERE entities.rowid NOT IN (SELECT rowid FROM entities_fts)
+    """,
+]
+
+SQLITE_SEARCH_TEARDOWN = [
+    'DROP TRIGGER IF EXISTS entities_fts_delete',
+    'DROP TRIGGER IF EXISTS entities_fts_update',
+    'DROP TRIGGER IF EXISTS entities_fts_insert',
+    'DROP TABLE IF EXISTS entities_fts',
+]
+
+
+def upgrade() -> None:
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        op.execute(f"""
+            ALTER TABLE entities ADD COLUMN search_vector tsvector
+            GENERATED ALWAYS AS (
+                setweight(to_tsvector('{POSTGRES_SEARCH_CONFIG}', coalesce(name, '')), 'A')
+                || setweight(to_tsvector('{POSTGRES_SEARCH_CONFIG}', coalesce(description, '')), 'B')
+                || setweight(jsonb_to_tsvector('{POSTGRES_SEARCH_CONFIG}', attributes::jsonb, '["string"]'), 'C')
+            ) STORED
+        """)
+        op.create_index(
+            'ix_entities_search_vector',
+            'entities',
+            ['search_vector'],
+            postgresql_using='gin',
+        )
+    elif dialect == 'sqlite':
+        for statement in SQLITE_SEARCH_DDL:
+            op.execute(statement)
+
+
+def downgrade() -> None:
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        op.drop_index('ix_entities_search_vector', table_name='entities')
+        op.drop_column('entities', 'search_vector')
+    elif dialect == 'sqlite':
+        for statement in SQLITE_SEARCH_TEARDOWN:
+            op.execute(statement)
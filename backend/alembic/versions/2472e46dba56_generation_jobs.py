@@ -0,0 +1,44 @@
+"""generation jobs
+
+Revision ID: 2472e46dba56
+Revises: 0df3b3a3e724
+Create Date: 2026-10-18 11:48:09.553810
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2472e46dba56'
+down_revision: Union[str, None] = '0df3b3a3e724'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('generation_jobs',
+    sa.Column('id', sa.UUID(), nullable=False),
+    sa.Column('batch_id', sa.UUID(), nullable=False),
+    sa.Column('entity_id', sa.UUID(), nullable=False),
+    sa.Column('provider', sa.String(), nullable=False),
+    sa.Column('status', sa.Enum('PENDING', 'RUNNING', 'SUCCEEDED', 'FAILED', name='jobstatus', native_enum=False), nullable=False),
+    sa.Column('fresh', sa.Boolean(), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('error', sa.String(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('started_at', sa.DateTime(), nullable=True),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['entity_id'], ['entities.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_generation_jobs_batch_id'), 'generation_jobs', ['batch_id'], unique=False)
+    op.create_index(op.f('ix_generation_jobs_status'), 'generation_jobs', ['status'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_generation_jobs_status'), table_name='generation_jobs')
+    op.drop_index(op.f('ix_generation_jobs_batch_id'), table_name='generation_jobs')
+    op.drop_table('generation_jobs')
@@ -0,0 +1,39 @@
+"""entity revisions
+
+Revision ID: 26e1a28ec360
+Revises: 8d82d72970fd
+Create Date: 2026-10-18 15:21:36.118402
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '26e1a28ec360'
+down_revision: Union[str, None] = '8d82d72970fd'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Existing entities get their first revision, holding what they were
+    # before, the next time they change
+    op.create_table('entity_revisions',
+    sa.Column('world_id', sa.UUID(), nullable=False),
+    sa.Column('entity_id', sa.UUID(), nullable=False),
+    sa.Column('revision', sa.Integer(), nullable=False),
+    sa.Column('snapshot', sa.Boolean(), nullable=False),
+    sa.Column('data', sa.JSON().with_variant(postgresql.JSONB(astext_type=sa.Text()), 'postgresql'), nullable=False),
+    sa.Column('source', sa.String(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['world_id', 'entity_id'], ['entities.world_id', 'entities.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('world_id', 'entity_id', 'revision')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('entity_revisions')
@@ -0,0 +1,32 @@
+"""entity keyset pagination indexes
+
+Revision ID: 387725f571b0
+Revises: 2edb4661f46c
+Create Date: 2026-10-18 11:05:12.431907
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '387725f571b0'
+down_revision: Union[str, None] = '2edb4661f46c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_entities_created_at_id', 'entities', ['created_at', 'id'])
+    op.create_index(
+        'ix_entities_type_id_created_at_id',
+        'entities',
+        ['type_id', 'created_at', 'id'],
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_entities_type_id_created_at_id', table_name='entities')
+    op.drop_index('ix_entities_created_at_id', table_name='entities')
@@ -0,0 +1,133 @@
+"""entity versions
+
+Revision ID: 611f4fb2d3f1
+Revises: 26e1a28ec360
+Create Date: 2026-10-18 16:02:47.853190
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "611f4fb2d3f1"
+down_revision: Union[str, None] = "26e1a28ec360"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# entities_fts and its triggers, as created by the full-text search migration
+SQLITE_SEARCH_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS entities_fts USING fts5(
+        name, description, attributes, tokenize = 'porter unicode61'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS entities_fts_insert AFTER INSERT ON entities
+    BEGIN
+        INSERT INTO entities_fts (rowid, name, description, attributes)
+        VALUES (
+            new.rowid,
+            new.name,
+            coalesce(new.description, ''),
+            (SELECT coalesce(group_concat(value, ' '), '')
+             FROM json_tree(new.attributes) WHERE type = 'text')
+        );
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS entities_fts_update AFTER UPDATE ON entities
+    BEGIN
+        DELETE FROM entities_fts WHERE rowid = old.rowid;
+        INSERT INTO entities_fts (rowid, name, description, attributes)
+        VALUES (
+            new.rowid,
+            new.name,
+            coalesce(new.description, ''),
+            (SELECT coalesce(group_concat(value, ' '), '')
+             FROM json_tree(new.attributes) WHERE type = 'text')
+        );
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS entities_fts_delete AFTER DELETE ON entities
+    BEGIN
+        DELETE FROM entities_fts WHERE rowid = old.rowid;
+    END
+    """,
+    # Index rows written before the triggers existed
+    """
+    INSERT INTO entities_fts (rowid, name, description, attributes)
+    SELECT
+        entities.rowid,
+        entities.name,
+        coalesce(entities.description, ''),
+        (SELECT coalesce(group_concat(value, ' '), '')
+         FROM json_tree(entities.attributes) WHERE type = 'text')
+    FROM entities
+    WHERE entities.rowid NOT IN (SELECT rowid FROM entities_fts)
+    """,
+]
+
+SQLITE_SEARCH_TEARDOWN = [
+    "DROP TRIGGER IF EXISTS entities_fts_delete",
+    "DROP TRIGGER IF EXISTS entities_fts_update",
+    "DROP TRIGGER IF EXISTS entities_fts_insert",
+    "DROP TABLE IF EXISTS entities_fts",
+]
+
+
+def upgrade() -> None:
+    op.add_column(
+        "entities",
+        sa.Column("version", sa.Integer(), server_default="1", nullable=False),
+    )
+
+    # From now on revision N of an entity is its version N + 1, and its latest
+    # revision always matches what is stored. Entities with history continue
+    # from their latest revision...
+    op.execute("""
+        UPDATE entities SET version = (
+            SELECT max(revision) + 1 FROM entity_revisions
+            WHERE entity_revisions.world_id = entities.world_id
+            AND entity_revisions.entity_id = entities.id
+        )
+        WHERE EXISTS (
+            SELECT 1 FROM entity_revisions
+            WHERE entity_revisions.world_id = entities.world_id
+            AND entity_revisions.entity_id = entities.id
+        )
+    """)
+    # ...and the others start it with a snapshot of what they are now
+    if op.get_bind().dialect.name == "postgresql":
+        document = "jsonb_build_object('name', name, 'description', description, 'attributes', attributes)"
+        snapshot = "true"
+    else:
+        document = "json_object('name', name, 'description', description, 'attributes', json(attributes))"
+        snapshot = "1"
+    op.execute(f"""
+        INSERT INTO entity_revisions
+            (world_id, entity_id, revision, snapshot, data, source, created_at)
+        SELECT world_id, id, 0, {snapshot}, {document}, 'initial', updated_at
+        FROM entities
+        WHERE NOT EXISTS (
+            SELECT 1 FROM entity_revisions
+            WHERE entity_revisions.world_id = entities.world_id
+            AND entity_revisions.entity_id = entities.id
+        )
+    """)
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == "postgresql":
+        op.drop_column("entities", "version")
+        return
+    # Rebuilding entities drops its full-text triggers and renumbers rowids
+    for statement in SQLITE_SEARCH_TEARDOWN:
+        op.execute(statement)
+    with op.batch_alter_table("entities") as batch_op:
+        batch_op.drop_column("version")
+    for statement in SQLITE_SEARCH_DDL:
+        op.execute(statement)
@@ -0,0 +1,84 @@
+"""jsonb entity attributes
+
+Revision ID: 6cb10a3cd903
+Revises: 20958299abbd
+Create Date: 2026-10-18 13:05:41.218337
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6cb10a3cd903'
+down_revision: Union[str, None] = '20958299abbd'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# entities.search_vector, as created by the full-text search migration
+POSTGRES_SEARCH_VECTOR = """
+    setweight(to_tsvector('english', coalesce(name, '')), 'A')
+    || setweight(to_tsvector('english', coalesce(description, '')), 'B')
+    || setweight(jsonb_to_tsvector('english', attributes::jsonb, '["string"]'), 'C')
+"""
+
+
+def _recreate_search_vector() -> None:
+    op.execute(f"""
+        ALTER TABLE entities ADD COLUMN search_vector tsvector
+        GENERATED ALWAYS AS ({POSTGRES_SEARCH_VECTOR}) STORED
+    """)
+    op.create_index(
+        'ix_entities_search_vector',
+        'entities',
+        ['search_vector'],
+        postgresql_using='gin',
+    )
+
+
+def upgrade() -> None:
+    op.add_column('entity_types', sa.Column('indexed_attributes', sa.JSON().with_variant(postgresql.JSONB(astext_type=sa.Text()), 'postgresql'), server_default='[]', nullable=False))
+
+    if op.get_bind().dialect.name == 'postgresql':
+        # The generated search column depends on attributes, so it has to be
+        # rebuilt around the type change
+        op.drop_index('ix_entities_search_vector', table_name='entities')
+        op.drop_column('entities', 'search_vector')
+        op.alter_column('entities', 'attributes',
+                   existing_type=sa.JSON(),
+                   type_=postgresql.JSONB(astext_type=sa.Text()),
+                   postgresql_using='attributes::jsonb')
+        op.alter_column('entity_types', 'default_fields',
+                   existing_type=sa.JSON(),
+                   type_=postgresql.JSONB(astext_type=sa.Text()),
+                   postgresql_using='default_fields::jsonb')
+        _recreate_search_vector()
+        op.create_index(
+            'ix_entities_attributes',
+            'entities',
+            ['attributes'],
+            postgresql_using='gin',
+            postgresql_ops={'attributes': 'jsonb_path_ops'},
+        )
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == 'postgresql':
+        op.drop_index('ix_entities_attributes', table_name='entities')
+        op.drop_index('ix_entities_search_vector', table_name='entities')
+        op.drop_column('entities', 'search_vector')
+        op.alter_column('entity_types', 'default_fields',
+                   existing_type=postgresql.JSONB(astext_type=sa.Text()),
+                   type_=sa.JSON(),
+                   postgresql_using='default_fields::json')
+        op.alter_column('entities', 'attributes',
+                   existing_type=postgresql.JSONB(astext_type=sa.Text()),
+                   type_=sa.JSON(),
+                   postgresql_using='attributes::json')
+        _recreate_search_vector()
+
+    op.drop_column('entity_types', 'indexed_attributes')
@@ -0,0 +1,439 @@
+"""worlds
+
+Revision ID: 8d82d72970fd
+Revises: b5e0c2d71f48
+Create Date: 2026-10-18 14:08:51.402196
+
+"""
+from datetime import datetime
+import hashlib
+from typing import Sequence, Union
+import uuid
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8d82d72970fd'
+down_revision: Union[str, None] = 'b5e0c2d71f48'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Existing entity types and entities move to this world
+DEFAULT_WORLD_ID = uuid.UUID('3829d8aa-a63f-401f-9031-e003abd672d6')
+
+# The setting that was hard-coded in app/ai/service.py until now
+DEFAULT_WORLD_SETTING = """
+In the year 2055, humanity stands at a crossroads. The world we once knew has been reshaped by the relentless march of climate change and technological progress. Coastal cities are threatened by frequent floods exacerbated by rising seas, their former inhabitants now unwelcome wanderers in a world grown hostile to the displaced. Europe shivers under an unprecedented deep freeze, while tropical regions are battered by near-constant storms.
+
+The promise of artificial intelligence, once heralded as our salvation, has proven a double-edged sword. Robots and automation have revolutionized industry and daily life, but at a steep environmental cost. The pursuit of ever-more-powerful AI has accelerated climate change, even as it fails to achieve the long-sought goal of artificial general intelligence.
+
+In this brave new world, productivity soars while birthrates plummet. An aging population finds itself increasingly obsolete, retreating into virtual realities and AI companionship. The gap between the tech-savvy elite and those left behind widens daily. Despite unprecedented technological marvels, famine and disease still plague many corners of the globe.
+
+Humanity finds itself paralyzed, caught between complacency and fear. Some cling desperately to the familiar, while others lose themselves in digital escapes. Tensions simmer as nations close their borders to climate refugees, sparking conflicts and humanitarian crises. Yet beneath the surface, a deeper tension builds – a growing realization that something must change. In this world of environmental chaos and technological wonder, a few dare to ask: can we reclaim our humanity and forge a new path forward? Or are we doomed to be swept away by the very forces we've unleashed?
+""".strip()
+
+# SQLite tables are rebuilt to change constraints, which the initial
+# migration left unnamed; these names let batch mode find them
+SQLITE_NAMING_CONVENTION = {
+    'uq': 'uq_%(table_name)s_%(column_0_name)s',
+    'fk': 'fk_%(table_name)s_%(column_0_name)s_%(referred_table_name)s',
+}
+
+JSONDocument = sa.JSON().with_variant(postgresql.JSONB(astext_type=sa.Text()), 'postgresql')
+
+POSTGRES_SEARCH_VECTOR = """
+    setweight(to_tsvector('english', coalesce(name, '')), 'A')
+    || setweight(to_tsvector('english', coalesce(description, '')), 'B')
+    || setweight(jsonb_to_tsvector('english', attributes::jsonb, '["string"]'), 'C')
+"""
+
+SQLITE_SEARCH_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS entities_fts USING fts5(
+        name, description, attributes, tokenize = 'porter unicode61'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS entities_fts_insert AFTER INSERT ON entities
+    BEGIN
+        INSERT INTO entities_fts (rowid, name, description, attributes)
+        VALUES (
+            new.rowid,
+            new.name,
+            coalesce(new.description, ''),
+            (SELECT coalesce(group_concat(value, ' '), '')
+             FROM json_tree(new.attributes) WHERE type = 'text')
+        );
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS entities_fts_update AFTER UPDATE ON entities
+    BEGIN
+        DELETE FROM entities_fts WHERE rowid = old.rowid;
+        INSERT INTO entities_fts (rowid, name, description, attributes)
+        VALUES (
+            new.rowid,
+            new.name,
+            coalesce(new.description, ''),
+            (SELECT coalesce(group_concat(value, ' '), '')
+             FROM json_tree(new.attributes) WHERE type = 'text')
+        );
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS entities_fts_delete AFTER DELETE ON entities
+    BEGIN
+        DELETE FROM entities_fts WHERE rowid = old.rowid;
+    END
+    """,
+    # Index rows written before the triggers existed
+    """
+    INSERT INTO entities_fts (rowid, name, description, attributes)
+    SELECT
+        entities.rowid,
+        entities.name,
+        coalesce(entities.description, ''),
+        (SELECT coalesce(group_concat(value, ' '), '')
+         FROM json_tree(entities.attributes) WHERE type = 'text')
+    FROM entities
+    WHERE entities.rowid NOT IN (SELECT rowid FROM entities_fts)
+    """,
+]
+
+SQLITE_SEARCH_TEARDOWN = [
+    'DROP TRIGGER IF EXISTS entities_fts_delete',
+    'DROP TRIGGER IF EXISTS entities_fts_update',
+    'DROP TRIGGER IF EXISTS entities_fts_insert',
+    'DROP TABLE IF EXISTS entities_fts',
+]
+
+
+def partition_name(table: str, world_id: uuid.UUID) -> str:
+    return f'{table}_{world_id.hex}'
+
+
+def attribute_index_sql(world_id: uuid.UUID, type_id: uuid.UUID, path: str, dialect: str) -> str:
+    """The per-type attribute index indexEntityAttributes builds for ``path``"""
+    digest = hashlib.sha256(f'{type_id}:{path}'.encode()).hexdigest()[:16]
+    keys = path.split('.')
+    if dialect == 'postgresql':
+        # Built on the world's partition, which can be indexed concurrently
+        if len(keys) == 1:
+            expression = f"(attributes ->> '{keys[0]}')"
+        else:
+            expression = f"(attributes #>> '{{{','.join(keys)}}}')"
+        return (
+            f'CREATE INDEX IF NOT EXISTS ix_entities_attr_{digest} '
+            f'ON {partition_name("entities", world_id)} ({expression}) '
+            f"WHERE type_id = '{type_id}'"
+        )
+    return (
+        f'CREATE INDEX IF NOT EXISTS ix_entities_attr_{digest} '
+        f"ON entities (json_extract(attributes, '$.{path}')) "
+        f"WHERE type_id = '{type_id.hex}'"
+    )
+
+
+def _add_world_id(table: str) -> None:
+    """Add a world_id column, with every existing row in the default world"""
+    with op.batch_alter_table(table) as batch_op:
+        batch_op.add_column(sa.Column('world_id', sa.UUID(), nullable=True))
+    op.execute(
+        sa.table(table, sa.column('world_id', sa.UUID()))
+        .update()
+        .values(world_id=DEFAULT_WORLD_ID)
+    )
+    with op.batch_alter_table(table) as batch_op:
+        batch_op.alter_column('world_id', existing_type=sa.UUID(), nullable=False)
+
+
+def _rebuild_attribute_indexes(dialect: str) -> None:
+    """Recreate the per-type attribute indexes lost with the old entities table"""
+    if op.get_context().as_sql:
+        # Which indexes exist depends on the data; --sql output can't know
+        return
+    entity_types = sa.table(
+        'entity_types',
+        sa.column('id', sa.UUID()),
+        sa.column('world_id', sa.UUID()),
+        sa.column('indexed_attributes', JSONDocument),
+    )
+    rows = op.get_bind().execute(
+        sa.select(
+            entity_types.c.id,
+            entity_types.c.world_id,
+            entity_types.c.indexed_attributes,
+        )
+    )
+    for type_id, world_id, paths in rows:
+        for path in paths or []:
+            # Not CONCURRENTLY: migrations run in a transaction
+            op.execute(attribute_index_sql(world_id, type_id, path, dialect))
+
+
+def _upgrade_postgresql() -> None:
+    op.create_foreign_key('entity_types_world_id_fkey', 'entity_types', 'worlds', ['world_id'], ['id'], ondelete='CASCADE')
+    op.drop_constraint('entity_types_name_key', 'entity_types', type_='unique')
+    op.create_unique_constraint('entity_types_world_id_name_key', 'entity_types', ['world_id', 'name'])
+    op.create_unique_constraint('entity_types_world_id_id_key', 'entity_types', ['world_id', 'id'])
+
+    # Partitioned tables can't be created from plain ones in place: move the
+    # old tables aside, create the partitioned ones and copy the rows over
+    op.drop_constraint('entity_relationships_parent_id_fkey', 'entity_relationships', type_='foreignkey')
+    op.drop_constraint('entity_relationships_child_id_fkey', 'entity_relationships', type_='foreignkey')
+    op.drop_constraint('entity_embeddings_entity_id_fkey', 'entity_embeddings', type_='foreignkey')
+    op.drop_constraint('generation_jobs_entity_id_fkey', 'generation_jobs', type_='foreignkey')
+    op.rename_table('entities', 'entities_unpartitioned')
+    op.execute('ALTER TABLE entities_unpartitioned RENAME CONSTRAINT entities_pkey TO entities_unpartitioned_pkey')
+    op.rename_table('entity_relationships', 'entity_relationships_unpartitioned')
+
+    op.create_table('entities',
+    sa.Column('id', sa.UUID(), nullable=False),
+    sa.Column('world_id', sa.UUID(), nullable=False),
+    sa.Column('type_id', sa.UUID(), nullable=False),
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('description', sa.String(), nullable=True),
+    sa.Column('attributes', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['world_id', 'type_id'], ['entity_types.world_id', 'entity_types.id'], ),
+    sa.ForeignKeyConstraint(['world_id'], ['worlds.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('world_id', 'id'),
+    postgresql_partition_by='LIST (world_id)'
+    )
+    op.execute(f"""
+        ALTER TABLE entities ADD COLUMN search_vector tsvector
+        GENERATED ALWAYS AS ({POSTGRES_SEARCH_VECTOR}) STORED
+    """)
+    op.create_table('entity_relationships',
+    sa.Column('world_id', sa.UUID(), nullable=False),
+    sa.Column('parent_id', sa.UUID(), nullable=True),
+    sa.Column('child_id', sa.UUID(), nullable=True),
+    sa.ForeignKeyConstraint(['world_id', 'child_id'], ['entities.world_id', 'entities.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['world_id', 'parent_id'], ['entities.world_id', 'entities.id'], ondelete='CASCADE'),
+    postgresql_partition_by='LIST (world_id)'
+    )
+    for table in ('entities', 'entity_relationships'):
+        op.execute(
+            f"CREATE TABLE {partition_name(table, DEFAULT_WORLD_ID)} "
+            f"PARTITION OF {table} FOR VALUES IN ('{DEFAULT_WORLD_ID}')"
+        )
+
+    op.execute(f"""
+        INSERT INTO entities
+            (id, world_id, type_id, name, description, attributes, created_at, updated_at)
+        SELECT id, '{DEFAULT_WORLD_ID}'::uuid, type_id, name, description, attributes, created_at, updated_at
+        FROM entities_unpartitioned
+    """)
+    op.execute(f"""
+        INSERT INTO entity_relationships (world_id, parent_id, child_id)
+        SELECT '{DEFAULT_WORLD_ID}'::uuid, parent_id, child_id
+        FROM entity_relationships_unpartitioned
+    """)
+    op.drop_table('entity_relationships_unpartitioned')
+    op.drop_table('entities_unpartitioned')
+
+    # Indexes on the parents are created on every partition, current and future
+    op.create_index('ix_entities_world_id_created_at_id', 'entities', ['world_id', 'created_at', 'id'], unique=False)
+    op.create_index('ix_entities_type_id_created_at_id', 'entities', ['type_id', 'created_at', 'id'], unique=False)
+    op.create_index('ix_entities_attributes', 'entities', ['attributes'], unique=False, postgresql_using='gin', postgresql_ops={'attributes': 'jsonb_path_ops'})
+    op.create_index('ix_entities_search_vector', 'entities', ['search_vector'], unique=False, postgresql_using='gin')
+    op.create_index(op.f('ix_entity_relationships_parent_id'), 'entity_relationships', ['parent_id'], unique=False)
+    op.create_index(op.f('ix_entity_relationships_child_id'), 'entity_relationships', ['child_id'], unique=False)
+
+    op.create_foreign_key('entity_embeddings_world_id_entity_id_fkey', 'entity_embeddings', 'entities', ['world_id', 'entity_id'], ['world_id', 'id'], ondelete='CASCADE')
+    op.create_foreign_key('generation_jobs_world_id_entity_id_fkey', 'generation_jobs', 'entities', ['world_id', 'entity_id'], ['world_id', 'id'], ondelete='CASCADE')
+
+
+def _upgrade_sqlite() -> None:
+    with op.batch_alter_table('entity_types', naming_convention=SQLITE_NAMING_CONVENTION) as batch_op:
+        batch_op.create_foreign_key('fk_entity_types_world_id_worlds', 'worlds', ['world_id'], ['id'], ondelete='CASCADE')
+        batch_op.drop_constraint('uq_entity_types_name', type_='unique')
+        batch_op.create_unique_constraint('uq_entity_types_world_id', ['world_id', 'name'])
+        batch_op.create_unique_constraint('uq_entity_types_world_id_id', ['world_id', 'id'])
+
+    # Rebuilding entities drops its full-text triggers and renumbers rowids
+    for statement in SQLITE_SEARCH_TEARDOWN:
+        op.execute(statement)
+    with op.batch_alter_table('entities', naming_convention=SQLITE_NAMING_CONVENTION) as batch_op:
+        batch_op.drop_constraint('fk_entities_type_id_entity_types', type_='foreignkey')
+        batch_op.create_primary_key('pk_entities', ['world_id', 'id'])
+        batch_op.create_foreign_key('fk_entities_world_id_entity_types', 'entity_types', ['world_id', 'type_id'], ['world_id', 'id'])
+        batch_op.create_foreign_key('fk_entities_world_id_worlds', 'worlds', ['world_id'], ['id'], ondelete='CASCADE')
+        batch_op.drop_index('ix_entities_created_at_id')
+        batch_op.create_index('ix_entities_world_id_created_at_id', ['world_id', 'created_at', 'id'], unique=False)
+    for statement in SQLITE_SEARCH_DDL:
+        op.execute(statement)
+
+    with op.batch_alter_table('entity_relationships', naming_convention=SQLITE_NAMING_CONVENTION) as batch_op:
+        batch_op.drop_constraint('fk_entity_relationships_parent_id_entities', type_='foreignkey')
+        batch_op.drop_constraint('fk_entity_relationships_child_id_entities', type_='foreignkey')
+        batch_op.create_foreign_key('fk_entity_relationships_world_id_entities', 'entities', ['world_id', 'parent_id'], ['world_id', 'id'], ondelete='CASCADE')
+        batch_op.create_foreign_key('fk_entity_relationships_world_id_entities_1', 'entities', ['world_id', 'child_id'], ['world_id', 'id'], ondelete='CASCADE')
+    for table in ('entity_embeddings', 'generation_jobs'):
+        with op.batch_alter_table(table, naming_convention=SQLITE_NAMING_CONVENTION) as batch_op:
+            batch_op.drop_constraint(f'fk_{table}_entity_id_entities', type_='foreignkey')
+            batch_op.create_foreign_key(f'fk_{table}_world_id_entities', 'entities', ['world_id', 'entity_id'], ['world_id', 'id'], ondelete='CASCADE')
+
+
+def upgrade() -> None:
+    op.create_table('worlds',
+    sa.Column('id', sa.UUID(), nullable=False),
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('setting', sa.String(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('name')
+    )
+    worlds = sa.table(
+        'worlds',
+        sa.column('id', sa.UUID()),
+        sa.column('name', sa.String()),
+        sa.column('setting', sa.String()),
+        sa.column('created_at', sa.DateTime()),
+    )
+    op.bulk_insert(worlds, [{
+        'id': DEFAULT_WORLD_ID,
+        'name': 'Default',
+        'setting': DEFAULT_WORLD_SETTING,
+        'created_at': datetime.utcnow(),
+    }])
+
+    # On Postgres entities and entity_relationships are rebuilt with the
+    # column; everywhere else it is added like on the other tables
+    dialect = op.get_bind().dialect.name
+    tables = ['entity_types', 'entity_embeddings', 'generation_jobs']
+    if dialect != 'postgresql':
+        tables += ['entities', 'entity_relationships']
+    for table in tables:
+        _add_world_id(table)
+    op.create_index(op.f('ix_generation_jobs_world_id'), 'generation_jobs', ['world_id'], unique=False)
+
+    if dialect == 'postgresql':
+        _upgrade_postgresql()
+    else:
+        _upgrade_sqlite()
+    _rebuild_attribute_indexes(dialect)
+
+
+def _downgrade_postgresql() -> None:
+    op.drop_constraint('generation_jobs_world_id_entity_id_fkey', 'generation_jobs', type_='foreignkey')
+    op.drop_constraint('entity_embeddings_world_id_entity_id_fkey', 'entity_embeddings', type_='foreignkey')
+    op.rename_table('entities', 'entities_partitioned')
+    op.execute('ALTER TABLE entities_partitioned RENAME CONSTRAINT entities_pkey TO entities_partitioned_pkey')
+    op.rename_table('entity_relationships', 'entity_relationships_partitioned')
+    for name in (
+        'ix_entities_world_id_created_at_id',
+        'ix_entities_type_id_created_at_id',
+        'ix_entities_attributes',
+        'ix_entities_search_vector',
+        'ix_entity_relationships_parent_id',
+        'ix_entity_relationships_child_id',
+    ):
+        op.execute(f'DROP INDEX {name}')
+
+    op.create_table('entities',
+    sa.Column('id', sa.UUID(), nullable=False),
+    sa.Column('type_id', sa.UUID(), nullable=False),
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('description', sa.String(), nullable=True),
+    sa.Column('attributes', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['type_id'], ['entity_types.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.execute(f"""
+        ALTER TABLE entities ADD COLUMN search_vector tsvector
+        GENERATED ALWAYS AS ({POSTGRES_SEARCH_VECTOR}) STORED
+    """)
+    op.create_table('entity_relationships',
+    sa.Column('parent_id', sa.UUID(), nullable=True),
+    sa.Column('child_id', sa.UUID(), nullable=True),
+    sa.ForeignKeyConstraint(['child_id'], ['entities.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['parent_id'], ['entities.id'], ondelete='CASCADE')
+    )
+    op.execute("""
+        INSERT INTO entities
+            (id, type_id, name, description, attributes, created_at, updated_at)
+        SELECT id, type_id, name, description, attributes, created_at, updated_at
+        FROM entities_partitioned
+    """)
+    op.execute("""
+        INSERT INTO entity_relationships (parent_id, child_id)
+        SELECT parent_id, child_id FROM entity_relationships_partitioned
+    """)
+    op.drop_table('entity_relationships_partitioned')
+    op.drop_table('entities_partitioned')
+
+    op.create_index('ix_entities_created_at_id', 'entities', ['created_at', 'id'], unique=False)
+    op.create_index('ix_entities_type_id_created_at_id', 'entities', ['type_id', 'created_at', 'id'], unique=False)
+    op.create_index('ix_entities_attributes', 'entities', ['attributes'], unique=False, postgresql_using='gin', postgresql_ops={'attributes': 'jsonb_path_ops'})
+    op.create_index('ix_entities_search_vector', 'entities', ['search_vector'], unique=False, postgresql_using='gin')
+    op.create_index(op.f('ix_entity_relationships_parent_id'), 'entity_relationships', ['parent_id'], unique=False)
+    op.create_index(op.f('ix_entity_relationships_child_id'), 'entity_relationships', ['child_id'], unique=False)
+    op.create_foreign_key('entity_embeddings_entity_id_fkey', 'entity_embeddings', 'entities', ['entity_id'], ['id'], ondelete='CASCADE')
+    op.create_foreign_key('generation_jobs_entity_id_fkey', 'generation_jobs', 'entities', ['entity_id'], ['id'], ondelete='CASCADE')
+
+    op.drop_constraint('entity_types_world_id_id_key', 'entity_types', type_='unique')
+    op.drop_constraint('entity_types_world_id_name_key', 'entity_types', type_='unique')
+    op.create_unique_constraint('entity_types_name_key', 'entity_types', ['name'])
+    op.drop_constraint('entity_types_world_id_fkey', 'entity_types', type_='foreignkey')
+
+
+def _downgrade_sqlite() -> None:
+    for table in ('entity_embeddings', 'generation_jobs'):
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_constraint(f'fk_{table}_world_id_entities', type_='foreignkey')
+            batch_op.create_foreign_key(f'fk_{table}_entity_id_entities', 'entities', ['entity_id'], ['id'], ondelete='CASCADE')
+    with op.batch_alter_table('entity_relationships') as batch_op:
+        batch_op.drop_constraint('fk_entity_relationships_world_id_entities_1', type_='foreignkey')
+        batch_op.drop_constraint('fk_entity_relationships_world_id_entities', type_='foreignkey')
+        batch_op.create_foreign_key('fk_entity_relationships_parent_id_entities', 'entities', ['parent_id'], ['id'], ondelete='CASCADE')
+        batch_op.create_foreign_key('fk_entity_relationships_child_id_entities', 'entities', ['child_id'], ['id'], ondelete='CASCADE')
+
+    for statement in SQLITE_SEARCH_TEARDOWN:
+        op.execute(statement)
+    with op.batch_alter_table('entities') as batch_op:
+        batch_op.drop_index('ix_entities_world_id_created_at_id')
+        batch_op.create_index('ix_entities_created_at_id', ['created_at', 'id'], unique=False)
+        batch_op.drop_constraint('fk_entities_world_id_worlds', type_='foreignkey')
+        batch_op.drop_constraint('fk_entities_world_id_entity_types', type_='foreignkey')
+        batch_op.create_primary_key('pk_entities', ['id'])
+        batch_op.create_foreign_key('fk_entities_type_id_entity_types', 'entity_types', ['type_id'], ['id'])
+    for statement in SQLITE_SEARCH_DDL:
+        op.execute(statement)
+
+    with op.batch_alter_table('entity_types') as batch_op:
+        batch_op.drop_constraint('uq_entity_types_world_id_id', type_='unique')
+        batch_op.drop_constraint('uq_entity_types_world_id', type_='unique')
+        batch_op.create_unique_constraint('uq_entity_types_name', ['name'])
+        batch_op.drop_constraint('fk_entity_types_world_id_worlds', type_='foreignkey')
+
+
+def downgrade() -> None:
+    # Entity type names are only unique within a world, and entities would
+    # lose the world they belong to
+    if not op.get_context().as_sql and op.get_bind().scalar(sa.text('SELECT count(*) FROM worlds')) > 1:
+        raise RuntimeError('Delete all but one world before downgrading')
+
+    dialect = op.get_bind().dialect.name
+    op.drop_index(op.f('ix_generation_jobs_world_id'), table_name='generation_jobs')
+    if dialect == 'postgresql':
+        _downgrade_postgresql()
+    else:
+        _downgrade_sqlite()
+
+    tables = ['entity_types', 'entity_embeddings', 'generation_jobs']
+    if dialect != 'postgresql':
+        tables += ['entities', 'entity_relationships']
+    for table in tables:
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_column('world_id')
+    op.drop_table('worlds')
+    # Attribute indexes are recreated on the plain table by the next
+    # indexEntityAttributes call for each type
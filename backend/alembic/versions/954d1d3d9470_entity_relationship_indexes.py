@@ -0,0 +1,28 @@
+"""entity relationship indexes
+
+Revision ID: 954d1d3d9470
+Revises: 2472e46dba56
+Create Date: 2026-10-18 12:10:41.208376
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '954d1d3d9470'
+down_revision: Union[str, None] = '2472e46dba56'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(op.f('ix_entity_relationships_parent_id'), 'entity_relationships', ['parent_id'], unique=False)
+    op.create_index(op.f('ix_entity_relationships_child_id'), 'entity_relationships', ['child_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_entity_relationships_child_id'), table_name='entity_relationships')
+    op.drop_index(op.f('ix_entity_relationships_parent_id'), table_name='entity_relationships')
@@ -0,0 +1,38 @@
+"""entity embeddings
+
+Revision ID: b5e0c2d71f48
+Revises: 6cb10a3cd903
+Create Date: 2026-10-18 13:42:17.530984
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b5e0c2d71f48'
+down_revision: Union[str, None] = '6cb10a3cd903'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('entity_embeddings',
+    sa.Column('entity_id', sa.UUID(), nullable=False),
+    sa.Column('model', sa.String(), nullable=False),
+    sa.Column('dimensions', sa.Integer(), nullable=False),
+    sa.Column('vector', sa.LargeBinary(), nullable=False),
+    sa.Column('content_hash', sa.String(length=64), nullable=False),
+    sa.Column('source_updated_at', sa.DateTime(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['entity_id'], ['entities.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('entity_id')
+    )
+    op.create_index(op.f('ix_entity_embeddings_updated_at'), 'entity_embeddings', ['updated_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_entity_embeddings_updated_at'), table_name='entity_embeddings')
+    op.drop_table('entity_embeddings')
@@ -0,0 +1,29 @@
+"""generation job leases
+
+Revision ID: c3f8a1d92b47
+Revises: 611f4fb2d3f1
+Create Date: 2026-10-18 19:12:31.402118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3f8a1d92b47'
+down_revision: Union[str, None] = '611f4fb2d3f1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('generation_jobs', sa.Column('lease_expires_at', sa.DateTime(), nullable=True))
+    op.add_column('generation_jobs', sa.Column('run_after', sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('generation_jobs') as batch_op:
+        batch_op.drop_column('run_after')
+        batch_op.drop_column('lease_expires_at')
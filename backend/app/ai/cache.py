@@ -0,0 +1,191 @@
+import hashlib
+import json
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Optional, Tuple
+from sqlalchemy import delete, func, select
+from sqlalchemy.exc import SQLAlchemyError
+import logfire
+
+from app.config import settings
+from app.database import async_session_maker
+from app.models.cache import LLMCacheEntry
+
+
+def cache_key(
+    model: str,
+    system_prompt: str,
+    context: str,
+    temperature: float,
+    result_type: str,
+) -> str:
+    """Content hash identifying one model call"""
+    payload = json.dumps(
+        [model, system_prompt, context, temperature, result_type],
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class ResponseCache:
+    """Interface for LLM response caches; values must be JSON serializable"""
+
+    async def get(self, key: str) -> Optional[Any]:
+        raise NotImplementedError
+
+    async def set(self, key: str, value: Any) -> None:
+        raise NotImplementedError
+
+
+class MemoryCache(ResponseCache):
+    """In-process LRU tier"""
+
+    def __init__(self, max_entries: int, ttl: timedelta):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: OrderedDict[str, Tuple[datetime, Any]] = OrderedDict()
+
+    async def get(self, key: str) -> Optional[Any]:
+        if key not in self._entries:
+            return None
+        expires_at, value = self._entries[key]
+        if expires_at <= datetime.utcnow():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: Any) -> None:
+        self._entries[key] = (datetime.utcnow() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+class DatabaseCache(ResponseCache):
+    """
+    Persistent tier in the llm_cache table, on whichever database
+    DATABASE_URL points at. Entries expire after ``ttl``; once the stored
+    values exceed ``max_bytes`` the oldest entries are evicted.
+
+    Expired entries are swept and the stored size recounted at most every
+    ``sweep_interval``, not on every write. In between, the size is the last
+    count plus what this process has written since, which triggers an early
+    sweep if it goes over ``max_bytes``. Other processes' writes are counted
+    by the next sweep.
+
+    Cache failures are logged and treated as misses so they never fail a
+    generation.
+    """
+
+    def __init__(self, ttl: timedelta, max_bytes: int, sweep_interval: timedelta):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.sweep_interval = sweep_interval
+        self._total: Optional[int] = None
+        self._swept_at = datetime.min
+
+    async def get(self, key: str) -> Optional[Any]:
+        try:
+            async with async_session_maker() as db:
+                entry = await db.get(LLMCacheEntry, key)
+        except SQLAlchemyError as e:
+            logfire.warn("LLM cache read failed", error=str(e))
+            return None
+
+        if entry is None or entry.expires_at <= datetime.utcnow():
+            return None
+        return entry.value
+
+    async def set(self, key: str, value: Any) -> None:
+        now = datetime.utcnow()
+        size = len(json.dumps(value))
+        try:
+            async with async_session_maker() as db:
+                await db.merge(
+                    LLMCacheEntry(
+                        key=key,
+                        value=value,
+                        size=size,
+                        created_at=now,
+                        expires_at=now + self.ttl,
+                    )
+                )
+                if self._total is not None:
+                    self._total += size
+                if (
+                    self._total is None
+                    or self._total > self.max_bytes
+                    or now - self._swept_at >= self.sweep_interval
+                ):
+                    await db.flush()
+                    await self._evict(db, now)
+                await db.commit()
+        except SQLAlchemyError as e:
+            logfire.warn("LLM cache write failed", error=str(e))
+
+    async def _evict(self, db, now: datetime) -> None:
+        self._swept_at = now
+        await db.execute(delete(LLMCacheEntry).where(LLMCacheEntry.expires_at <= now))
+
+        total = await db.scalar(select(func.coalesce(func.sum(LLMCacheEntry.size), 0)))
+        self._total = total
+        if total <= self.max_bytes:
+            return
+
+        # Drop the oldest entries until we are back under the budget
+        evicted = []
+        oldest = await db.stream(
+            select(LLMCacheEntry.key, LLMCacheEntry.size).order_by(
+                LLMCacheEntry.created_at
+            )
+        )
+        async for key, size in oldest:
+            if total <= self.max_bytes:
+                break
+            evicted.append(key)
+            total -= size
+        await oldest.close()
+        await db.execute(delete(LLMCacheEntry).where(LLMCacheEntry.key.in_(evicted)))
+        self._total = total
+
+
+class TieredCache(ResponseCache):
+    """Reads through the tiers in order and writes to all of them"""
+
+    def __init__(self, *tiers: ResponseCache):
+        self.tiers = tiers
+
+    async def get(self, key: str) -> Optional[Any]:
+        for index, tier in enumerate(self.tiers):
+            value = await tier.get(key)
+            if value is not None:
+                # Promote to the faster tiers we missed
+                for faster_tier in self.tiers[:index]:
+                    await faster_tier.set(key, value)
+                return value
+        return None
+
+    async def set(self, key: str, value: Any) -> None:
+        for tier in self.tiers:
+            await tier.set(key, value)
+
+
+def build_response_cache() -> Optional[ResponseCache]:
+    if not settings.AI_CACHE_ENABLED:
+        return None
+
+    ttl = timedelta(seconds=settings.AI_CACHE_TTL_SECONDS)
+    tiers = [MemoryCache(settings.AI_CACHE_MEMORY_ENTRIES, ttl)]
+    if settings.AI_CACHE_PERSISTENT:
+        tiers.append(
+            DatabaseCache(
+                ttl,
+                settings.AI_CACHE_MAX_BYTES,
+                timedelta(seconds=settings.AI_CACHE_SWEEP_SECONDS),
+            )
+        )
+    return TieredCache(*tiers)
+
+
+response_cache = build_response_cache()
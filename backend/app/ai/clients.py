@@ -0,0 +1,418 @@
+import asyncio
+from collections import deque
+from contextlib import AsyncExitStack, asynccontextmanager
+import random
+import time
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Tuple,
+    TypeVar,
+)
+import anthropic
+import httpx
+import openai
+from pydantic_ai.exceptions import ModelHTTPError
+from pydantic_ai.messages import ModelMessage, ModelResponse
+from pydantic_ai.models import Model, StreamedResponse, infer_model
+from pydantic_ai.models.openai import OpenAIModel
+from pydantic_ai.models.wrapper import WrapperModel
+from pydantic_ai.providers.openai import OpenAIProvider
+from pydantic_ai.usage import Usage
+import logfire
+
+from app.config import settings
+from app.ai.models import CachingAnthropicModel
+
+T = TypeVar("T")
+
+# Rate limited, timed out, overloaded or failing upstream: worth another try
+RETRYABLE_STATUS_CODES = {408, 409, 425, 429, 500, 502, 503, 504, 529}
+RETRYABLE_ERRORS = (
+    openai.APIConnectionError,
+    anthropic.APIConnectionError,
+    httpx.TransportError,
+)
+
+# Rough prompt size for rate limiting before the provider reports actual usage
+CHARS_PER_TOKEN = 4
+
+# Latencies kept per model for the hedging threshold
+LATENCY_WINDOW = 200
+
+
+class ModelUnavailable(ValueError):
+    """A model call kept failing with rate limit, overload or connection errors"""
+
+
+class TokenBucket:
+    """
+    Allows ``per_minute`` units a minute, in bursts of up to a minute's
+    worth. Waiters are served in arrival order.
+    """
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60
+        self.tokens = per_minute
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self._updated) * self.rate
+        )
+        self._updated = now
+
+    async def acquire(self, amount: float = 1) -> None:
+        """Take ``amount`` units, waiting until they are available"""
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            self._refill()
+            while self.tokens < amount:
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= amount
+
+    def adjust(self, amount: float) -> None:
+        """
+        Take ``amount`` more units after the fact, or give them back when
+        negative. Going into debt delays later callers.
+        """
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens - amount)
+
+
+class ProviderLimiter:
+    """Request and token quotas of one provider, from AI_PROVIDER_RPM/TPM"""
+
+    def __init__(self, provider: str):
+        rpm = settings.AI_PROVIDER_RPM.get(provider)
+        tpm = settings.AI_PROVIDER_TPM.get(provider)
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.tokens = TokenBucket(tpm) if tpm else None
+
+    async def acquire(self, estimated_tokens: int) -> None:
+        if self.requests is not None:
+            await self.requests.acquire()
+        if self.tokens is not None:
+            await self.tokens.acquire(estimated_tokens)
+
+    def settle(self, estimated_tokens: int, used_tokens: int) -> None:
+        """Correct the estimate taken by acquire once actual usage is known"""
+        if self.tokens is not None:
+            self.tokens.adjust(used_tokens - estimated_tokens)
+
+
+class LatencyWindow:
+    """Durations of the most recent successful calls"""
+
+    def __init__(self, size: int = LATENCY_WINDOW):
+        self._samples: deque = deque(maxlen=size)
+
+    def add(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """None until AI_HEDGE_MIN_SAMPLES calls have been seen"""
+        if len(self._samples) < settings.AI_HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def is_retryable(error: BaseException) -> bool:
+    if isinstance(error, ModelHTTPError):
+        return error.status_code in RETRYABLE_STATUS_CODES
+    return isinstance(error, RETRYABLE_ERRORS)
+
+
+def retry_after_seconds(error: BaseException) -> Optional[float]:
+    """The provider's Retry-After, when the SDK error behind ``error`` has one"""
+    response = getattr(error.__cause__, "response", None)
+    if response is None:
+        return None
+    for header, scale in (("retry-after-ms", 1000), ("retry-after", 1)):
+        try:
+            return float(response.headers[header]) / scale
+        except (KeyError, ValueError):
+            continue
+    return None
+
+
+def backoff_seconds(attempt: int, retry_after: Optional[float] = None) -> float:
+    """
+    Delay before retry number ``attempt`` (from 0): exponential backoff with
+    full jitter, so clients rate limited together don't retry together. At
+    least the provider's Retry-After, within AI_RETRY_MAX_SECONDS.
+    """
+    ceiling = min(
+        settings.AI_RETRY_MAX_SECONDS, settings.AI_RETRY_BASE_SECONDS * 2**attempt
+    )
+    delay = random.uniform(0, ceiling)
+    if retry_after is not None:
+        delay = max(delay, min(retry_after, settings.AI_RETRY_MAX_SECONDS))
+    return delay
+
+
+def estimate_tokens(messages: List[ModelMessage]) -> int:
+    """Prompt tokens guessed from its length, plus the expected response"""
+    characters = sum(
+        len(str(getattr(part, "content", "")))
+        for message in messages
+        for part in message.parts
+    )
+    return characters // CHARS_PER_TOKEN + settings.AI_RESPONSE_TOKENS_ESTIMATE
+
+
+class ManagedModel(WrapperModel):
+    """
+    A model whose calls wait for their provider's rate limits and are
+    retried with backoff on rate limit, overload and connection errors.
+
+    With a ``hedge`` model, a call still running after this model's p95
+    latency is also sent to the hedge, and whichever answers first is used.
+    Streams are retried while opening, but not hedged.
+    """
+
+    def __init__(
+        self,
+        wrapped: Model,
+        provider: str,
+        limiter: ProviderLimiter,
+        metrics: Dict[Tuple[str, str], int],
+        hedge: Optional["ManagedModel"] = None,
+    ):
+        super().__init__(wrapped)
+        self.provider = provider
+        self.limiter = limiter
+        self.hedge = hedge
+        self.latencies = LatencyWindow()
+        self._metrics = metrics
+
+    def _count(self, outcome: str) -> None:
+        key = (self.provider, outcome)
+        self._metrics[key] = self._metrics.get(key, 0) + 1
+
+    async def _with_retries(self, call: Callable[[], Awaitable[T]]) -> T:
+        attempt = 0
+        while True:
+            try:
+                return await call()
+            except Exception as e:
+                attempt += 1
+                if not is_retryable(e):
+                    self._count("failed")
+                    raise
+                if attempt >= settings.AI_MAX_ATTEMPTS:
+                    self._count("failed")
+                    raise ModelUnavailable(
+                        f"{self.provider} model failed after {attempt} attempts: {e}"
+                    ) from e
+                delay = backoff_seconds(attempt - 1, retry_after_seconds(e))
+                self._count("retried")
+                logfire.warn(
+                    "Retrying {provider} model request in {delay:.1f}s",
+                    provider=self.provider,
+                    delay=delay,
+                    attempt=attempt,
+                    error=str(e),
+                )
+                await asyncio.sleep(delay)
+
+    async def _attempt(self, messages: List[ModelMessage], *args: Any) -> Tuple:
+        """One rate limited call to the wrapped model"""
+        estimate = estimate_tokens(messages)
+        await self.limiter.acquire(estimate)
+        started = time.monotonic()
+        try:
+            response, usage = await self.wrapped.request(messages, *args)
+        except BaseException:
+            # Failed calls don't use tokens
+            self.limiter.settle(estimate, 0)
+            raise
+        self.latencies.add(time.monotonic() - started)
+        self.limiter.settle(estimate, usage.total_tokens or estimate)
+        return response, usage
+
+    async def _hedged(self, messages: List[ModelMessage], *args: Any) -> Tuple:
+        threshold = self.latencies.quantile(0.95) if self.hedge else None
+        if threshold is None:
+            return await self._attempt(messages, *args)
+
+        primary = asyncio.ensure_future(self._attempt(messages, *args))
+        done, _ = await asyncio.wait({primary}, timeout=threshold)
+        if done:
+            return primary.result()
+
+        self._count("hedged")
+        secondary = asyncio.ensure_future(self.hedge._attempt(messages, *args))
+        pending = {primary, secondary}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if task.exception() is None:
+                        if task is secondary:
+                            self._count("hedge_won")
+                        return task.result()
+            # Both failed; retry on the primary's terms
+            return primary.result()
+        finally:
+            for task in (primary, secondary):
+                task.cancel()
+
+    async def request(
+        self, messages: List[ModelMessage], *args: Any
+    ) -> Tuple[ModelResponse, Usage]:
+        result = await self._with_retries(lambda: self._hedged(messages, *args))
+        self._count("succeeded")
+        return result
+
+    @asynccontextmanager
+    async def request_stream(
+        self, messages: List[ModelMessage], *args: Any
+    ) -> AsyncIterator[StreamedResponse]:
+        estimate = estimate_tokens(messages)
+        async with AsyncExitStack() as stack:
+
+            async def open_stream() -> StreamedResponse:
+                await self.limiter.acquire(estimate)
+                try:
+                    return await stack.enter_async_context(
+                        self.wrapped.request_stream(messages, *args)
+                    )
+                except BaseException:
+                    self.limiter.settle(estimate, 0)
+                    raise
+
+            response = await self._with_retries(open_stream)
+            self._count("succeeded")
+            try:
+                yield response
+            finally:
+                self.limiter.settle(estimate, response.usage().total_tokens or estimate)
+
+
+def model_provider(spec: str) -> str:
+    """Provider of a model name, e.g. "openai" for "openai:gpt-4o" """
+    provider, separator, _ = spec.partition(":")
+    return provider if separator else "default"
+
+
+def configured_model_spec() -> str:
+    """AI_MODEL, with the "local:" prefix when USE_LOCAL_MODEL is set"""
+    if settings.USE_LOCAL_MODEL:
+        return f"local:{settings.AI_MODEL}"
+    return settings.AI_MODEL
+
+
+class ModelRegistry:
+    """
+    Long-lived models, built once per model name rather than per call. The
+    models of a provider share one HTTP client, so connections are reused,
+    and one ProviderLimiter, so its quotas hold across every caller.
+
+    OpenAI-compatible (including local) and Anthropic clients are built with
+    their SDK's own retries off, so ManagedModel's policy is the only one;
+    other providers keep their SDK defaults. A ``transport`` replaces the
+    network for those clients, e.g. an httpx.MockTransport in tests.
+    """
+
+    def __init__(self, transport: Optional[httpx.AsyncBaseTransport] = None):
+        self._transport = transport
+        self._models: Dict[str, ManagedModel] = {}
+        self._limiters: Dict[str, ProviderLimiter] = {}
+        self._http_clients: Dict[str, httpx.AsyncClient] = {}
+        # (provider, outcome) -> calls
+        self.requests: Dict[Tuple[str, str], int] = {}
+
+    def start(self) -> None:
+        """Build the configured models up front; errors wait for their first use"""
+        try:
+            self.model()
+        except Exception as e:
+            logfire.error("Failed to build the AI model", error=str(e))
+
+    async def stop(self) -> None:
+        for client in self._http_clients.values():
+            await client.aclose()
+        self._http_clients.clear()
+        self._models.clear()
+
+    def model(self) -> ManagedModel:
+        """The model for AI_MODEL, hedged with AI_HEDGE_MODEL if set"""
+        spec = configured_model_spec()
+        if spec not in self._models:
+            hedge = (
+                self._managed(settings.AI_HEDGE_MODEL)
+                if settings.AI_HEDGE_MODEL
+                else None
+            )
+            self._models[spec] = self._managed(spec, hedge)
+        return self._models[spec]
+
+    def _managed(self, spec: str, hedge: Optional[ManagedModel] = None) -> ManagedModel:
+        provider = model_provider(spec)
+        if provider not in self._limiters:
+            self._limiters[provider] = ProviderLimiter(provider)
+        return ManagedModel(
+            self._build(provider, spec),
+            provider,
+            self._limiters[provider],
+            self.requests,
+            hedge,
+        )
+
+    def _http_client(self, provider: str) -> httpx.AsyncClient:
+        if provider not in self._http_clients:
+            self._http_clients[provider] = httpx.AsyncClient(
+                timeout=httpx.Timeout(settings.AI_REQUEST_TIMEOUT_SECONDS, connect=5),
+                transport=self._transport,
+            )
+        return self._http_clients[provider]
+
+    def _build(self, provider: str, spec: str) -> Model:
+        name = spec.partition(":")[2]
+        if provider in ("local", "openai"):
+            client = openai.AsyncOpenAI(
+                base_url=settings.AI_LOCAL_BASE_URL if provider == "local" else None,
+                # Local servers take any key, but the client insists on one
+                api_key=(
+                    "local" if provider == "local" else settings.OPENAI_API_KEY or None
+                ),
+                max_retries=0,
+                http_client=self._http_client(provider),
+            )
+            return OpenAIModel(name, provider=OpenAIProvider(openai_client=client))
+        if provider == "anthropic":
+            client = anthropic.AsyncAnthropic(
+                api_key=settings.ANTHROPIC_API_KEY or None,
+                max_retries=0,
+                http_client=self._http_client(provider),
+            )
+            return CachingAnthropicModel(name, anthropic_client=client)
+        return infer_model(spec)
+
+    def render_prometheus(self) -> str:
+        lines = [
+            "# HELP ai_model_requests_total Model calls by provider and outcome",
+            "# TYPE ai_model_requests_total counter",
+        ]
+        lines += [
+            f'ai_model_requests_total{{provider="{provider}",outcome="{outcome}"}} '
+            f"{count}"
+            for (provider, outcome), count in sorted(self.requests.items())
+        ]
+        return "\n".join(lines) + "\n"
+
+
+model_registry = ModelRegistry()
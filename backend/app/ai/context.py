@@ -0,0 +1,181 @@
+from dataclasses import dataclass
+from datetime import timedelta
+import hashlib
+import itertools
+import json
+import math
+from typing import Any, Dict, List, Optional
+import uuid
+from sqlalchemy import func, select, union_all
+from sqlalchemy.orm import selectinload
+
+from app.config import settings
+from app.database import async_session_maker
+from app.models.entity import Entity, entity_relationships
+from app.ai.cache import MemoryCache
+from app.ai.embeddings import embedding_pipeline
+
+# Rough prompt-token estimate; deterministic and needs no tokenizer
+CHARS_PER_TOKEN = 4
+
+# Related entities are listed in this order, so the most relevant ones survive
+# truncation: direct parents, then children, then semantically related entities
+RELATION_PRIORITY = {"parent": 0, "child": 1, "related": 2}
+
+# A trailing entry is cut down to fit the budget only if this much room is left
+MIN_TRUNCATED_ENTRY_TOKENS = 24
+
+_context_cache = MemoryCache(
+    max_entries=settings.AI_CONTEXT_CACHE_ENTRIES,
+    ttl=timedelta(seconds=settings.AI_CONTEXT_CACHE_TTL_SECONDS),
+)
+
+
+@dataclass
+class ContextEntry:
+    relation: str
+    score: float  # Similarity for related entities, 1 for graph neighbours
+    entity: Entity
+
+    def sort_key(self):
+        return (
+            RELATION_PRIORITY[self.relation],
+            -self.score,
+            self.entity.name,
+            str(self.entity.id),
+        )
+
+    def render(self) -> str:
+        details: Dict[str, Any] = {"type": self.entity.type_def.name}
+        if self.entity.description:
+            details["description"] = self.entity.description
+        details.update(self.entity.attributes or {})
+        payload = json.dumps(details, separators=(",", ":"), ensure_ascii=False)
+        return f"- {self.relation}: {self.entity.name} {payload}"
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def pack_context(entries: List[ContextEntry], token_budget: int) -> str:
+    """
+    Render entries in priority order until the budget runs out. The entry
+    that crosses the budget is cut at a character boundary; everything after
+    it is dropped. The same entries always produce the same text.
+    """
+    lines = []
+    remaining = token_budget
+    for entry in sorted(entries, key=ContextEntry.sort_key):
+        line = entry.render()
+        tokens = estimate_tokens(line)
+        if tokens <= remaining:
+            lines.append(line)
+            remaining -= tokens
+            continue
+        if remaining >= MIN_TRUNCATED_ENTRY_TOKENS:
+            lines.append(line[: remaining * CHARS_PER_TOKEN - 1] + "…")
+        break
+    return "\n".join(lines)
+
+
+async def _context_version(world_id: uuid.UUID, entity_id: uuid.UUID) -> Optional[str]:
+    """
+    Fingerprint of the entity and its graph neighbours; changes whenever any
+    of them is updated, or a relationship is added or removed
+    """
+    relationships = entity_relationships.c
+    neighbour_ids = union_all(
+        select(relationships.parent_id).where(
+            relationships.world_id == world_id, relationships.child_id == entity_id
+        ),
+        select(relationships.child_id).where(
+            relationships.world_id == world_id, relationships.parent_id == entity_id
+        ),
+    ).subquery()
+    async with async_session_maker() as db:
+        entity_updated_at = await db.scalar(
+            select(Entity.updated_at).where(
+                Entity.world_id == world_id, Entity.id == entity_id
+            )
+        )
+        if entity_updated_at is None:
+            return None
+        count, latest = (
+            await db.execute(
+                select(func.count(), func.max(Entity.updated_at)).where(
+                    Entity.world_id == world_id, Entity.id.in_(select(neighbour_ids))
+                )
+            )
+        ).one()
+    return f"{entity_updated_at.isoformat()}|{count}|{latest}"
+
+
+async def _retrieve(world_id: uuid.UUID, entity_id: uuid.UUID) -> List[ContextEntry]:
+    # Embed anything new first, outside our own session
+    await embedding_pipeline.sync()
+
+    async with async_session_maker() as db:
+        entity = await db.scalar(
+            select(Entity)
+            .options(
+                selectinload(Entity.parents).selectinload(Entity.type_def),
+                selectinload(Entity.children).selectinload(Entity.type_def),
+            )
+            .where(Entity.world_id == world_id, Entity.id == entity_id)
+        )
+        if entity is None:
+            raise ValueError(f"Entity with ID {entity_id} not found")
+
+        entries = [ContextEntry("parent", 1.0, parent) for parent in entity.parents]
+        entries += [ContextEntry("child", 1.0, child) for child in entity.children]
+
+        vector = embedding_pipeline.vector_for(world_id, entity_id)
+        if vector is not None and settings.AI_CONTEXT_RELATED_K > 0:
+            seen = {entity_id, *(entry.entity.id for entry in entries)}
+            # Over-fetch so graph neighbours can be skipped and still leave k
+            matches = embedding_pipeline.similar(
+                vector,
+                world_id,
+                k=settings.AI_CONTEXT_RELATED_K + len(seen),
+                exclude=entity_id,
+            )
+            scores = dict(
+                itertools.islice(
+                    ((id, score) for id, score in matches if id not in seen),
+                    settings.AI_CONTEXT_RELATED_K,
+                )
+            )
+            related = await db.scalars(
+                select(Entity)
+                .options(selectinload(Entity.type_def))
+                .where(Entity.world_id == world_id, Entity.id.in_(scores))
+            )
+            entries += [
+                ContextEntry("related", scores[related_entity.id], related_entity)
+                for related_entity in related
+            ]
+    return entries
+
+
+async def assemble_world_context(world_id: uuid.UUID, entity_id: uuid.UUID) -> str:
+    """
+    Related entities to show the model when generating details for an
+    entity, packed into AI_CONTEXT_TOKEN_BUDGET. Cached per version of the
+    entity and its neighbours; identical inputs give identical text, so the
+    LLM response cache keeps working.
+    """
+    version = await _context_version(world_id, entity_id)
+    if version is None:
+        raise ValueError(f"Entity with ID {entity_id} not found")
+
+    key = hashlib.sha256(f"{entity_id}|{version}".encode()).hexdigest()
+    cached = await _context_cache.get(key)
+    if cached is not None:
+        return cached
+
+    context = pack_context(
+        await _retrieve(world_id, entity_id), settings.AI_CONTEXT_TOKEN_BUDGET
+    )
+    await _context_cache.set(key, context)
+    return context
@@ -0,0 +1,429 @@
+import asyncio
+from collections import defaultdict
+from datetime import datetime
+import hashlib
+import itertools
+import json
+import re
+from typing import Any, Dict, List, Optional, Protocol, Sequence, Tuple
+import uuid
+import numpy as np
+from sqlalchemy import delete, func, or_, select, update
+import logfire
+
+from app.config import settings
+from app.database import async_session_maker
+from app.models.entity import Entity
+from app.models.embedding import EntityEmbedding
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+# Rows compared per matrix product when scanning for near duplicates
+SIMILARITY_BLOCK_SIZE = 1024
+
+# Above this many entities of one type, near-duplicate candidates come from
+# locality-sensitive hashing instead of comparing every pair
+EXACT_DUPLICATE_LIMIT = 5000
+LSH_BANDS = 16
+LSH_BAND_BITS = 16
+
+
+class Embedder(Protocol):
+    name: str
+    dimensions: int
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        """Unit-length float32 vectors, one row per text"""
+        ...
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+class HashingEmbedder:
+    """
+    Deterministic offline embedder: words, word pairs and character trigrams
+    hashed into a fixed number of signed buckets. Captures lexical rather than
+    semantic similarity, which is enough to catch near-duplicate entities.
+    """
+
+    def __init__(self, dimensions: int):
+        self.dimensions = dimensions
+        self.name = f"hashing-{dimensions}"
+
+    def _features(self, text: str) -> List[Tuple[str, float]]:
+        words = TOKEN_PATTERN.findall(text.lower())
+        features = [(word, 1.0) for word in words]
+        features += [(f"{a} {b}", 0.5) for a, b in zip(words, words[1:])]
+        for word in words:
+            padded = f"#{word}#"
+            features += [(padded[i : i + 3], 0.25) for i in range(len(padded) - 2)]
+        return features
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature, weight in self._features(text):
+                digest = hashlib.blake2b(feature.encode(), digest_size=8).digest()
+                value = int.from_bytes(digest, "little")
+                sign = 1.0 if value >> 63 else -1.0
+                vectors[row, value % self.dimensions] += sign * weight
+        return _normalize(vectors)
+
+
+class SentenceTransformerEmbedder:
+    """Local sentence-transformers model, run on CPU"""
+
+    def __init__(self, model_name: str):
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError as e:
+            raise ImportError(
+                "EMBEDDING_MODEL needs the sentence-transformers package; "
+                "set it to 'hashing' to use the built-in embedder"
+            ) from e
+        self._model = SentenceTransformer(model_name, device="cpu")
+        self.dimensions = self._model.get_sentence_embedding_dimension()
+        self.name = model_name
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        vectors = self._model.encode(
+            list(texts), normalize_embeddings=True, convert_to_numpy=True
+        )
+        return vectors.astype(np.float32)
+
+
+def get_embedder() -> Embedder:
+    if settings.EMBEDDING_MODEL == "hashing":
+        return HashingEmbedder(settings.EMBEDDING_DIMENSIONS)
+    return SentenceTransformerEmbedder(settings.EMBEDDING_MODEL)
+
+
+def entity_text(
+    name: str, description: Optional[str], attributes: Optional[Dict[str, Any]]
+) -> str:
+    """The text embedded for an entity"""
+    lines = [name, description or ""]
+    for key, value in sorted((attributes or {}).items()):
+        if not isinstance(value, str):
+            value = json.dumps(value, separators=(",", ":"), sort_keys=True)
+        lines.append(f"{key}: {value}")
+    return "\n".join(lines)
+
+
+def _content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+class EmbeddingPipeline:
+    """
+    Keeps entity embeddings in step with entities and serves similarity
+    queries from an in-memory float32 matrix.
+
+    Staleness is detected from Entity.updated_at, so every write path (ORM,
+    bulk writes, generation) is picked up without hooks; entities whose text
+    did not actually change are not re-embedded. A background task syncs
+    periodically and queries sync before reading, so results are current.
+    """
+
+    def __init__(self):
+        self._embedder: Optional[Embedder] = None
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._ids: List[uuid.UUID] = []
+        self._positions: Dict[uuid.UUID, int] = {}
+        self._type_ids: List[uuid.UUID] = []
+        self._world_ids: List[uuid.UUID] = []
+        # Rows of each world, so similarity queries only scan their own world
+        self._world_positions: Dict[uuid.UUID, List[int]] = defaultdict(list)
+        self._matrix = np.zeros((0, 0), dtype=np.float32)
+        self._latest: Optional[datetime] = None
+
+    @property
+    def embedder(self) -> Embedder:
+        if self._embedder is None:
+            self._embedder = get_embedder()
+        return self._embedder
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._run(), name="embedding-pipeline")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.sync()
+            except Exception as e:
+                logfire.error("Failed to sync entity embeddings", error=str(e))
+            await asyncio.sleep(settings.EMBEDDING_REFRESH_SECONDS)
+
+    async def sync(self) -> None:
+        """Embed new and changed entities, then bring the index up to date"""
+        async with self._lock:
+            while await self._embed_stale_batch():
+                pass
+            await self._refresh_index()
+
+    async def _embed_stale_batch(self) -> bool:
+        """Embed one batch of stale entities; False once none are left"""
+        model = self.embedder.name
+        async with async_session_maker() as db:
+            rows = (
+                await db.execute(
+                    select(
+                        Entity.id,
+                        Entity.world_id,
+                        Entity.name,
+                        Entity.description,
+                        Entity.attributes,
+                        Entity.updated_at,
+                        EntityEmbedding.model,
+                        EntityEmbedding.content_hash,
+                    )
+                    .outerjoin(EntityEmbedding)
+                    .where(
+                        or_(
+                            EntityEmbedding.entity_id.is_(None),
+                            EntityEmbedding.model != model,
+                            EntityEmbedding.source_updated_at != Entity.updated_at,
+                        )
+                    )
+                    .limit(settings.EMBEDDING_BATCH_SIZE)
+                )
+            ).all()
+            if not rows:
+                return False
+
+            changed, unchanged = [], []
+            for row in rows:
+                text = entity_text(row.name, row.description, row.attributes)
+                content_hash = _content_hash(text)
+                if row.model == model and row.content_hash == content_hash:
+                    unchanged.append(row)
+                else:
+                    changed.append((row, text, content_hash))
+
+            now = datetime.utcnow()
+            if unchanged:
+                await db.execute(
+                    update(EntityEmbedding),
+                    [
+                        {"entity_id": row.id, "source_updated_at": row.updated_at}
+                        for row in unchanged
+                    ],
+                )
+            if changed:
+                vectors = await asyncio.to_thread(
+                    self.embedder.embed, [text for _, text, _ in changed]
+                )
+                await db.execute(
+                    delete(EntityEmbedding).where(
+                        EntityEmbedding.entity_id.in_([row.id for row, _, _ in changed])
+                    )
+                )
+                db.add_all(
+                    EntityEmbedding(
+                        entity_id=row.id,
+                        world_id=row.world_id,
+                        model=model,
+                        dimensions=vector.shape[0],
+                        vector=vector.astype("<f4").tobytes(),
+                        content_hash=content_hash,
+                        source_updated_at=row.updated_at,
+                        updated_at=now,
+                    )
+                    for (row, _, content_hash), vector in zip(changed, vectors)
+                )
+            await db.commit()
+        return len(rows) == settings.EMBEDDING_BATCH_SIZE
+
+    async def _refresh_index(self) -> None:
+        """Load embeddings written since the last refresh into the matrix"""
+        model = self.embedder.name
+        async with async_session_maker() as db:
+            count, latest = (
+                await db.execute(
+                    select(func.count(), func.max(EntityEmbedding.updated_at)).where(
+                        EntityEmbedding.model == model
+                    )
+                )
+            ).one()
+            if count == len(self._ids) and latest == self._latest:
+                return
+
+            query = (
+                select(
+                    EntityEmbedding.entity_id,
+                    EntityEmbedding.world_id,
+                    EntityEmbedding.vector,
+                    Entity.type_id,
+                )
+                .join(Entity)
+                .where(EntityEmbedding.model == model)
+            )
+            incremental = self._latest is not None and count >= len(self._ids)
+            if incremental:
+                query = query.where(EntityEmbedding.updated_at >= self._latest)
+            rows = (await db.execute(query)).all()
+
+        if not incremental:
+            self._ids, self._positions, self._type_ids = [], {}, []
+            self._world_ids, self._world_positions = [], defaultdict(list)
+            self._matrix = np.zeros((0, self.embedder.dimensions), dtype=np.float32)
+
+        new_vectors = []
+        for entity_id, world_id, vector, type_id in rows:
+            vector = np.frombuffer(vector, dtype="<f4")
+            position = self._positions.get(entity_id)
+            if position is not None:
+                self._matrix[position] = vector
+                self._type_ids[position] = type_id
+            else:
+                self._positions[entity_id] = len(self._ids)
+                self._world_positions[world_id].append(len(self._ids))
+                self._ids.append(entity_id)
+                self._type_ids.append(type_id)
+                self._world_ids.append(world_id)
+                new_vectors.append(vector)
+        if new_vectors:
+            self._matrix = np.vstack([self._matrix, np.stack(new_vectors)])
+        self._latest = latest
+
+        if len(self._ids) != count:
+            # Entities were deleted since the last refresh; start over
+            self._latest = None
+            await self._refresh_index()
+
+    async def embed_text(self, text: str) -> np.ndarray:
+        vectors = await asyncio.to_thread(self.embedder.embed, [text])
+        return vectors[0]
+
+    def vector_for(
+        self, world_id: uuid.UUID, entity_id: uuid.UUID
+    ) -> Optional[np.ndarray]:
+        position = self._positions.get(entity_id)
+        if position is None or self._world_ids[position] != world_id:
+            return None
+        return self._matrix[position]
+
+    def _world_rows(
+        self, world_id: uuid.UUID, type_id: Optional[uuid.UUID]
+    ) -> np.ndarray:
+        """Matrix rows of a world's entities, optionally of one type"""
+        positions = self._world_positions.get(world_id, [])
+        if type_id is not None:
+            positions = [
+                position
+                for position in positions
+                if self._type_ids[position] == type_id
+            ]
+        return np.array(positions, dtype=np.int64)
+
+    def similar(
+        self,
+        vector: np.ndarray,
+        world_id: uuid.UUID,
+        k: int,
+        exclude: Optional[uuid.UUID] = None,
+        type_id: Optional[uuid.UUID] = None,
+    ) -> List[Tuple[uuid.UUID, float]]:
+        """The k entities of a world closest to ``vector`` by cosine similarity"""
+        positions = self._world_rows(world_id, type_id)
+        if exclude in self._positions:
+            positions = positions[positions != self._positions[exclude]]
+        if not len(positions) or k <= 0:
+            return []
+        scores = self._matrix[positions] @ vector
+
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(self._ids[positions[index]], float(scores[index])) for index in top]
+
+    def near_duplicates(
+        self,
+        threshold: float,
+        world_id: uuid.UUID,
+        type_id: Optional[uuid.UUID] = None,
+    ) -> List[Tuple[uuid.UUID, uuid.UUID, float]]:
+        """
+        Pairs of entities of the same type in a world with cosine similarity
+        of at least ``threshold``, most similar first
+        """
+        groups: Dict[uuid.UUID, List[int]] = defaultdict(list)
+        for position in self._world_rows(world_id, type_id).tolist():
+            groups[self._type_ids[position]].append(position)
+
+        pairs = []
+        for positions in groups.values():
+            positions = np.array(positions)
+            if len(positions) <= EXACT_DUPLICATE_LIMIT:
+                found = self._exact_pairs(positions, threshold)
+            else:
+                found = self._lsh_pairs(positions, threshold)
+            pairs.extend((self._ids[a], self._ids[b], score) for a, b, score in found)
+        pairs.sort(key=lambda pair: -pair[2])
+        return pairs
+
+    def _exact_pairs(
+        self, positions: np.ndarray, threshold: float
+    ) -> List[Tuple[int, int, float]]:
+        vectors = self._matrix[positions]
+        pairs = []
+        for start in range(0, len(positions), SIMILARITY_BLOCK_SIZE):
+            scores = vectors[start : start + SIMILARITY_BLOCK_SIZE] @ vectors.T
+            rows, columns = np.nonzero(scores >= threshold)
+            for row, column in zip(rows, columns):
+                if start + row < column:
+                    pairs.append(
+                        (
+                            positions[start + row],
+                            positions[column],
+                            float(scores[row, column]),
+                        )
+                    )
+        return pairs
+
+    def _lsh_pairs(
+        self, positions: np.ndarray, threshold: float
+    ) -> List[Tuple[int, int, float]]:
+        """
+        Candidate pairs from random-hyperplane LSH: vectors sharing every sign
+        bit in any band are compared exactly. Close pairs are found with high
+        probability, not certainty.
+        """
+        vectors = self._matrix[positions]
+        planes = (
+            np.random.default_rng(0)
+            .standard_normal((vectors.shape[1], LSH_BANDS * LSH_BAND_BITS))
+            .astype(np.float32)
+        )
+        bits = (vectors @ planes > 0).reshape(len(positions), LSH_BANDS, LSH_BAND_BITS)
+        keys = bits.dot(1 << np.arange(LSH_BAND_BITS, dtype=np.int64))
+
+        candidates = set()
+        for band in range(LSH_BANDS):
+            order = np.argsort(keys[:, band], kind="stable")
+            boundaries = np.flatnonzero(np.diff(keys[order, band])) + 1
+            for bucket in np.split(order, boundaries):
+                if len(bucket) > 1:
+                    candidates.update(itertools.combinations(bucket.tolist(), 2))
+        if not candidates:
+            return []
+
+        a, b = np.array(sorted(candidates)).T
+        scores = np.einsum("ij,ij->i", vectors[a], vectors[b])
+        return [
+            (positions[a[i]], positions[b[i]], float(scores[i]))
+            for i in np.flatnonzero(scores >= threshold)
+        ]
+
+
+embedding_pipeline = EmbeddingPipeline()
@@ -0,0 +1,90 @@
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+import uuid
+from sqlalchemy import select
+from sqlalchemy.orm import selectinload
+
+from app.database import async_session_maker
+from app.database.attributes import merged_attributes
+from app.database.cache import invalidate_entities
+from app.database.changes import change_feed, entity_changes
+from app.database.revisions import (
+    entity_document,
+    entity_update,
+    record_revisions,
+    write_conflict,
+    write_patch,
+)
+from app.models.entity import Entity, EntityType
+from app.ai.context import assemble_world_context
+
+
+@dataclass
+class GenerationInput:
+    entity_type: str
+    entity_data: Dict[str, Any]
+    prompt: Optional[str]
+    world_setting: str  # The entity's World.setting
+    world_context: str  # Related entities, see assemble_world_context
+    version: int  # Entity.version the input was read at
+
+
+# Background and streamed generations open their own short-lived sessions, so
+# no connection is held while waiting on the model.
+
+
+async def load_generation_input(
+    world_id: uuid.UUID, entity_id: uuid.UUID
+) -> GenerationInput:
+    async with async_session_maker() as db:
+        entity = await db.scalar(
+            select(Entity)
+            .options(selectinload(Entity.type_def).selectinload(EntityType.world))
+            .where(Entity.world_id == world_id, Entity.id == entity_id)
+        )
+        if entity is None:
+            raise ValueError(f"Entity with ID {entity_id} not found")
+    return GenerationInput(
+        entity_type=entity.type_def.name,
+        entity_data={**entity.attributes, "name": entity.name},
+        prompt=entity.description,
+        world_setting=entity.type_def.world.setting,
+        world_context=await assemble_world_context(world_id, entity_id),
+        version=entity.version,
+    )
+
+
+async def apply_generated_details(
+    world_id: uuid.UUID,
+    entity_id: uuid.UUID,
+    generated_details: Dict[str, Any],
+    expected_version: Optional[int] = None,
+) -> Entity:
+    """
+    Merge generated details into the entity's attributes, record the
+    revision and commit. Pass the GenerationInput's version as
+    ``expected_version`` to fail with VersionConflict, rather than overwrite,
+    if the entity was edited while generating.
+    """
+    async with async_session_maker() as db:
+        entity = await db.scalar(
+            entity_update(world_id, entity_id, expected_version)
+            .values(
+                attributes=merged_attributes(generated_details, db.bind.dialect.name)
+            )
+            .returning(Entity)
+        )
+        if entity is None:
+            raise await write_conflict(db, world_id, entity_id, expected_version)
+        document = entity_document(entity)
+        changes = {key: ("set", value) for key, value in generated_details.items()}
+        await record_revisions(
+            db,
+            world_id,
+            [(entity_id, entity.version, document, write_patch(document, (), changes))],
+            source="generate",
+        )
+        await db.commit()
+    await invalidate_entities(world_id, [entity_id])
+    await change_feed.publish(entity_changes([entity], "generate"))
+    return entity
@@ -0,0 +1,328 @@
+import asyncio
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+import uuid
+from sqlalchemy import and_, or_, select, update
+import logfire
+
+from app.config import settings
+from app.database import async_session_maker
+from app.models.entity import Entity
+from app.models.job import GenerationJob, JobStatus
+from app.ai.entities import apply_generated_details, load_generation_input
+from app.ai.service import generate_details, get_provider_name
+
+
+class GenerationJobPool:
+    """
+    Asyncio worker pool for background entity generation.
+
+    Jobs are durable rows in generation_jobs, so they survive restarts and can
+    be picked up by any API process. Workers never hold a database session
+    while waiting on the model: they claim a job, read the entity and write
+    the result in separate short transactions. Generations per provider are
+    capped by AI_PROVIDER_CONCURRENCY.
+
+    A running job holds a lease its worker keeps renewing; idle workers put
+    back jobs whose lease has expired. Failed attempts are retried with
+    exponential backoff, up to JOB_MAX_ATTEMPTS.
+    """
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup = asyncio.Event()
+        self._provider_limits: Dict[str, asyncio.Semaphore] = {}
+        self._reclaimed_at = float("-inf")
+
+    async def enqueue(
+        self, world_id: uuid.UUID, entity_ids: List[uuid.UUID], fresh: bool = False
+    ) -> List[GenerationJob]:
+        batch_id = uuid.uuid4()
+        provider = get_provider_name()
+        async with async_session_maker() as db:
+            found = set(
+                await db.scalars(
+                    select(Entity.id).where(
+                        Entity.world_id == world_id, Entity.id.in_(entity_ids)
+                    )
+                )
+            )
+            missing = set(entity_ids) - found
+            if missing:
+                raise ValueError(
+                    f"Entities not found: {', '.join(str(id) for id in missing)}"
+                )
+
+            jobs = [
+                GenerationJob(
+                    batch_id=batch_id,
+                    world_id=world_id,
+                    entity_id=entity_id,
+                    provider=provider,
+                    status=JobStatus.PENDING,
+                    fresh=fresh,
+                    attempts=0,
+                )
+                for entity_id in entity_ids
+            ]
+            db.add_all(jobs)
+            await db.commit()
+
+        self._wakeup.set()
+        return jobs
+
+    async def start(self) -> None:
+        self._tasks = [
+            asyncio.create_task(self._worker(), name=f"generation-worker-{index}")
+            for index in range(self.workers)
+        ]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def _provider_limit(self, provider: str) -> asyncio.Semaphore:
+        if provider not in self._provider_limits:
+            self._provider_limits[provider] = asyncio.Semaphore(
+                settings.AI_PROVIDER_CONCURRENCY.get(
+                    provider, settings.AI_DEFAULT_PROVIDER_CONCURRENCY
+                )
+            )
+        return self._provider_limits[provider]
+
+    async def _reclaim_expired_leases(self) -> None:
+        """Put back jobs whose worker stopped renewing their lease"""
+        now = datetime.utcnow()
+        expired = and_(
+            GenerationJob.status == JobStatus.RUNNING,
+            or_(
+                GenerationJob.lease_expires_at < now,
+                # Left running before leases were recorded
+                GenerationJob.lease_expires_at.is_(None),
+            ),
+        )
+        async with async_session_maker() as db:
+            # The lost run counted as an attempt; a job that keeps taking its
+            # process down must not be retried forever
+            await db.execute(
+                update(GenerationJob)
+                .where(expired, GenerationJob.attempts >= settings.JOB_MAX_ATTEMPTS)
+                .values(
+                    status=JobStatus.FAILED,
+                    error="Worker stopped responding",
+                    lease_expires_at=None,
+                    finished_at=now,
+                )
+            )
+            requeued = await db.execute(
+                update(GenerationJob)
+                .where(expired)
+                .values(status=JobStatus.PENDING, lease_expires_at=None)
+            )
+            await db.commit()
+        if requeued.rowcount:
+            logfire.warn("Requeued generation jobs", count=requeued.rowcount)
+
+    async def _reclaim_if_due(self) -> None:
+        # Workers share the pool, so only one of them reclaims per interval
+        now = time.monotonic()
+        if now - self._reclaimed_at < settings.JOB_HEARTBEAT_SECONDS:
+            return
+        self._reclaimed_at = now
+        try:
+            await self._reclaim_expired_leases()
+        except Exception as e:
+            logfire.error("Failed to reclaim generation jobs", error=str(e))
+
+    async def _worker(self) -> None:
+        while True:
+            await self._reclaim_if_due()
+            # Leave jobs for saturated providers to workers that free a slot
+            saturated = [
+                provider
+                for provider, limit in self._provider_limits.items()
+                if limit.locked()
+            ]
+            try:
+                job = await self._claim_next(saturated)
+            except Exception as e:
+                logfire.error("Failed to claim generation job", error=str(e))
+                job = None
+
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(
+                        self._wakeup.wait(), timeout=settings.JOB_POLL_SECONDS
+                    )
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            async with self._provider_limit(job.provider):
+                await self._run(job)
+            self._wakeup.set()
+
+    async def _claim_next(self, skip_providers: List[str]) -> Optional[GenerationJob]:
+        async with async_session_maker() as db:
+            job = await db.scalar(
+                select(GenerationJob)
+                .where(
+                    GenerationJob.status == JobStatus.PENDING,
+                    GenerationJob.provider.notin_(skip_providers),
+                    or_(
+                        GenerationJob.run_after.is_(None),
+                        GenerationJob.run_after <= datetime.utcnow(),
+                    ),
+                )
+                .order_by(GenerationJob.created_at)
+                .limit(1)
+                .with_for_update(skip_locked=True)
+            )
+            if job is None:
+                return None
+
+            # Conditional update so two workers can never claim the same job,
+            # even where SKIP LOCKED is not available
+            claimed = await db.execute(
+                update(GenerationJob)
+                .where(
+                    GenerationJob.id == job.id,
+                    GenerationJob.status == JobStatus.PENDING,
+                )
+                .values(
+                    status=JobStatus.RUNNING,
+                    started_at=datetime.utcnow(),
+                    lease_expires_at=_lease_expiry(),
+                    run_after=None,
+                    attempts=GenerationJob.attempts + 1,
+                )
+            )
+            await db.commit()
+            if claimed.rowcount != 1:
+                # Lost the race; let the worker loop try again straight away
+                self._wakeup.set()
+                return None
+
+            await db.refresh(job)
+            return job
+
+    async def _run(self, job: GenerationJob) -> None:
+        heartbeat = asyncio.create_task(self._heartbeat(job))
+        try:
+            await self._generate(job)
+        finally:
+            heartbeat.cancel()
+            await asyncio.gather(heartbeat, return_exceptions=True)
+
+    async def _heartbeat(self, job: GenerationJob) -> None:
+        """Renew the job's lease for as long as it runs"""
+        while True:
+            await asyncio.sleep(settings.JOB_HEARTBEAT_SECONDS)
+            try:
+                async with async_session_maker() as db:
+                    await db.execute(
+                        update(GenerationJob)
+                        .where(
+                            GenerationJob.id == job.id,
+                            GenerationJob.status == JobStatus.RUNNING,
+                        )
+                        .values(lease_expires_at=_lease_expiry())
+                    )
+                    await db.commit()
+            except Exception as e:
+                logfire.warn(
+                    "Failed to renew generation job lease",
+                    job_id=str(job.id),
+                    error=str(e),
+                )
+
+    async def _generate(self, job: GenerationJob) -> None:
+        try:
+            generation_input = await load_generation_input(job.world_id, job.entity_id)
+            generated_details = await generate_details(
+                entity_type=generation_input.entity_type,
+                entity_data=generation_input.entity_data,
+                prompt=generation_input.prompt,
+                world_setting=generation_input.world_setting,
+                use_cache=not job.fresh,
+                world_context=generation_input.world_context,
+            )
+            # A conflict with an edit made meanwhile fails the attempt, so the
+            # retry generates from the edited entity
+            await apply_generated_details(
+                job.world_id,
+                job.entity_id,
+                generated_details,
+                expected_version=generation_input.version,
+            )
+            await self._finish(job, JobStatus.SUCCEEDED)
+        except Exception as e:
+            logfire.error("Generation job failed", job_id=str(job.id), error=str(e))
+            if job.attempts < settings.JOB_MAX_ATTEMPTS:
+                await self._finish(
+                    job,
+                    JobStatus.PENDING,
+                    error=str(e),
+                    run_after=datetime.utcnow() + _retry_delay(job.attempts),
+                )
+            else:
+                await self._finish(job, JobStatus.FAILED, error=str(e))
+
+    async def _finish(
+        self,
+        job: GenerationJob,
+        status: JobStatus,
+        error: str = None,
+        run_after: Optional[datetime] = None,
+    ) -> None:
+        """
+        Record the outcome of a run, unless the job was reclaimed from it
+        meanwhile (its lease expired); the outcome is then the new run's
+        """
+        async with async_session_maker() as db:
+            finished = await db.execute(
+                update(GenerationJob)
+                .where(
+                    GenerationJob.id == job.id,
+                    GenerationJob.status == JobStatus.RUNNING,
+                    GenerationJob.attempts == job.attempts,
+                )
+                .values(
+                    status=status,
+                    error=error,
+                    lease_expires_at=None,
+                    run_after=run_after,
+                    finished_at=(
+                        datetime.utcnow() if status != JobStatus.PENDING else None
+                    ),
+                )
+            )
+            await db.commit()
+        if finished.rowcount != 1:
+            logfire.warn(
+                "Ignoring the outcome of a reclaimed generation job",
+                job_id=str(job.id),
+                attempt=job.attempts,
+            )
+
+
+def _lease_expiry() -> datetime:
+    return datetime.utcnow() + timedelta(seconds=settings.JOB_LEASE_SECONDS)
+
+
+def _retry_delay(attempt: int) -> timedelta:
+    """Exponential backoff after the given failed attempt"""
+    return timedelta(
+        seconds=min(
+            settings.JOB_RETRY_BASE_SECONDS * 2 ** (attempt - 1),
+            settings.JOB_RETRY_MAX_SECONDS,
+        )
+    )
+
+
+job_pool = GenerationJobPool(workers=settings.JOB_WORKERS)
@@ -0,0 +1,99 @@
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterable, AsyncIterator, Dict, List, Tuple, cast
+from anthropic.types import Message, RawMessageStartEvent
+from pydantic_ai.messages import ModelMessage, ModelResponse
+from pydantic_ai.models import (
+    ModelRequestParameters,
+    StreamedResponse,
+    check_allow_model_requests,
+)
+from pydantic_ai.models.anthropic import (
+    AnthropicModel,
+    AnthropicModelSettings,
+    _map_usage,
+)
+from pydantic_ai.settings import ModelSettings
+from pydantic_ai.usage import Usage
+
+# Usage fields Anthropic reports for prompt caching, kept in Usage.details
+CACHE_USAGE_FIELDS = ("cache_read_input_tokens", "cache_creation_input_tokens")
+
+
+def _cache_details(message: Any) -> Dict[str, int]:
+    """Prompt caching token counts of a Message or a message_start event"""
+    if isinstance(message, RawMessageStartEvent):
+        message = message.message
+    if not isinstance(message, Message):
+        return {}
+    return {
+        field: count
+        for field in CACHE_USAGE_FIELDS
+        if (count := getattr(message.usage, field, None))
+    }
+
+
+class CachingAnthropicModel(AnthropicModel):
+    """
+    Anthropic model that marks the system prompt as a cacheable prefix.
+
+    Our system prompt (writer role plus world setting) is identical across
+    calls for a world, so with a cache_control breakpoint on it Anthropic bills repeat
+    reads of the prefix at the cached-input rate and skips reprocessing it.
+
+    pydantic-ai drops the cache token counts Anthropic reports; they are kept
+    in Usage.details, under Anthropic's field names, for record_usage.
+    """
+
+    async def _map_message(self, messages: List[ModelMessage]) -> Tuple[Any, List[Any]]:
+        system_prompt, anthropic_messages = await super()._map_message(messages)
+        if system_prompt:
+            system_prompt = [
+                {
+                    "type": "text",
+                    "text": system_prompt,
+                    "cache_control": {"type": "ephemeral"},
+                }
+            ]
+        return system_prompt, anthropic_messages
+
+    async def request(
+        self,
+        messages: List[ModelMessage],
+        model_settings: ModelSettings | None,
+        model_request_parameters: ModelRequestParameters,
+    ) -> Tuple[ModelResponse, Usage]:
+        # As AnthropicModel.request, which doesn't expose the raw response
+        check_allow_model_requests()
+        response = await self._messages_create(
+            messages,
+            False,
+            cast(AnthropicModelSettings, model_settings or {}),
+            model_request_parameters,
+        )
+        usage = _map_usage(response)
+        usage.details = _cache_details(response) or None
+        return self._process_response(response), usage
+
+    @asynccontextmanager
+    async def request_stream(
+        self,
+        messages: List[ModelMessage],
+        model_settings: ModelSettings | None,
+        model_request_parameters: ModelRequestParameters,
+    ) -> AsyncIterator[StreamedResponse]:
+        async with super().request_stream(
+            messages, model_settings, model_request_parameters
+        ) as streamed:
+            streamed._response = _with_cache_usage(streamed, streamed._response)
+            yield streamed
+
+
+async def _with_cache_usage(
+    streamed: StreamedResponse, events: AsyncIterable[Any]
+) -> AsyncIterator[Any]:
+    """Pass ``events`` through, adding their cache token counts to ``streamed``"""
+    async for event in events:
+        details = _cache_details(event)
+        if details:
+            streamed._usage += Usage(details=details)
+        yield event
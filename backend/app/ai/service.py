@@ -1,27 +1,43 @@
+import asyncio
 import json
+from collections import Counter
 from dataclasses import dataclass
-from typing import Dict, Any, get_type_hints
+from typing import AsyncIterator, Dict, Any, List, Optional, get_type_hints
+import weakref
 from typing_extensions import TypedDict
 from pydantic_ai import Agent, RunContext
 from pydantic_ai.models import Model
-from pydantic_ai.models.openai import OpenAIModel
+from pydantic_ai.usage import Usage
 import logfire
 from app.config import settings
+from app.ai.cache import cache_key, response_cache
+from app.ai.clients import (
+    ModelUnavailable,
+    configured_model_spec,
+    model_provider,
+    model_registry,
+)
 
-WORLD_SETTING = """
-In the year 2055, humanity stands at a crossroads. The world we once knew has been reshaped by the relentless march of climate change and technological progress. Coastal cities are threatened by frequent floods exacerbated by rising seas, their former inhabitants now unwelcome wanderers in a world grown hostile to the displaced. Europe shivers under an unprecedented deep freeze, while tropical regions are battered by near-constant storms.
-
-The promise of artificial intelligence, once heralded as our salvation, has proven a double-edged sword. Robots and automation have revolutionized industry and daily life, but at a steep environmental cost. The pursuit of ever-more-powerful AI has accelerated climate change, even as it fails to achieve the long-sought goal of artificial general intelligence.
-
-In this brave new world, productivity soars while birthrates plummet. An aging population finds itself increasingly obsolete, retreating into virtual realities and AI companionship. The gap between the tech-savvy elite and those left behind widens daily. Despite unprecedented technological marvels, famine and disease still plague many corners of the globe.
 
-Humanity finds itself paralyzed, caught between complacency and fear. Some cling desperately to the familiar, while others lose themselves in digital escapes. Tensions simmer as nations close their borders to climate refugees, sparking conflicts and humanitarian crises. Yet beneath the surface, a deeper tension builds – a growing realization that something must change. In this world of environmental chaos and technological wonder, a few dare to ask: can we reclaim our humanity and forge a new path forward? Or are we doomed to be swept away by the very forces we've unleashed?
-"""
+def world_setting_prompt(world_setting: str) -> str:
+    # Sent as the last system prompt part, so every call for a world starts
+    # with the same prefix that providers can cache; only the user prompt
+    # varies per call. Some providers join system parts without a separator,
+    # hence the leading newlines.
+    return f"\n\nWorld setting:\n{world_setting.strip()}"
 
 
 @dataclass
 class AIServiceContext:
-    pass
+    world_setting: str  # The World.setting of the entity being generated
+    append_system_prompt: Optional[str] = None
+
+
+def _system_prompt_tail(context: RunContext[AIServiceContext]) -> str:
+    prompt = world_setting_prompt(context.deps.world_setting)
+    if context.deps.append_system_prompt:
+        prompt += f"\n\n{context.deps.append_system_prompt}"
+    return prompt
 
 
 class CharacterStruct(TypedDict, total=False):
@@ -50,55 +66,197 @@ class WorldEventStruct(TypedDict, total=False):
     outcome: str
 
 
+CHARACTER_SYSTEM_PROMPT = (
+    "You are an award winning novel writer. You will be generating compelling ideas for world building."
+    "Generate ideas and description for a character using the information provided."
+)
+
+LOCATION_SYSTEM_PROMPT = (
+    "You are an award winning novel writer. You will be generating compelling ideas for world building."
+    "Generate ideas and description for a location using the information provided."
+)
+
+WORLD_EVENT_SYSTEM_PROMPT = (
+    "You are an award winning novel writer. You will be generating compelling ideas for world building. "
+    "Generate ideas and description for a significant event in the world using the information provided."
+)
+
+GENERIC_SYSTEM_PROMPT = (
+    "You are an award winning novel writer. You will be generating compelling ideas for world building. "
+    "Generate ideas and description using the information provided."
+)
+
 TYPE_PROMPTS = {
     "character": {
         "struct": CharacterStruct,
+        "system_prompt": CHARACTER_SYSTEM_PROMPT,
         "agent": Agent(
             deps_type=AIServiceContext,
             result_type=CharacterStruct,
-            system_prompt="You are an award winning novel writer. You will be generating compelling ideas for world building."
-            "Generate ideas and description for a character using the information provided.",
+            system_prompt=CHARACTER_SYSTEM_PROMPT,
         ),
     },
     "location": {
         "struct": LocationStruct,
+        "system_prompt": LOCATION_SYSTEM_PROMPT,
         "agent": Agent(
             deps_type=AIServiceContext,
             result_type=CharacterStruct,
-            system_prompt="You are an award winning novel writer. You will be generating compelling ideas for world building."
-            "Generate ideas and description for a location using the information provided.",
+            system_prompt=LOCATION_SYSTEM_PROMPT,
         ),
     },
     "world_event": {
         "struct": WorldEventStruct,
+        "system_prompt": WORLD_EVENT_SYSTEM_PROMPT,
         "agent": Agent(
             deps_type=AIServiceContext,
             result_type=WorldEventStruct,
-            system_prompt="You are an award winning novel writer. You will be generating compelling ideas for world building. "
-            "Generate ideas and description for a significant event in the world using the information provided.",
+            system_prompt=WORLD_EVENT_SYSTEM_PROMPT,
         ),
     },
 }
 
+# Fields that read better when generated after the fields they list. Only used
+# when generate_details_by_field runs in dependency-ordered mode.
+FIELD_DEPENDENCIES = {
+    "character": {
+        "motivation": ["background", "personality"],
+        "hopes": ["motivation"],
+        "fears": ["motivation"],
+    },
+    "location": {
+        "purpose": ["type", "description"],
+    },
+    "world_event": {
+        "background": ["when", "description"],
+        "outcome": ["background"],
+    },
+}
+
 generic_agent = Agent(
     deps_type=AIServiceContext,
     result_type=str,
-    system_prompt="You are an award winning novel writer. You will be generating compelling ideas for world building. "
-    "Generate ideas and description using the information provided.",
+    system_prompt=GENERIC_SYSTEM_PROMPT,
 )
 
+# The world setting is the last system prompt part, after the static ones
+for _agent in (*(prompt["agent"] for prompt in TYPE_PROMPTS.values()), generic_agent):
+    _agent.system_prompt(_system_prompt_tail)
 
-def get_model() -> str | Model:
-    if settings.USE_LOCAL_MODEL:
-        # For running a local OpenAI compatible inference server
-        return OpenAIModel(
-            settings.AI_MODEL,
-            provider={
-                "base_url": "http://localhost:1234/v1"
-            }
-        )
-    else:
-        return settings.AI_MODEL
+GENERATION_TEMPERATURE = 0.8
+
+# How long streamed output is grouped before re-validating the partial result
+STREAM_DEBOUNCE_SECONDS = 0.1
+
+
+# Prompt, cached prompt and response tokens used so far, by result type
+token_usage: Counter = Counter()
+
+# Shared across requests so concurrent generations respect one global limit.
+# One per event loop, created on first use: asyncio primitives are bound to
+# the loop they are first used on.
+_field_semaphores: "weakref.WeakKeyDictionary[Any, asyncio.Semaphore]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def _field_semaphore() -> asyncio.Semaphore:
+    loop = asyncio.get_running_loop()
+    if loop not in _field_semaphores:
+        _field_semaphores[loop] = asyncio.Semaphore(settings.AI_FIELD_CONCURRENCY)
+    return _field_semaphores[loop]
+
+
+def compact_json(data: Any) -> str:
+    """Serialize entity data for prompts without indentation or ASCII escaping"""
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False)
+
+
+def record_usage(kind: str, model: str | Model, usage: Usage) -> None:
+    """Report the tokens one model call used, including cached prompt tokens"""
+    details = usage.details or {}
+    cached_tokens = details.get("cached_tokens", 0) + details.get(
+        "cache_read_input_tokens", 0
+    )
+    token_usage[kind] += usage.request_tokens or 0
+    token_usage[f"{kind}.cached"] += cached_tokens
+    token_usage[f"{kind}.response"] += usage.response_tokens or 0
+    logfire.info(
+        "AI token usage for {kind}",
+        kind=kind,
+        model=model if isinstance(model, str) else model.model_name,
+        request_tokens=usage.request_tokens,
+        cached_request_tokens=cached_tokens,
+        response_tokens=usage.response_tokens,
+        total_tokens=usage.total_tokens,
+    )
+
+
+def get_model() -> Model:
+    """The configured model, from the long-lived model_registry"""
+    return model_registry.model()
+
+
+def get_provider_name() -> str:
+    """Provider serving get_model(), e.g. "openai" for "openai:gpt-4o" """
+    return model_provider(configured_model_spec())
+
+
+def _call_cache_key(
+    model: str | Model,
+    system_prompt: str,
+    result_type: str,
+    context: str,
+    world_setting: str,
+    append_system_prompt: str = None,
+) -> str:
+    return cache_key(
+        model=model if isinstance(model, str) else model.model_name,
+        system_prompt=(
+            f"{system_prompt}\n{world_setting_prompt(world_setting)}\n"
+            f"{append_system_prompt or ''}"
+        ),
+        context=context,
+        temperature=GENERATION_TEMPERATURE,
+        result_type=result_type,
+    )
+
+
+async def run_agent_cached(
+    agent: Agent,
+    system_prompt: str,
+    result_type: str,
+    context: str,
+    world_setting: str,
+    append_system_prompt: str = None,
+    use_cache: bool = True,
+) -> Any:
+    """
+    Run an agent, serving repeated calls from the response cache. With
+    ``use_cache`` off the model is always called, and its fresh answer
+    replaces the cached one.
+    """
+    model = get_model()
+    key = _call_cache_key(
+        model, system_prompt, result_type, context, world_setting, append_system_prompt
+    )
+
+    if use_cache and response_cache is not None:
+        cached = await response_cache.get(key)
+        if cached is not None:
+            logfire.info("AI response served from cache", key=key)
+            return cached
+
+    result = await agent.run(
+        context,
+        model=model,
+        model_settings={"temperature": GENERATION_TEMPERATURE},
+        deps=AIServiceContext(world_setting, append_system_prompt),
+    )
+    record_usage(result_type, model, result.usage())
+    if response_cache is not None:
+        await response_cache.set(key, result.data)
+    return result.data
 
 
 async def generate_entity_field(
@@ -106,7 +264,9 @@ async def generate_entity_field(
     entity_data: Dict,
     field: str,
     prompt: str,
+    world_setting: str,
     append_system_prompt: str = None,
+    use_cache: bool = True,
 ) -> str:
 
     # Take entity_data, remove fields where value is None and return the result as a new dictionary
@@ -117,90 +277,233 @@ For the {entity_type} described below, come up with ideas for their {field} usin
 Give me just the idea, do not preface what you are writing or give me any title or heading.
 Keep response under 100 words. More details, less descriptive words.
 
-World setting:
-{WORLD_SETTING}
-
 Existing information with this {entity_type}:
-{json.dumps(cleaned_entity_data, indent=2)}
+{compact_json(cleaned_entity_data)}
 
 Context and braindump on this {entity_type}:
 {prompt}
 """
 
     try:
-        result = await generic_agent.run(
-            context,
-            model=get_model(),
-            model_settings={"temperature": 0.8},
-            deps=append_system_prompt,
+        return await run_agent_cached(
+            generic_agent,
+            system_prompt=GENERIC_SYSTEM_PROMPT,
+            result_type="str",
+            context=context,
+            world_setting=world_setting,
+            append_system_prompt=append_system_prompt,
+            use_cache=use_cache,
         )
-        return result.data
+    except ModelUnavailable:
+        raise
     except Exception as e:
         raise ValueError(f"Failed to parse AI response: {e}")
 
 
+def field_generation_waves(
+    entity_type: str, missing_fields: List[str], ordered: bool = False
+) -> List[List[str]]:
+    """
+    Group missing fields into waves that can be generated concurrently.
+    Without ``ordered`` every field goes in one wave; otherwise a field waits
+    for the missing fields it depends on in FIELD_DEPENDENCIES.
+    """
+    if not ordered:
+        return [missing_fields] if missing_fields else []
+
+    dependencies = FIELD_DEPENDENCIES.get(entity_type, {})
+    remaining = list(missing_fields)
+    waves = []
+    while remaining:
+        wave = [
+            field
+            for field in remaining
+            if not any(dep in remaining for dep in dependencies.get(field, []))
+        ]
+        if not wave:
+            raise ValueError(f"Circular field dependencies for {entity_type}")
+        waves.append(wave)
+        remaining = [field for field in remaining if field not in wave]
+    return waves
+
+
 async def generate_details_by_field(
     entity_type: str,
     entity_data: Dict,
     prompt: str,
+    world_setting: str,
     append_system_prompt: str = None,
+    ordered: bool = False,
+    use_cache: bool = True,
 ) -> Dict[str, Any]:
-    """For LLM that does not support structured data, we will generate details field by field"""
-
-    # Loop through entity_data and compare against the structure in TYPE_PROMPTS that matches the given entity_type
-    # for each field that is None or missing, generate value using generate_entity_field(), and then return
-    # the updated entity_data dictionary.
+    """
+    For LLM that does not support structured data, we will generate details field by field.
+    Independent fields are generated concurrently, up to AI_FIELD_CONCURRENCY at once.
+    With ``ordered``, fields run in waves so dependent fields see earlier output.
+    """
+
+    # Compare entity_data against the structure in TYPE_PROMPTS that matches the given entity_type,
+    # generate a value with generate_entity_field() for each field that is None or missing, and
+    # return the updated entity_data dictionary.
     if entity_type not in TYPE_PROMPTS:
         raise Exception(f"Entity type {entity_type} not supported")
 
-    for field in get_type_hints(TYPE_PROMPTS[entity_type]["struct"]).keys():
-        if field not in entity_data or entity_data[field] is None:
-            entity_data[field] = await generate_entity_field(
+    missing_fields = [
+        field
+        for field in get_type_hints(TYPE_PROMPTS[entity_type]["struct"]).keys()
+        if field not in entity_data or entity_data[field] is None
+    ]
+
+    async def generate_field(field: str, known_data: Dict) -> str:
+        async with _field_semaphore():
+            return await generate_entity_field(
                 entity_type=entity_type,
-                entity_data=entity_data,
+                entity_data=known_data,
                 field=field,
                 prompt=prompt,
+                world_setting=world_setting,
                 append_system_prompt=append_system_prompt,
+                use_cache=use_cache,
             )
+
+    for wave in field_generation_waves(entity_type, missing_fields, ordered):
+        # Every field in a wave sees the same snapshot of what is known so far
+        known_data = dict(entity_data)
+        values = await asyncio.gather(
+            *(generate_field(field, known_data) for field in wave)
+        )
+        entity_data.update(zip(wave, values))
     return entity_data
 
 
+def _details_context(
+    entity_type: str, entity_data: Dict, prompt: str, world_context: str = None
+) -> str:
+    context = f"""
+Return the result in specified JSON format.
+
+Start with this {entity_type} data:
+{compact_json(entity_data)}
+
+Guidance for filling out {entity_type} details:
+{prompt}
+"""
+    if world_context:
+        context += f"""
+Related entities in this world; keep the details consistent with them:
+{world_context}
+"""
+    return context
+
+
+def _type_prompt(entity_type: str) -> Dict[str, Any]:
+    if entity_type not in TYPE_PROMPTS:
+        raise ValueError(f"Entity type {entity_type} not supported")
+    return TYPE_PROMPTS[entity_type]
+
+
 async def generate_details(
     entity_type: str,
     entity_data: Dict,
     prompt: str,
+    world_setting: str,
     append_system_prompt: str = None,
+    use_cache: bool = True,
+    world_context: str = None,
 ) -> Dict[str, Any]:
 
-    context = f"""
-Return the result in specified JSON format.
+    context = _details_context(entity_type, entity_data, prompt, world_context)
 
-World setting:
-{WORLD_SETTING}
+    try:
+        type_prompt = _type_prompt(entity_type)
+        data = await run_agent_cached(
+            type_prompt.get("agent"),
+            system_prompt=type_prompt.get("system_prompt"),
+            result_type=type_prompt.get("struct").__name__,
+            context=context,
+            world_setting=world_setting,
+            append_system_prompt=append_system_prompt,
+            use_cache=use_cache,
+        )
+        logfire.info("Result from AI generation: ", data=data)
+        return data
+    except ModelUnavailable:
+        raise
+    except Exception as e:
+        raise ValueError(f"Failed to parse AI response: {e}")
 
-Start with this {entity_type} data:
-{json.dumps(entity_data, indent=2)}
 
-Guidance for filling out {entity_type} details:
-{prompt}
-"""
+async def stream_details(
+    entity_type: str,
+    entity_data: Dict,
+    prompt: str,
+    world_setting: str,
+    append_system_prompt: str = None,
+    use_cache: bool = True,
+    world_context: str = None,
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Same as generate_details, but yields the partially validated result as the
+    model produces it. The last item yielded is the complete result. A cache
+    hit is yielded as a single complete result.
+    """
+    type_prompt = _type_prompt(entity_type)
+    context = _details_context(entity_type, entity_data, prompt, world_context)
+    model = get_model()
+    key = _call_cache_key(
+        model,
+        type_prompt["system_prompt"],
+        type_prompt["struct"].__name__,
+        context,
+        world_setting,
+        append_system_prompt,
+    )
 
-    try:
-        agent = TYPE_PROMPTS.get(entity_type).get("agent")
-        result = await agent.run(
+    if use_cache and response_cache is not None:
+        cached = await response_cache.get(key)
+        if cached is not None:
+            logfire.info("AI response served from cache", key=key)
+            yield cached
+            return
+
+    # The model stream runs in its own task and hands results over a queue:
+    # its tracing spans must open and close in one context, while a consumer
+    # may resume this generator from different ones.
+    partials: asyncio.Queue = asyncio.Queue()
+
+    async def produce() -> Dict[str, Any]:
+        async with type_prompt["agent"].run_stream(
             context,
-            model=get_model(),
-            model_settings={"temperature": 0.8},
-            deps=append_system_prompt,
-        )
-        logfire.info("Result from AI generation: ", data=result.data)
-        return result.data
+            model=model,
+            model_settings={"temperature": GENERATION_TEMPERATURE},
+            deps=AIServiceContext(world_setting, append_system_prompt),
+        ) as result:
+            async for partial in result.stream(debounce_by=STREAM_DEBOUNCE_SECONDS):
+                partials.put_nowait(partial)
+            data = await result.get_data()
+        record_usage(type_prompt["struct"].__name__, model, result.usage())
+        return data
+
+    producer = asyncio.create_task(produce())
+    producer.add_done_callback(lambda _: partials.put_nowait(None))
+    try:
+        while (partial := await partials.get()) is not None:
+            yield partial
+        data = producer.result()
+    except ModelUnavailable:
+        raise
     except Exception as e:
         raise ValueError(f"Failed to parse AI response: {e}")
+    finally:
+        producer.cancel()
+
+    logfire.info("Result from AI generation: ", data=data)
+    if response_cache is not None:
+        await response_cache.set(key, data)
+    yield data
 
 
 if __name__ == "__main__":
-    import asyncio
     from pprint import pprint
 
     result = asyncio.run(
@@ -208,6 +511,7 @@ if __name__ == "__main__":
             entity_type="character",
             entity_data={"name": "Jason Hikaru"},
             prompt="A hard-boiled software investigator who uses old-school methods in his post for a large consumer technology company to catch AI misuse and solve AI related accidents. He holds a secret that when found out, will change everything.",
+            world_setting="In the year 2055, humanity stands at a crossroads, reshaped by climate change and the double-edged promise of artificial intelligence.",
         )
     )
     pprint(result)
@@ -0,0 +1,89 @@
+import json
+from collections import defaultdict
+from typing import AsyncIterator, Optional
+import uuid
+from fastapi import APIRouter
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import read_session_maker
+from app.models.entity import Entity, entity_relationships
+
+# Entities fetched (and serialized) per round trip while exporting
+EXPORT_BATCH_SIZE = 1000
+
+router = APIRouter()
+
+
+async def export_entities(
+    db: AsyncSession, world_id: uuid.UUID, type_id: Optional[uuid.UUID] = None
+) -> AsyncIterator[str]:
+    """
+    Yield a world's entities as NDJSON lines shaped like ``EntityBulkInput``,
+    so an export can be fed straight back into ``bulkUpsertEntities``.
+    """
+    # Plain rows rather than ORM objects, so nothing piles up in the session
+    query = (
+        select(
+            Entity.id,
+            Entity.name,
+            Entity.type_id,
+            Entity.description,
+            Entity.attributes,
+        )
+        .where(Entity.world_id == world_id)
+        .order_by(Entity.created_at, Entity.id)
+    )
+    if type_id is not None:
+        query = query.where(Entity.type_id == type_id)
+
+    result = await db.stream(query.execution_options(yield_per=EXPORT_BATCH_SIZE))
+    async for entities in result.partitions():
+        parent_ids = defaultdict(list)
+        relationships = await db.execute(
+            select(
+                entity_relationships.c.child_id, entity_relationships.c.parent_id
+            ).where(
+                entity_relationships.c.world_id == world_id,
+                entity_relationships.c.child_id.in_([e.id for e in entities]),
+            )
+        )
+        for child_id, parent_id in relationships:
+            parent_ids[child_id].append(str(parent_id))
+
+        yield "".join(
+            json.dumps(
+                {
+                    "id": str(entity.id),
+                    "name": entity.name,
+                    "typeId": str(entity.type_id),
+                    "description": entity.description,
+                    "attributes": entity.attributes,
+                    "parentIds": parent_ids[entity.id],
+                }
+            )
+            + "\n"
+            for entity in entities
+        )
+
+
+async def _stream_export(
+    world_id: uuid.UUID, type_id: Optional[uuid.UUID]
+) -> AsyncIterator[str]:
+    # The response body outlives request dependencies, so the export owns its
+    # session instead of using get_async_session. Exports only read, so they
+    # go to the replica when there is one.
+    async with read_session_maker() as db:
+        async for chunk in export_entities(db, world_id, type_id):
+            yield chunk
+
+
+@router.get("/entities.ndjson")
+async def export_entities_ndjson(
+    world_id: uuid.UUID,
+    type_id: Optional[uuid.UUID] = None,
+) -> StreamingResponse:
+    return StreamingResponse(
+        _stream_export(world_id, type_id), media_type="application/x-ndjson"
+    )
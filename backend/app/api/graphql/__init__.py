@@ -1,6 +1,25 @@
 import strawberry
 from .queries import Query
 from .mutations import Mutation
+from .subscriptions import Subscription
+from .extensions import (
+    DocumentCache,
+    OperationTransaction,
+    QueryCostLimit,
+    QueryInstrumentation,
+    SessionRouting,
+)
 
 # Create and export the GraphQL schema
-schema = strawberry.Schema(query=Query, mutation=Mutation)
+schema = strawberry.Schema(
+    query=Query,
+    mutation=Mutation,
+    subscription=Subscription,
+    extensions=[
+        QueryInstrumentation,
+        DocumentCache,
+        QueryCostLimit,
+        SessionRouting,
+        OperationTransaction,
+    ],
+)
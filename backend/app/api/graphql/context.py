@@ -1,17 +1,60 @@
-from typing import AsyncGenerator
+import asyncio
+from typing import AsyncGenerator, Optional
 from strawberry.fastapi import BaseContext
 from sqlalchemy.ext.asyncio import AsyncSession
-from fastapi import Depends
-from app.database import get_async_session
+from app.database import async_session_maker, read_session_maker
+from app.database.transactions import UnitOfWork
+from app.api.graphql.loaders import Loaders
 
 
 class GraphQLContext(BaseContext):
-    def __init__(self, db: AsyncSession):
+    """
+    Per-request state. Sessions are opened on first use, so operations that
+    never touch the database never check out a connection. Query operations
+    read through ``read_db``, which uses the replica when one is configured;
+    mutations use the primary throughout so they read their own writes, and
+    share one transaction through ``unit_of_work``.
+    """
+
+    def __init__(self, db: Optional[AsyncSession] = None):
         super().__init__()
-        self.db = db
+        self._db = db
+        self._read_db: Optional[AsyncSession] = None
+        # Set by SessionRouting once the operation type is known
+        self.read_only = False
+        # Sibling resolvers and loader batches run concurrently, but a session
+        # does not allow concurrent operations; hold this around every query.
+        self.db_lock = asyncio.Lock()
+        self.loaders = Loaders(
+            lambda: self.read_db, self.db_lock, use_cache=lambda: self.read_only
+        )
+        self.unit_of_work = UnitOfWork(lambda: self.db)
+
+    @property
+    def db(self) -> AsyncSession:
+        """Session on the primary database"""
+        if self._db is None:
+            self._db = async_session_maker()
+        return self._db
+
+    @property
+    def read_db(self) -> AsyncSession:
+        """Session for reads: the replica in query operations, else the primary"""
+        if not self.read_only or read_session_maker is async_session_maker:
+            return self.db
+        if self._read_db is None:
+            self._read_db = read_session_maker()
+        return self._read_db
+
+    async def close(self) -> None:
+        for session in (self._db, self._read_db):
+            if session is not None:
+                await session.close()
 
 
-async def get_context(
-    db: AsyncSession = Depends(get_async_session),
-) -> GraphQLContext:
-    return GraphQLContext(db=db)
+async def get_context() -> AsyncGenerator[GraphQLContext, None]:
+    context = GraphQLContext()
+    try:
+        yield context
+    finally:
+        await context.close()
@@ -0,0 +1,307 @@
+import asyncio
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+import math
+from typing import Any, Dict, Optional, Tuple
+import uuid
+from graphql import (
+    DocumentNode,
+    FieldNode,
+    FragmentSpreadNode,
+    GraphQLError,
+    GraphQLObjectType,
+    GraphQLSchema,
+    InlineFragmentNode,
+    SelectionSetNode,
+    get_named_type,
+    get_nullable_type,
+    is_composite_type,
+    is_list_type,
+)
+from graphql.execution.values import get_argument_values
+from graphql.utilities import get_operation_ast
+from sqlalchemy import func, select
+
+from app.config import settings
+from app.database import read_session_maker
+from app.database.graph import MAX_GRAPH_DEPTH
+from app.models.entity import Entity, EntityType, World, entity_relationships
+from app.schemas.pagination import MAX_PAGE_SIZE, clamp_page_size
+
+
+@dataclass
+class CostStatistics:
+    """Table sizes in one world that list fields are estimated from"""
+
+    entities: int = 0
+    entities_by_type: Dict[uuid.UUID, int] = field(default_factory=dict)
+    entity_types: int = 0
+    relationships: int = 0
+
+    @property
+    def fanout(self) -> int:
+        """Expected children (or parents) of one entity"""
+        return max(1, math.ceil(self.relationships / max(self.entities, 1)))
+
+
+class StatisticsCache:
+    """
+    CostStatistics of every world, reloaded at most every
+    GRAPHQL_COST_STATISTICS_SECONDS, or on the next use after invalidate()
+    """
+
+    def __init__(self, max_age: timedelta):
+        self.max_age = max_age
+        self._statistics: Dict[uuid.UUID, CostStatistics] = {}
+        self._loaded_at = datetime.min
+        self._lock = asyncio.Lock()
+
+    async def get(self) -> Dict[uuid.UUID, CostStatistics]:
+        async with self._lock:
+            if datetime.utcnow() - self._loaded_at >= self.max_age:
+                self._statistics = await self._load()
+                self._loaded_at = datetime.utcnow()
+            return self._statistics
+
+    async def invalidate(self) -> None:
+        """Reload on the next get(), after writes that change sizes a lot"""
+        async with self._lock:
+            self._loaded_at = datetime.min
+
+    async def _load(self) -> Dict[uuid.UUID, CostStatistics]:
+        async with read_session_maker() as db:
+            statistics = {
+                world_id: CostStatistics()
+                for world_id in await db.scalars(select(World.id))
+            }
+            by_type = await db.execute(
+                select(Entity.world_id, Entity.type_id, func.count()).group_by(
+                    Entity.world_id, Entity.type_id
+                )
+            )
+            entity_types = await db.execute(
+                select(EntityType.world_id, func.count()).group_by(EntityType.world_id)
+            )
+            relationships = await db.execute(
+                select(entity_relationships.c.world_id, func.count()).group_by(
+                    entity_relationships.c.world_id
+                )
+            )
+
+        for world_id, type_id, count in by_type:
+            world = statistics.setdefault(world_id, CostStatistics())
+            world.entities_by_type[type_id] = count
+            world.entities += count
+        for world_id, count in entity_types:
+            statistics.setdefault(world_id, CostStatistics()).entity_types = count
+        for world_id, count in relationships:
+            statistics.setdefault(world_id, CostStatistics()).relationships = count
+        return statistics
+
+
+cost_statistics = StatisticsCache(
+    timedelta(seconds=settings.GRAPHQL_COST_STATISTICS_SECONDS)
+)
+
+
+@dataclass
+class QueryCost:
+    cost: int  # Estimated objects resolved
+    depth: int  # Deepest field nesting
+
+
+def _at_least_default(count: int) -> int:
+    """
+    A counted list size, no smaller than GRAPHQL_DEFAULT_LIST_SIZE: counts
+    can be stale, and a world created or bulk loaded since they were taken
+    (in this process or another) would otherwise look empty
+    """
+    return max(count, settings.GRAPHQL_DEFAULT_LIST_SIZE)
+
+
+def _type_count(statistics: CostStatistics, type_id: Optional[str]) -> int:
+    if type_id is None:
+        return statistics.entities
+    try:
+        return statistics.entities_by_type.get(uuid.UUID(type_id), 0)
+    except ValueError:
+        return 0
+
+
+def _page_size(arguments: Dict[str, Any]) -> Optional[int]:
+    for name in ("first", "k"):
+        if name in arguments:
+            value = arguments[name]
+            return clamp_page_size(value if value is None or value >= 0 else 0)
+    return None
+
+
+def _graph_size(arguments: Dict[str, Any], statistics: CostStatistics) -> int:
+    """Estimated nodes reached by a descendants/ancestors/subgraph traversal"""
+    roots = len(arguments.get("rootIds") or [None])
+    max_depth = arguments.get("maxDepth")
+    entities = _at_least_default(statistics.entities)
+    if max_depth is None:
+        return entities
+    # Traversals stop at MAX_GRAPH_DEPTH, and a level past the whole world
+    # can't add to the estimate, so neither bounds the loop by the argument
+    reached, level = 0, 1
+    for _ in range(min(max_depth, MAX_GRAPH_DEPTH) + 1):
+        reached += level
+        if roots * reached >= entities:
+            return entities
+        level *= statistics.fanout
+    return roots * reached
+
+
+class CostEstimator:
+    """
+    Walks an operation's selection set, multiplying each list field by its
+    expected length: table sizes (at least GRAPHQL_DEFAULT_LIST_SIZE) for
+    top-level lists, the average fan-out for children and parents, the page
+    size for paginated fields, and GRAPHQL_DEFAULT_LIST_SIZE otherwise.
+    Every object resolved costs 1; scalars are free. Introspection fields are
+    not counted.
+
+    Sizes are those of the world named by the nearest worldId argument, so an
+    estimate depends only on that world, however many others there are.
+    """
+
+    def __init__(
+        self,
+        schema: GraphQLSchema,
+        document: DocumentNode,
+        variables: Optional[Dict[str, Any]],
+        statistics: Dict[uuid.UUID, CostStatistics],
+    ):
+        self.schema = schema
+        self.fragments = {
+            definition.name.value: definition
+            for definition in document.definitions
+            if definition.kind == "fragment_definition"
+        }
+        self.variables = variables or {}
+        self.statistics = statistics
+
+    def estimate(
+        self, document: DocumentNode, operation_name: Optional[str]
+    ) -> Optional[QueryCost]:
+        operation = get_operation_ast(document, operation_name)
+        if operation is None:
+            return None
+        root_type = self.schema.get_root_type(operation.operation)
+        return QueryCost(*self._selection_cost(root_type, operation.selection_set, 1))
+
+    def _world_statistics(self, arguments: Dict[str, Any]) -> CostStatistics:
+        try:
+            return self.statistics.get(
+                uuid.UUID(arguments["worldId"]), CostStatistics()
+            )
+        except (TypeError, ValueError):
+            return CostStatistics()
+
+    def _list_size(
+        self,
+        parent_type: str,
+        field_name: str,
+        arguments: Dict[str, Any],
+        scope: Dict[str, Any],
+    ) -> int:
+        statistics: CostStatistics = scope["statistics"]
+        if parent_type == "Query" and field_name == "worlds":
+            return _at_least_default(len(self.statistics))
+        if parent_type == "EntityGQL" and field_name in ("children", "parents"):
+            return statistics.fanout
+        if parent_type == "Query" and field_name == "entities":
+            page_size = _page_size(arguments)
+            return min(
+                _at_least_default(_type_count(statistics, arguments.get("typeId"))),
+                page_size if page_size is not None else clamp_page_size(None),
+            )
+        if parent_type == "Query" and field_name == "entityTypes":
+            return _at_least_default(statistics.entity_types)
+        if parent_type == "EntityGraphGQL":
+            return scope.get("graph_size", _at_least_default(statistics.entities))
+        page_size = _page_size(arguments)
+        if page_size is not None:
+            return page_size
+        return scope.get("page_size", settings.GRAPHQL_DEFAULT_LIST_SIZE)
+
+    def _selection_cost(
+        self,
+        parent_type: GraphQLObjectType,
+        selection_set: SelectionSetNode,
+        depth: int,
+        scope: Optional[Dict[str, Any]] = None,
+    ) -> Tuple[int, int]:
+        scope = scope or {"statistics": CostStatistics()}
+        cost, max_depth = 0, depth - 1
+        for selection in selection_set.selections:
+            if isinstance(selection, FragmentSpreadNode):
+                fragment = self.fragments[selection.name.value]
+                fragment_type = self.schema.get_type(fragment.type_condition.name.value)
+                selection_cost, selection_depth = self._selection_cost(
+                    fragment_type, fragment.selection_set, depth, scope
+                )
+            elif isinstance(selection, InlineFragmentNode):
+                fragment_type = (
+                    self.schema.get_type(selection.type_condition.name.value)
+                    if selection.type_condition
+                    else parent_type
+                )
+                selection_cost, selection_depth = self._selection_cost(
+                    fragment_type, selection.selection_set, depth, scope
+                )
+            else:
+                selection_cost, selection_depth = self._field_cost(
+                    parent_type, selection, depth, scope
+                )
+            cost += selection_cost
+            max_depth = max(max_depth, selection_depth)
+        return cost, max_depth
+
+    def _field_cost(
+        self,
+        parent_type: GraphQLObjectType,
+        node: FieldNode,
+        depth: int,
+        scope: Dict[str, Any],
+    ) -> Tuple[int, int]:
+        name = node.name.value
+        if name.startswith("__") or not hasattr(parent_type, "fields"):
+            return 0, depth - 1
+        field_def = parent_type.fields[name]
+        field_type = get_nullable_type(field_def.type)
+        if not is_composite_type(get_named_type(field_type)):
+            return 0, depth
+
+        try:
+            arguments = get_argument_values(field_def, node, self.variables)
+        except GraphQLError:
+            # Reported by execution; estimate without the arguments
+            arguments = {}
+
+        if "worldId" in arguments:
+            scope = {**scope, "statistics": self._world_statistics(arguments)}
+        statistics: CostStatistics = scope["statistics"]
+        child_scope = dict(scope)
+        if name in ("descendants", "ancestors", "subgraph"):
+            child_scope["graph_size"] = _graph_size(arguments, statistics)
+        page_size = _page_size(arguments)
+        if page_size is not None:
+            child_scope["page_size"] = page_size
+
+        size = 1
+        if is_list_type(field_type):
+            size = min(
+                self._list_size(parent_type.name, name, arguments, scope),
+                # No single list is ever longer than the world's entities
+                max(statistics.entities, MAX_PAGE_SIZE),
+            )
+
+        child_cost, child_depth = 0, depth
+        if node.selection_set is not None:
+            child_cost, child_depth = self._selection_cost(
+                get_named_type(field_type), node.selection_set, depth + 1, child_scope
+            )
+        return size * (1 + child_cost), child_depth
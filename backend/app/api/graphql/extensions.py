@@ -0,0 +1,191 @@
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+from graphql import DocumentNode, ExecutionResult, GraphQLError
+from sqlalchemy.exc import SQLAlchemyError
+from strawberry.extensions import SchemaExtension
+from strawberry.types.graphql import OperationType
+import logfire
+
+from app.config import settings
+from app.api.graphql.context import GraphQLContext
+from app.api.graphql.cost import CostEstimator, QueryCost, cost_statistics
+from app.database.instrumentation import (
+    OperationStats,
+    current_operation,
+    query_metrics,
+)
+
+
+class QueryInstrumentation(SchemaExtension):
+    """
+    Counts the SQL statements each operation runs and flags statements
+    repeated SQL_N_PLUS_ONE_THRESHOLD times or more, the signature of a
+    resolver querying once per parent object.
+    """
+
+    def on_operation(self):
+        operation = OperationStats(name="anonymous")
+        token = current_operation.set(operation)
+        try:
+            yield
+        finally:
+            current_operation.reset(token)
+
+        operation.name = self.execution_context.operation_name or "anonymous"
+        repeated = operation.repeated_statements(settings.SQL_N_PLUS_ONE_THRESHOLD)
+        if repeated:
+            query_metrics.flag_n_plus_one(operation.name)
+            logfire.warn(
+                "Possible N+1 queries in GraphQL operation {operation}",
+                operation=operation.name,
+                statements={
+                    operation.statements[key]: count for key, count in repeated.items()
+                },
+                total_statements=sum(operation.counts.values()),
+            )
+
+
+class SessionRouting(SchemaExtension):
+    """Lets query operations read from the replica, see GraphQLContext"""
+
+    def on_execute(self):
+        context = self.execution_context.context
+        if isinstance(context, GraphQLContext):
+            context.read_only = (
+                self.execution_context.operation_type == OperationType.QUERY
+            )
+        yield
+
+
+class OperationTransaction(SchemaExtension):
+    """
+    Commits the operation's unit of work once every mutation in the document
+    has run. When a mutation failed, or the commit did, the data is replaced
+    with errors, since none of the changes it reports were saved.
+    """
+
+    async def on_execute(self):
+        yield
+        context = self.execution_context.context
+        if not isinstance(context, GraphQLContext):
+            return
+        unit_of_work = context.unit_of_work
+        if unit_of_work.failed:
+            await unit_of_work.complete()
+            result = self.execution_context.result
+            self.execution_context.result = ExecutionResult(
+                data=None,
+                errors=[
+                    *(result.errors or []),
+                    *(
+                        GraphQLError(
+                            "Rolled back: another mutation in this operation failed",
+                            path=[key],
+                        )
+                        for key in unit_of_work.written
+                    ),
+                ],
+            )
+            return
+        try:
+            await unit_of_work.complete()
+        except SQLAlchemyError as e:
+            logfire.exception("Failed to commit GraphQL operation")
+            self.execution_context.result = ExecutionResult(
+                data=None,
+                errors=[GraphQLError("Database error occurred", original_error=e)],
+            )
+
+
+# Query text -> parsed document and its validation errors (None until validated)
+_documents: OrderedDict[str, Tuple[DocumentNode, Optional[List[GraphQLError]]]] = (
+    OrderedDict()
+)
+
+
+class DocumentCache(SchemaExtension):
+    """
+    Reuses the parsed and validated document of query texts seen before, so
+    the frontend's few repeated queries skip both steps. The validation
+    rules are fixed per schema, so the errors depend on the text alone.
+    """
+
+    def on_parse(self):
+        query = self.execution_context.query
+        cached = _documents.get(query)
+        if cached is not None:
+            _documents.move_to_end(query)
+            self.execution_context.graphql_document = cached[0]
+        yield
+        document = self.execution_context.graphql_document
+        if cached is None and document is not None:
+            _documents[query] = (document, None)
+            while len(_documents) > settings.GRAPHQL_DOCUMENT_CACHE_ENTRIES:
+                _documents.popitem(last=False)
+
+    def on_validate(self):
+        query = self.execution_context.query
+        document, errors = _documents.get(query, (None, None))
+        if errors is not None:
+            self.execution_context.errors = errors
+        yield
+        if errors is None and document is self.execution_context.graphql_document:
+            _documents[query] = (document, self.execution_context.errors or [])
+
+
+class QueryCostLimit(SchemaExtension):
+    """
+    Rejects operations nested deeper than GRAPHQL_MAX_DEPTH or estimated to
+    resolve more than GRAPHQL_MAX_COST objects (see CostEstimator) before
+    any resolver runs, and reports the estimate in the response extensions.
+    """
+
+    cost: Optional[QueryCost] = None
+
+    async def on_execute(self):
+        execution_context = self.execution_context
+        if execution_context.operation_type != OperationType.SUBSCRIPTION:
+            estimator = CostEstimator(
+                execution_context.schema._schema,
+                execution_context.graphql_document,
+                execution_context.variables,
+                await cost_statistics.get(),
+            )
+            self.cost = estimator.estimate(
+                execution_context.graphql_document, execution_context.operation_name
+            )
+
+        error = None
+        if self.cost is not None and self.cost.depth > settings.GRAPHQL_MAX_DEPTH:
+            error = GraphQLError(
+                f"Query depth {self.cost.depth} exceeds the limit of "
+                f"{settings.GRAPHQL_MAX_DEPTH}",
+                extensions={"code": "QUERY_TOO_DEEP"},
+            )
+        elif self.cost is not None and self.cost.cost > settings.GRAPHQL_MAX_COST:
+            error = GraphQLError(
+                f"Query cost {self.cost.cost} exceeds the budget of "
+                f"{settings.GRAPHQL_MAX_COST}",
+                extensions={"code": "QUERY_TOO_EXPENSIVE"},
+            )
+        if error is not None:
+            logfire.warn(
+                "Rejected GraphQL operation {operation}: {error}",
+                operation=execution_context.operation_name or "anonymous",
+                error=error.message,
+            )
+            # Execution is skipped when a result is already set
+            execution_context.result = ExecutionResult(data=None, errors=[error])
+        yield
+
+    def get_results(self):
+        if self.cost is None:
+            return {}
+        return {
+            "cost": {
+                "estimated": self.cost.cost,
+                "budget": settings.GRAPHQL_MAX_COST,
+                "depth": self.cost.depth,
+                "maxDepth": settings.GRAPHQL_MAX_DEPTH,
+            }
+        }
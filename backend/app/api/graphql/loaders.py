@@ -0,0 +1,119 @@
+import asyncio
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional, Tuple
+import uuid
+from sqlalchemy import and_, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from strawberry.dataloader import DataLoader
+
+from app.database.cache import get_entity_types
+from app.models.entity import Entity, EntityType, entity_relationships
+from app.schemas.selection import entity_load_options
+
+# World and entity type IDs
+EntityTypeKey = Tuple[uuid.UUID, uuid.UUID]
+
+# World and entity IDs plus the Entity columns the requesting selection needs
+RelatedKey = Tuple[uuid.UUID, uuid.UUID, Tuple[str, ...]]
+
+
+class Loaders:
+    """
+    Per-request DataLoaders for entity relationships.
+
+    Every lookup issued while resolving one level of the GraphQL selection is
+    collected and run as a single ``IN (...)`` query per loader. Related
+    entities are loaded with only the columns their selection asks for.
+    """
+
+    def __init__(
+        self,
+        get_db: Callable[[], AsyncSession],
+        db_lock: asyncio.Lock,
+        use_cache: Callable[[], bool],
+    ):
+        # Resolved on first load, so requests that never load open no session
+        self._get_db = get_db
+        self._lock = db_lock
+        # Entity types come from the entity cache, except where the request
+        # must read its own uncommitted writes
+        self._use_cache = use_cache
+
+        self.entity_type = DataLoader(load_fn=self._load_entity_types)
+        self.children = DataLoader(load_fn=self._load_children)
+        self.parents = DataLoader(load_fn=self._load_parents)
+
+    async def _load_entity_types(
+        self, keys: List[EntityTypeKey]
+    ) -> List[Optional[EntityType]]:
+        if self._use_cache():
+            by_key = {}
+            for world_id in {world_id for world_id, _ in keys}:
+                for entity_type in await get_entity_types(
+                    world_id, self._get_db, self._lock
+                ):
+                    by_key[(world_id, entity_type.id)] = entity_type
+            return [by_key.get(key) for key in keys]
+
+        async with self._lock:
+            result = await self._get_db().execute(
+                select(EntityType).where(
+                    tuple_(EntityType.world_id, EntityType.id).in_(keys)
+                )
+            )
+        by_key = {
+            (entity_type.world_id, entity_type.id): entity_type
+            for entity_type in result.scalars()
+        }
+        return [by_key.get(key) for key in keys]
+
+    async def _load_children(self, keys: List[RelatedKey]) -> List[List[Entity]]:
+        return await self._load_related(
+            keys,
+            key_column=entity_relationships.c.parent_id,
+            join_column=entity_relationships.c.child_id,
+        )
+
+    async def _load_parents(self, keys: List[RelatedKey]) -> List[List[Entity]]:
+        return await self._load_related(
+            keys,
+            key_column=entity_relationships.c.child_id,
+            join_column=entity_relationships.c.parent_id,
+        )
+
+    async def _load_related(
+        self, keys: List[RelatedKey], key_column, join_column
+    ) -> List[List[Entity]]:
+        # Keys in the same world asking for the same columns share a query; in
+        # practice every key in a batch comes from the same selection set.
+        ids_by_group: Dict[Tuple[uuid.UUID, Tuple[str, ...]], List[uuid.UUID]] = (
+            defaultdict(list)
+        )
+        for world_id, id, columns in keys:
+            ids_by_group[(world_id, columns)].append(id)
+
+        related: Dict[RelatedKey, List[Entity]] = defaultdict(list)
+        for (world_id, columns), ids in ids_by_group.items():
+            # world_id on both tables prunes the scan to the world's partitions
+            query = (
+                select(key_column, Entity)
+                .options(entity_load_options(columns))
+                .join(
+                    entity_relationships,
+                    and_(
+                        Entity.world_id == entity_relationships.c.world_id,
+                        Entity.id == join_column,
+                    ),
+                )
+                .where(
+                    Entity.world_id == world_id,
+                    entity_relationships.c.world_id == world_id,
+                    key_column.in_(ids),
+                )
+            )
+            async with self._lock:
+                result = await self._get_db().execute(query)
+            for key, entity in result.all():
+                related[(world_id, key, columns)].append(entity)
+
+        return [related.get(key, []) for key in keys]
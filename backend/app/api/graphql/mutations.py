@@ -1,42 +1,220 @@
-from typing import List
+from typing import List, Optional
+import uuid
 import strawberry
 from strawberry.types import Info
-from sqlalchemy import select, exists
+from sqlalchemy import delete, exists, insert, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime, timezone
 
-from app.models.entity import Entity, EntityType
+from app.models.entity import Entity, EntityType, World, entity_relationships
+from app.models.embedding import EntityEmbedding
+from app.models.job import GenerationJob
+from app.models.revision import EntityRevision
 from app.schemas.entity import (
+    AttributeOperation,
     EntityGQL,
     EntityTypeGQL,
     EntityInput,
     EntityTypeInput,
     EntityUpdateInput,
     EntityTypeUpdateInput,
+    EntityBulkInput,
+    BulkEntityResult,
+    WorldGQL,
+    WorldInput,
+    WorldUpdateInput,
 )
+from app.schemas.job import GenerationJobGQL
+from app.api.graphql.cost import cost_statistics
+from app.ai.entities import apply_generated_details, load_generation_input
 from app.ai.service import generate_details
+from app.ai.jobs import job_pool
+from app.database.attributes import (
+    fold_attribute_operations,
+    merged_attributes,
+    patched_attributes,
+    parse_attribute_path,
+    sync_attribute_indexes,
+)
+from app.database.bulk import bulk_write_entities
+from app.database.partitions import create_world_partitions, drop_world_partitions
+from app.database.changes import change_feed, entity_changes
+from app.database.cache import (
+    get_entity_types,
+    invalidate_entities,
+    invalidate_entity_types,
+)
+from app.database.revisions import (
+    current_documents,
+    diff_documents,
+    entity_document,
+    entity_update,
+    load_revision,
+    record_revisions,
+    write_conflict,
+    write_patch,
+)
+from app.database.transactions import transactional
 
 
 @strawberry.type
 class Mutation:
+    # Mutations marked @transactional write through the operation's unit of
+    # work: INSERT/UPDATE ... RETURNING instead of a refresh, and a single
+    # commit for the whole document (see OperationTransaction). Cached
+    # entities and types they change are invalidated, and entity changes
+    # published to entityChanged subscribers, once that commit is done.
+    # Everything but the world mutations is scoped to the worldId given.
+
+    @strawberry.mutation
+    @transactional
+    async def create_world(self, info: Info, input: WorldInput) -> WorldGQL:
+        db: AsyncSession = info.context.db
+
+        existing = await db.scalar(select(exists().where(World.name == input.name)))
+        if existing:
+            raise ValueError(f"World {input.name} already exists")
+
+        world = await db.scalar(
+            insert(World)
+            .values(name=input.name, setting=input.setting)
+            .returning(World)
+        )
+        await create_world_partitions(db, world.id)
+        info.context.unit_of_work.after_commit(cost_statistics.invalidate)
+
+        return WorldGQL.from_db(world)
+
     @strawberry.mutation
-    async def create_entity(self, info: Info, input: EntityInput) -> EntityGQL:
+    @transactional
+    async def update_world(
+        self, info: Info, id: str, input: WorldUpdateInput
+    ) -> WorldGQL:
         db: AsyncSession = info.context.db
+        world_id = uuid.UUID(id)
 
-        # Validate entity type exists
-        result = await db.execute(
-            select(EntityType).where(EntityType.id == input.typeId)
+        values = {}
+        if input.name is not None:
+            taken = await db.scalar(
+                select(exists().where(World.name == input.name, World.id != world_id))
+            )
+            if taken:
+                raise ValueError(f"World {input.name} already exists")
+            values["name"] = input.name
+        if input.setting is not None:
+            values["setting"] = input.setting
+
+        statement = update(World).where(World.id == world_id)
+        world = await db.scalar(
+            # An UPDATE needs a SET clause; an empty update just reads the row
+            (
+                statement.values(**values) if values else statement.values(id=world_id)
+            ).returning(World),
+            execution_options={"populate_existing": True},
+        )
+        if not world:
+            raise ValueError(f"World with ID {id} not found")
+
+        return WorldGQL.from_db(world)
+
+    @strawberry.mutation
+    @transactional
+    async def delete_world(self, info: Info, id: str) -> bool:
+        """Delete a world with all of its entity types and entities"""
+        db: AsyncSession = info.context.db
+        world_id = uuid.UUID(id)
+
+        entity_types = (
+            await db.execute(
+                select(EntityType.id, EntityType.indexed_attributes).where(
+                    EntityType.world_id == world_id
+                )
+            )
+        ).all()
+        entity_ids = list(
+            await db.scalars(select(Entity.id).where(Entity.world_id == world_id))
+        )
+
+        # Rows referencing the world's entities go first. On Postgres the
+        # entities then go with their partitions; elsewhere they are deleted.
+        for model in (EntityEmbedding, GenerationJob, EntityRevision):
+            await db.execute(delete(model).where(model.world_id == world_id))
+        await drop_world_partitions(db, world_id)
+        await db.execute(
+            delete(entity_relationships).where(
+                entity_relationships.c.world_id == world_id
+            )
+        )
+        for model in (Entity, EntityType):
+            await db.execute(delete(model).where(model.world_id == world_id))
+
+        deleted = await db.scalar(
+            delete(World).where(World.id == world_id).returning(World.id)
+        )
+        if deleted is None:
+            raise ValueError(f"World with ID {id} not found")
+
+        for type_id, indexed_attributes in entity_types:
+            # Bind this type's values now, not the loop's last ones
+            info.context.unit_of_work.after_commit(
+                lambda type_id=type_id, paths=indexed_attributes: (
+                    sync_attribute_indexes(world_id, type_id, paths, [])
+                )
+            )
+        info.context.unit_of_work.after_commit(
+            lambda: invalidate_entity_types(world_id)
+        )
+        info.context.unit_of_work.after_commit(
+            lambda: invalidate_entities(world_id, entity_ids)
+        )
+        info.context.unit_of_work.after_commit(cost_statistics.invalidate)
+
+        return True
+
+    @strawberry.mutation
+    @transactional
+    async def create_entity(
+        self, info: Info, world_id: str, input: EntityInput
+    ) -> EntityGQL:
+        db: AsyncSession = info.context.db
+        world = uuid.UUID(world_id)
+
+        # Validate entity type exists in the world; types created earlier in
+        # this operation are not cached yet
+        type_id = uuid.UUID(input.typeId)
+        entity_types = await get_entity_types(world, lambda: db, info.context.db_lock)
+        entity_type = any(et.id == type_id for et in entity_types) or (
+            await db.scalar(
+                select(
+                    exists().where(
+                        EntityType.world_id == world, EntityType.id == type_id
+                    )
+                )
+            )
         )
-        entity_type = result.scalar_one_or_none() is not None
         if not entity_type:
             raise ValueError(f"Entity type with ID {input.typeId} not found")
 
         # Create entity
-        entity = Entity(
-            name=input.name,
-            type_id=input.typeId,
-            description=input.description,
-            attributes=input.attributes or {},
+        entity = await db.scalar(
+            insert(Entity)
+            .values(
+                world_id=world,
+                name=input.name,
+                type_id=type_id,
+                description=input.description,
+                attributes=input.attributes or {},
+            )
+            .returning(Entity)
+        )
+        await record_revisions(
+            db,
+            world,
+            [(entity.id, entity.version, entity_document(entity), None)],
+            source="create",
+        )
+        info.context.unit_of_work.after_commit(
+            lambda: change_feed.publish(entity_changes([entity], "create"))
         )
 
         # Add parent relationships if specified
@@ -46,135 +224,384 @@ class Mutation:
         #     ).all()
         #     entity.parents.extend(parents)
 
-        db.add(entity)
-        await db.commit()
-        await db.refresh(entity)
+        return EntityGQL.from_db(entity)
+
+    @strawberry.mutation
+    @transactional
+    async def bulk_create_entities(
+        self, info: Info, world_id: str, inputs: List[EntityBulkInput]
+    ) -> BulkEntityResult:
+        db: AsyncSession = info.context.db
+
+        changes = await bulk_write_entities(
+            db, uuid.UUID(world_id), [input.to_row() for input in inputs]
+        )
+        info.context.unit_of_work.after_commit(lambda: change_feed.publish(changes))
+        info.context.unit_of_work.after_commit(cost_statistics.invalidate)
+        ids = [change.entity_id for change in changes]
+
+        return BulkEntityResult(count=len(ids), ids=[str(id) for id in ids])
+
+    @strawberry.mutation
+    @transactional
+    async def bulk_upsert_entities(
+        self, info: Info, world_id: str, inputs: List[EntityBulkInput]
+    ) -> BulkEntityResult:
+        db: AsyncSession = info.context.db
+        world = uuid.UUID(world_id)
+
+        changes = await bulk_write_entities(
+            db, world, [input.to_row() for input in inputs], upsert=True
+        )
+        ids = [change.entity_id for change in changes]
+        info.context.unit_of_work.after_commit(lambda: invalidate_entities(world, ids))
+        info.context.unit_of_work.after_commit(lambda: change_feed.publish(changes))
+        info.context.unit_of_work.after_commit(cost_statistics.invalidate)
 
-        return await EntityGQL.from_db(entity)
+        return BulkEntityResult(count=len(ids), ids=[str(id) for id in ids])
 
     @strawberry.mutation
+    @transactional
     async def update_entity(
-        self, info: Info, id: str, input: EntityUpdateInput
+        self,
+        info: Info,
+        world_id: str,
+        id: str,
+        input: EntityUpdateInput,
+        expected_version: Optional[int] = None,
     ) -> EntityGQL:
+        """
+        Update an entity, merging input.attributes into its attributes. With
+        expectedVersion, fails instead if the entity is at another version.
+        """
         db: AsyncSession = info.context.db
-
-        entity = (
-            await db.execute(select(Entity).where(Entity.id == id))
-        ).scalar_one_or_none()
-        if not entity:
-            raise ValueError(f"Entity with ID {id} not found")
+        world, entity_id = uuid.UUID(world_id), uuid.UUID(id)
 
         # Update fields if provided
+        values, changes = {}, {}
         if input.name is not None:
-            entity.name = input.name
+            values["name"] = input.name
         if input.description is not None:
-            entity.description = input.description
+            values["description"] = input.description
         if input.attributes is not None:
-            # merge input.attributes and entity.attribuets as a new dict
-            entity.attributes = {**entity.attributes, **input.attributes}
+            # Merge input.attributes into the stored attributes
+            values["attributes"] = merged_attributes(
+                input.attributes, db.bind.dialect.name
+            )
+            changes = {key: ("set", value) for key, value in input.attributes.items()}
+
+        entity = await db.scalar(
+            entity_update(world, entity_id, expected_version)
+            .values(**values)
+            .returning(Entity),
+            execution_options={"populate_existing": True},
+        )
+        if entity is None:
+            raise await write_conflict(db, world, entity_id, expected_version)
+
+        document = entity_document(entity)
+        fields = [field for field in ("name", "description") if field in values]
+        await record_revisions(
+            db,
+            world,
+            [
+                (
+                    entity_id,
+                    entity.version,
+                    document,
+                    write_patch(document, fields, changes),
+                )
+            ],
+            source="update",
+        )
+
+        info.context.unit_of_work.after_commit(
+            lambda: invalidate_entities(world, [entity.id])
+        )
+        info.context.unit_of_work.after_commit(
+            lambda: change_feed.publish(entity_changes([entity], "update"))
+        )
+
+        return EntityGQL.from_db(entity)
+
+    @strawberry.mutation
+    @transactional
+    async def patch_entity_attributes(
+        self,
+        info: Info,
+        world_id: str,
+        id: str,
+        operations: List[AttributeOperation],
+        expected_version: Optional[int] = None,
+    ) -> EntityGQL:
+        """
+        Set, delete or append to individual attribute keys, in order, with a
+        single UPDATE that leaves every other key as stored. With
+        expectedVersion, fails instead if the entity is at another version.
+        """
+        db: AsyncSession = info.context.db
+        world, entity_id = uuid.UUID(world_id), uuid.UUID(id)
+
+        changes = fold_attribute_operations(
+            (operation.op.value, operation.key, operation.value)
+            for operation in operations
+        )
+        entity = await db.scalar(
+            entity_update(world, entity_id, expected_version)
+            .values(attributes=patched_attributes(changes, db.bind.dialect.name))
+            .returning(Entity),
+            execution_options={"populate_existing": True},
+        )
+        if entity is None:
+            raise await write_conflict(db, world, entity_id, expected_version)
+
+        document = entity_document(entity)
+        await record_revisions(
+            db,
+            world,
+            [(entity_id, entity.version, document, write_patch(document, (), changes))],
+            source="patch",
+        )
 
-        entity.updated_at = datetime.utcnow()
-        await db.commit()
-        await db.refresh(entity)
+        info.context.unit_of_work.after_commit(
+            lambda: invalidate_entities(world, [entity_id])
+        )
+        info.context.unit_of_work.after_commit(
+            lambda: change_feed.publish(entity_changes([entity], "patch"))
+        )
 
-        return await EntityGQL.from_db(entity)
+        return EntityGQL.from_db(entity)
 
     @strawberry.mutation
-    async def generate_and_update_entity(self, info: Info, entity_id: str) -> EntityGQL:
+    @transactional
+    async def revert_entity(
+        self,
+        info: Info,
+        world_id: str,
+        id: str,
+        revision: int,
+        expected_version: Optional[int] = None,
+    ) -> EntityGQL:
+        """
+        Restore an entity's name, description and attributes as of a revision
+        of its entityHistory. The revert is itself a new revision.
+        """
         db: AsyncSession = info.context.db
+        world, entity_id = uuid.UUID(world_id), uuid.UUID(id)
 
-        entity = (
-            await db.execute(select(Entity).where(Entity.id == entity_id))
-        ).scalar_one_or_none()
-        if not entity:
-            raise ValueError(f"Entity with ID {entity_id} not found")
+        previous = (await current_documents(db, world, [entity_id])).get(entity_id)
+        if previous is None:
+            raise ValueError(f"Entity with ID {id} not found")
+        document = await load_revision(db, world, entity_id, revision)
+        if document is None:
+            raise ValueError(f"Revision {revision} of entity {id} not found")
+
+        entity = await db.scalar(
+            entity_update(world, entity_id, expected_version)
+            .values(**document)
+            .returning(Entity),
+            execution_options={"populate_existing": True},
+        )
+        if entity is None:
+            raise await write_conflict(db, world, entity_id, expected_version)
+        await record_revisions(
+            db,
+            world,
+            [(entity_id, entity.version, document, diff_documents(previous, document))],
+            source="revert",
+        )
+
+        info.context.unit_of_work.after_commit(
+            lambda: invalidate_entities(world, [entity_id])
+        )
+        info.context.unit_of_work.after_commit(
+            lambda: change_feed.publish(entity_changes([entity], "revert"))
+        )
+
+        return EntityGQL.from_db(entity)
+
+    @strawberry.mutation
+    async def generate_and_update_entity(
+        self, info: Info, world_id: str, entity_id: str, fresh: bool = False
+    ) -> EntityGQL:
+        # Read and write in short sessions of their own, so no connection is
+        # held while waiting on the model
+        world, id = uuid.UUID(world_id), uuid.UUID(entity_id)
+        generation_input = await load_generation_input(world, id)
 
         # Generate new details
         generated_details = await generate_details(
-            entity_type=(await entity.awaitable_attrs.type_def).name,
-            entity_data={
-                **entity.attributes,
-                "name": entity.name,
-            },
-            prompt=entity.description,
+            entity_type=generation_input.entity_type,
+            entity_data=generation_input.entity_data,
+            prompt=generation_input.prompt,
+            world_setting=generation_input.world_setting,
+            use_cache=not fresh,
+            world_context=generation_input.world_context,
         )
 
         # Update entity
-        entity.attributes = {**entity.attributes, **generated_details}
-        entity.updated_at = datetime.utcnow()
+        entity = await apply_generated_details(
+            world, id, generated_details, expected_version=generation_input.version
+        )
 
-        await db.commit()
-        await db.refresh(entity)
+        return EntityGQL.from_db(entity)
 
-        return await EntityGQL.from_db(entity)
+    @strawberry.mutation
+    async def generate_entities(
+        self, info: Info, world_id: str, ids: List[str], fresh: bool = False
+    ) -> List[GenerationJobGQL]:
+        """Queue background generation for many entities and return the jobs"""
+        jobs = await job_pool.enqueue(
+            uuid.UUID(world_id), [uuid.UUID(id) for id in ids], fresh=fresh
+        )
+        return [GenerationJobGQL.from_db(job) for job in jobs]
 
     @strawberry.mutation
+    @transactional
     async def create_entity_type(
-        self, info: Info, input: EntityTypeInput
+        self, info: Info, world_id: str, input: EntityTypeInput
     ) -> EntityTypeGQL:
         db: AsyncSession = info.context.db
+        world = uuid.UUID(world_id)
+
+        if not await db.scalar(select(exists().where(World.id == world))):
+            raise ValueError(f"World with ID {world_id} not found")
 
-        result = await db.execute(
-            select(EntityType).where(EntityType.name == input.name)
+        existing = await db.scalar(
+            select(
+                exists().where(
+                    EntityType.world_id == world, EntityType.name == input.name
+                )
+            )
         )
-        existing = result.scalar_one_or_none() is not None
         if existing:
             raise ValueError(f"Entity type {input.name} already exists")
 
+        indexed_attributes = input.indexedAttributes or []
+        for path in indexed_attributes:
+            parse_attribute_path(path)
+
         # Create entity type
-        entity_type = EntityType(name=input.name, default_fields=input.defaultFields)
+        entity_type = await db.scalar(
+            insert(EntityType)
+            .values(
+                world_id=world,
+                name=input.name,
+                default_fields=input.defaultFields,
+                indexed_attributes=indexed_attributes,
+            )
+            .returning(EntityType)
+        )
 
-        db.add(entity_type)
-        await db.commit()
-        await db.refresh(entity_type)
+        # Indexes are built outside the transaction, once it has committed
+        info.context.unit_of_work.after_commit(
+            lambda: sync_attribute_indexes(
+                world, entity_type.id, [], indexed_attributes
+            )
+        )
+        info.context.unit_of_work.after_commit(lambda: invalidate_entity_types(world))
 
         return EntityTypeGQL.from_db(entity_type)
 
     @strawberry.mutation
-    async def update_entity_type(
-        self, info: Info, id: str, input: EntityTypeUpdateInput
+    @transactional
+    async def index_entity_attributes(
+        self, info: Info, world_id: str, type_id: str, paths: List[str]
     ) -> EntityTypeGQL:
+        """Declare the attribute paths to index for entities of a type"""
         db: AsyncSession = info.context.db
+        world = uuid.UUID(world_id)
+
+        for path in paths:
+            parse_attribute_path(path)
 
-        entity_type = await db.scalars(
-            select(EntityType).where(EntityType.id == id)
-        ).first()
+        entity_type = await db.scalar(
+            select(EntityType).where(
+                EntityType.world_id == world, EntityType.id == uuid.UUID(type_id)
+            )
+        )
         if not entity_type:
-            raise ValueError(f"Entity type with ID {id} not found")
+            raise ValueError(f"Entity type with ID {type_id} not found")
 
-        # Update fields if provided
-        if input.name is not None:
-            entity_type.name = input.name
+        previous_paths = entity_type.indexed_attributes or []
+        entity_type.indexed_attributes = list(dict.fromkeys(paths))
 
-        if input.name is not None:
-            entity_type.name = input.name
-        if input.default_fields is not None:
-            entity_type.default_fields = input.defaultFields
-
-        await db.commit()
-        await db.refresh(entity_type)
+        info.context.unit_of_work.after_commit(
+            lambda: sync_attribute_indexes(
+                world, entity_type.id, previous_paths, entity_type.indexed_attributes
+            )
+        )
+        info.context.unit_of_work.after_commit(lambda: invalidate_entity_types(world))
 
         return EntityTypeGQL.from_db(entity_type)
 
     @strawberry.mutation
-    async def delete_entity_type(self, info: Info, id: str) -> bool:
+    @transactional
+    async def update_entity_type(
+        self, info: Info, world_id: str, id: str, input: EntityTypeUpdateInput
+    ) -> EntityTypeGQL:
         db: AsyncSession = info.context.db
+        world, type_id = uuid.UUID(world_id), uuid.UUID(id)
 
-        entity_type = await db.scalars(
-            select(EntityType).where(EntityType.id == id)
-        ).first()
+        # Update fields if provided
+        values = {}
+        if input.name is not None:
+            taken = await db.scalar(
+                select(
+                    exists().where(
+                        EntityType.world_id == world,
+                        EntityType.name == input.name,
+                        EntityType.id != type_id,
+                    )
+                )
+            )
+            if taken:
+                raise ValueError(f"Entity type {input.name} already exists")
+            values["name"] = input.name
+        if input.defaultFields is not None:
+            values["default_fields"] = input.defaultFields
+
+        statement = update(EntityType).where(
+            EntityType.world_id == world, EntityType.id == type_id
+        )
+        entity_type = await db.scalar(
+            # An UPDATE needs a SET clause; an empty update just reads the row
+            (
+                statement.values(**values) if values else statement.values(id=type_id)
+            ).returning(EntityType),
+            execution_options={"populate_existing": True},
+        )
         if not entity_type:
             raise ValueError(f"Entity type with ID {id} not found")
 
+        info.context.unit_of_work.after_commit(lambda: invalidate_entity_types(world))
+
+        return EntityTypeGQL.from_db(entity_type)
+
+    @strawberry.mutation
+    @transactional
+    async def delete_entity_type(self, info: Info, world_id: str, id: str) -> bool:
+        db: AsyncSession = info.context.db
+        world, type_id = uuid.UUID(world_id), uuid.UUID(id)
+
         # Check if there are entities of this type
-        has_entities = (
-            db.scalars(select(Entity).where(Entity.type_id == id)).first() is not None
+        has_entities = await db.scalar(
+            select(exists().where(Entity.world_id == world, Entity.type_id == type_id))
         )
-
         if has_entities:
             raise ValueError("Cannot delete entity type that has existing entities")
 
-        await db.delete(entity_type)
-        await db.commit()
+        indexed_attributes = await db.scalar(
+            delete(EntityType)
+            .where(EntityType.world_id == world, EntityType.id == type_id)
+            .returning(EntityType.indexed_attributes)
+        )
+        if indexed_attributes is None:
+            raise ValueError(f"Entity type with ID {id} not found")
+
+        info.context.unit_of_work.after_commit(
+            lambda: sync_attribute_indexes(world, type_id, indexed_attributes, [])
+        )
+        info.context.unit_of_work.after_commit(lambda: invalidate_entity_types(world))
 
         return True
@@ -0,0 +1,64 @@
+from collections import OrderedDict
+import hashlib
+from typing import Any, Dict, Optional
+from graphql import GraphQLError
+
+from app.config import settings
+
+
+class PersistedQueryError(Exception):
+    """A persisted query request the server can't serve; sent as a GraphQL error"""
+
+    def __init__(self, message: str, code: str):
+        super().__init__(message)
+        self.code = code
+
+    def as_graphql_error(self) -> GraphQLError:
+        return GraphQLError(str(self), extensions={"code": self.code})
+
+
+class PersistedQueryRegistry:
+    """
+    Automatic persisted queries, in the Apollo protocol: the client sends
+    only the query's SHA-256 hash, and resends the full query once if the
+    server doesn't know it yet. Kept in process, most recently used first;
+    a forgotten query just costs the client one retry.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._queries: OrderedDict[str, str] = OrderedDict()
+
+    def resolve(
+        self, query: Optional[str], extensions: Optional[Dict[str, Any]]
+    ) -> Optional[str]:
+        """The query to run for a request's ``query`` and ``extensions``"""
+        persisted = (extensions or {}).get("persistedQuery")
+        if not persisted:
+            return query
+        if persisted.get("version") != 1:
+            raise PersistedQueryError(
+                "Unsupported persisted query version", "PERSISTED_QUERY_NOT_SUPPORTED"
+            )
+        sha256_hash = persisted.get("sha256Hash")
+
+        if query is None:
+            if sha256_hash not in self._queries:
+                raise PersistedQueryError(
+                    "PersistedQueryNotFound", "PERSISTED_QUERY_NOT_FOUND"
+                )
+            self._queries.move_to_end(sha256_hash)
+            return self._queries[sha256_hash]
+
+        if hashlib.sha256(query.encode()).hexdigest() != sha256_hash:
+            raise PersistedQueryError(
+                "provided sha does not match query", "PERSISTED_QUERY_HASH_MISMATCH"
+            )
+        self._queries[sha256_hash] = query
+        self._queries.move_to_end(sha256_hash)
+        while len(self._queries) > self.max_entries:
+            self._queries.popitem(last=False)
+        return query
+
+
+persisted_queries = PersistedQueryRegistry(settings.GRAPHQL_PERSISTED_QUERIES_ENTRIES)
@@ -1,24 +1,148 @@
-from typing import List, Optional
+from typing import Dict, Iterable, List, Optional
+import uuid
 import strawberry
 from strawberry.types import Info
-from sqlalchemy import select
+from sqlalchemy import Select, select, tuple_
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.models.entity import Entity, EntityType
-from app.schemas.entity import EntityGQL, EntityTypeGQL
+from app.models.entity import Entity, World
+from app.models.job import GenerationJob
+from app.schemas.entity import (
+    AttributeFilter,
+    EntityConnection,
+    EntityEdge,
+    EntityGQL,
+    EntityGraphGQL,
+    EntityRelationshipGQL,
+    EntitySearchResult,
+    EntityTypeGQL,
+    NearDuplicate,
+    SimilarEntity,
+    WorldGQL,
+)
+from app.schemas.pagination import (
+    PageInfo,
+    clamp_page_size,
+    decode_cursor,
+    encode_cursor,
+)
+from app.schemas.job import GenerationJobGQL
+from app.schemas.revision import EntityRevisionGQL
+from app.schemas.selection import (
+    entity_load_options,
+    selected_entity_columns,
+    selected_field_names,
+)
+from app.ai.embeddings import embedding_pipeline
+from app.database.attributes import attribute_equals
+from app.database.cache import get_entity, get_entity_types
+from app.database.graph import Direction, traverse
+from app.database.revisions import entity_history
+from app.database.search import search_entities
 from app.api.graphql.context import GraphQLContext
 
 
+def _filter_entities(
+    query: Select,
+    db: AsyncSession,
+    world_id: str,
+    type_id: Optional[str],
+    attributes: Optional[List[AttributeFilter]],
+) -> Select:
+    query = query.where(Entity.world_id == uuid.UUID(world_id))
+    if type_id is not None:
+        query = query.where(Entity.type_id == uuid.UUID(type_id))
+    for attribute in attributes or []:
+        query = query.where(
+            attribute_equals(attribute.path, attribute.eq, db.bind.dialect.name)
+        )
+    return query
+
+
+async def _load_entities(
+    info: Info[GraphQLContext, None],
+    world_id: uuid.UUID,
+    ids: Iterable[uuid.UUID],
+    columns: Iterable[str],
+) -> Dict[uuid.UUID, Entity]:
+    db: AsyncSession = info.context.read_db
+    async with info.context.db_lock:
+        result = await db.execute(
+            select(Entity)
+            .options(entity_load_options(columns))
+            .where(Entity.world_id == world_id, Entity.id.in_(set(ids)))
+        )
+    return {entity.id: entity for entity in result.scalars()}
+
+
+async def _entity_graph(
+    info: Info[GraphQLContext, None],
+    world_id: str,
+    root_ids: List[str],
+    direction: Direction,
+    max_depth: Optional[int],
+) -> EntityGraphGQL:
+    db: AsyncSession = info.context.read_db
+    world = uuid.UUID(world_id)
+    async with info.context.db_lock:
+        node_ids, edges = await traverse(
+            db, world, [uuid.UUID(id) for id in root_ids], direction, max_depth
+        )
+
+        nodes = []
+        if "nodes" in selected_field_names(info):
+            result = await db.execute(
+                select(Entity)
+                .options(
+                    entity_load_options(selected_entity_columns(info, path=("nodes",)))
+                )
+                .where(Entity.world_id == world, Entity.id.in_(node_ids))
+            )
+            nodes = result.scalars().all()
+
+    return EntityGraphGQL(
+        nodes=[EntityGQL.from_db(entity) for entity in nodes],
+        relationships=[
+            EntityRelationshipGQL(parentId=str(parent_id), childId=str(child_id))
+            for parent_id, child_id in edges
+        ],
+    )
+
+
 @strawberry.type
 class Query:
+    # Every entity and entity type belongs to a world; fields other than the
+    # world ones take a worldId and never see another world's data.
+
+    @strawberry.field
+    async def world(
+        self, info: Info[GraphQLContext, None], id: str
+    ) -> Optional[WorldGQL]:
+        """Get a single world by ID"""
+        db: AsyncSession = info.context.read_db
+        async with info.context.db_lock:
+            world = await db.get(World, uuid.UUID(id))
+        return WorldGQL.from_db(world) if world else None
+
+    @strawberry.field
+    async def worlds(self, info: Info[GraphQLContext, None]) -> List[WorldGQL]:
+        """Get all worlds"""
+        db: AsyncSession = info.context.read_db
+        async with info.context.db_lock:
+            result = await db.execute(select(World).order_by(World.name))
+        return [WorldGQL.from_db(world) for world in result.scalars()]
+
     @strawberry.field
     async def entity(
-        self, info: Info[GraphQLContext, None], id: int
+        self, info: Info[GraphQLContext, None], world_id: str, id: str
     ) -> Optional[EntityGQL]:
         """Get a single entity by ID"""
-        db: AsyncSession = info.context.db
-        result = await db.execute(select(Entity).where(Entity.id == id))
-        entity = result.scalar_one_or_none()
+        entity = await get_entity(
+            uuid.UUID(world_id),
+            uuid.UUID(id),
+            lambda: info.context.read_db,
+            info.context.db_lock,
+        )
 
         if not entity:
             return None
@@ -26,28 +150,253 @@ class Query:
         return EntityGQL.from_db(entity)
 
     @strawberry.field
+    async def entity_history(
+        self, info: Info[GraphQLContext, None], world_id: str, id: str
+    ) -> List[EntityRevisionGQL]:
+        """Every revision of an entity, oldest first; see revertEntity"""
+        async with info.context.db_lock:
+            history = await entity_history(
+                info.context.read_db, uuid.UUID(world_id), uuid.UUID(id)
+            )
+        return [
+            EntityRevisionGQL.from_db(revision, document)
+            for revision, document in history
+        ]
+
+    @strawberry.field(
+        # This used to return every entity of the world; it now stops at a
+        # page without saying whether there are more
+        deprecation_reason=(
+            "Returns at most `first` entities (100 by default, 1000 at most) "
+            "with no sign of more; page with entitiesConnection instead"
+        )
+    )
     async def entities(
-        self, info: Info[GraphQLContext, None], type_id: Optional[int] = None
+        self,
+        info: Info[GraphQLContext, None],
+        world_id: str,
+        type_id: Optional[str] = None,
+        attributes: Optional[List[AttributeFilter]] = None,
+        first: Optional[int] = None,
     ) -> List[EntityGQL]:
-        """Get all entities, optionally filtered by type"""
-        db: AsyncSession = info.context.db
-        query = select(Entity)
+        """
+        The first entities in creation order, optionally filtered by type and
+        attribute values. At most ``first`` (100 by default, 1000 at most);
+        page through the rest with entitiesConnection.
+        """
+        db: AsyncSession = info.context.read_db
+        query = (
+            select(Entity)
+            .options(entity_load_options(selected_entity_columns(info)))
+            .order_by(Entity.created_at, Entity.id)
+            .limit(clamp_page_size(first))
+        )
+        query = _filter_entities(query, db, world_id, type_id, attributes)
 
-        if type_id is not None:
-            query = query.where(Entity.type_id == type_id)
+        async with info.context.db_lock:
+            result = await db.execute(query)
+        return [EntityGQL.from_db(entity) for entity in result.scalars()]
 
-        result = await db.execute(query)
+    @strawberry.field
+    async def entities_connection(
+        self,
+        info: Info[GraphQLContext, None],
+        world_id: str,
+        first: Optional[int] = None,
+        after: Optional[str] = None,
+        type_id: Optional[str] = None,
+        attributes: Optional[List[AttributeFilter]] = None,
+    ) -> EntityConnection:
+        """Get a page of entities in creation order, optionally filtered"""
+        db: AsyncSession = info.context.read_db
+        limit = clamp_page_size(first)
+        columns = {
+            "created_at",
+            *selected_entity_columns(info, path=("edges", "node")),
+        }
+        query = (
+            select(Entity)
+            .options(entity_load_options(columns))
+            .order_by(Entity.created_at, Entity.id)
+            .limit(limit + 1)
+        )
+
+        query = _filter_entities(query, db, world_id, type_id, attributes)
+        if after is not None:
+            query = query.where(
+                tuple_(Entity.created_at, Entity.id) > tuple_(*decode_cursor(after))
+            )
+
+        async with info.context.db_lock:
+            result = await db.execute(query)
         entities = result.scalars().all()
-        return [EntityGQL.from_db(entity) for entity in entities]
+
+        edges = [
+            EntityEdge(
+                cursor=encode_cursor(entity.created_at, entity.id),
+                node=EntityGQL.from_db(entity),
+            )
+            for entity in entities[:limit]
+        ]
+        return EntityConnection(
+            edges=edges,
+            pageInfo=PageInfo(
+                hasNextPage=len(entities) > limit,
+                endCursor=edges[-1].cursor if edges else None,
+            ),
+        )
+
+    @strawberry.field
+    async def search_entities(
+        self,
+        info: Info[GraphQLContext, None],
+        world_id: str,
+        query: str,
+        type_id: Optional[str] = None,
+        first: Optional[int] = None,
+    ) -> List[EntitySearchResult]:
+        """Full-text search over entity names, descriptions and attribute values"""
+        db: AsyncSession = info.context.read_db
+        async with info.context.db_lock:
+            results = await search_entities(
+                db,
+                uuid.UUID(world_id),
+                query,
+                type_id=uuid.UUID(type_id) if type_id is not None else None,
+                limit=clamp_page_size(first),
+                load_options=entity_load_options(
+                    selected_entity_columns(info, path=("entity",))
+                ),
+            )
+        return [
+            EntitySearchResult(entity=EntityGQL.from_db(entity), rank=rank)
+            for entity, rank in results
+        ]
+
+    @strawberry.field
+    async def similar_entities(
+        self,
+        info: Info[GraphQLContext, None],
+        world_id: str,
+        id: Optional[str] = None,
+        text: Optional[str] = None,
+        k: int = 10,
+        type_id: Optional[str] = None,
+    ) -> List[SimilarEntity]:
+        """Get the entities closest in meaning to an entity or to free text"""
+        if (id is None) == (text is None):
+            raise ValueError("Provide exactly one of id or text")
+
+        world = uuid.UUID(world_id)
+        await embedding_pipeline.sync()
+        if id is not None:
+            entity_id = uuid.UUID(id)
+            vector = embedding_pipeline.vector_for(world, entity_id)
+            if vector is None:
+                raise ValueError(f"Entity with ID {id} not found")
+        else:
+            entity_id = None
+            vector = await embedding_pipeline.embed_text(text)
+
+        matches = embedding_pipeline.similar(
+            vector,
+            world,
+            k=clamp_page_size(k),
+            exclude=entity_id,
+            type_id=uuid.UUID(type_id) if type_id is not None else None,
+        )
+        entities = await _load_entities(
+            info,
+            world,
+            [match_id for match_id, _ in matches],
+            selected_entity_columns(info, path=("entity",)),
+        )
+        return [
+            SimilarEntity(entity=EntityGQL.from_db(entities[match_id]), score=score)
+            for match_id, score in matches
+            if match_id in entities
+        ]
+
+    @strawberry.field
+    async def near_duplicates(
+        self,
+        info: Info[GraphQLContext, None],
+        world_id: str,
+        threshold: float = 0.9,
+        type_id: Optional[str] = None,
+        first: Optional[int] = None,
+    ) -> List[NearDuplicate]:
+        """Get pairs of same-type entities at least ``threshold`` similar"""
+        world = uuid.UUID(world_id)
+        await embedding_pipeline.sync()
+        pairs = embedding_pipeline.near_duplicates(
+            threshold,
+            world,
+            type_id=uuid.UUID(type_id) if type_id is not None else None,
+        )[: clamp_page_size(first)]
+
+        entities = await _load_entities(
+            info,
+            world,
+            [id for a, b, _ in pairs for id in (a, b)],
+            {
+                *selected_entity_columns(info, path=("entity",)),
+                *selected_entity_columns(info, path=("duplicate",)),
+            },
+        )
+        return [
+            NearDuplicate(
+                entity=EntityGQL.from_db(entities[a]),
+                duplicate=EntityGQL.from_db(entities[b]),
+                score=score,
+            )
+            for a, b, score in pairs
+            if a in entities and b in entities
+        ]
+
+    @strawberry.field
+    async def descendants(
+        self,
+        info: Info[GraphQLContext, None],
+        world_id: str,
+        id: str,
+        max_depth: Optional[int] = None,
+    ) -> EntityGraphGQL:
+        """Get an entity and everything below it in the hierarchy"""
+        return await _entity_graph(info, world_id, [id], "descendants", max_depth)
+
+    @strawberry.field
+    async def ancestors(
+        self,
+        info: Info[GraphQLContext, None],
+        world_id: str,
+        id: str,
+        max_depth: Optional[int] = None,
+    ) -> EntityGraphGQL:
+        """Get an entity and everything above it in the hierarchy"""
+        return await _entity_graph(info, world_id, [id], "ancestors", max_depth)
+
+    @strawberry.field
+    async def subgraph(
+        self,
+        info: Info[GraphQLContext, None],
+        world_id: str,
+        root_ids: List[str],
+        max_depth: Optional[int] = None,
+    ) -> EntityGraphGQL:
+        """Get several entities and everything below them in the hierarchy"""
+        return await _entity_graph(info, world_id, root_ids, "descendants", max_depth)
 
     @strawberry.field
     async def entity_type(
-        self, info: Info[GraphQLContext, None], id: int
+        self, info: Info[GraphQLContext, None], world_id: str, id: str
     ) -> Optional[EntityTypeGQL]:
         """Get a single entity type by ID"""
-        db: AsyncSession = info.context.db
-        result = await db.execute(select(EntityType).where(EntityType.id == id))
-        entity_type = result.scalar_one_or_none()
+        type_id = uuid.UUID(id)
+        entity_types = await get_entity_types(
+            uuid.UUID(world_id), lambda: info.context.read_db, info.context.db_lock
+        )
+        entity_type = next((et for et in entity_types if et.id == type_id), None)
 
         if not entity_type:
             return None
@@ -56,10 +405,35 @@ class Query:
 
     @strawberry.field
     async def entity_types(
-        self, info: Info[GraphQLContext, None]
+        self, info: Info[GraphQLContext, None], world_id: str
     ) -> List[EntityTypeGQL]:
         """Get all entity types"""
-        db: AsyncSession = info.context.db
-        result = await db.execute(select(EntityType))
-        entity_types = result.scalars().all()
+        entity_types = await get_entity_types(
+            uuid.UUID(world_id), lambda: info.context.read_db, info.context.db_lock
+        )
         return [EntityTypeGQL.from_db(et) for et in entity_types]
+
+    @strawberry.field
+    async def generation_jobs(
+        self,
+        info: Info[GraphQLContext, None],
+        world_id: str,
+        batch_id: Optional[str] = None,
+        ids: Optional[List[str]] = None,
+    ) -> List[GenerationJobGQL]:
+        """Get generation jobs by batch and/or job IDs"""
+        db: AsyncSession = info.context.read_db
+        query = (
+            select(GenerationJob)
+            .where(GenerationJob.world_id == uuid.UUID(world_id))
+            .order_by(GenerationJob.created_at)
+        )
+
+        if batch_id is not None:
+            query = query.where(GenerationJob.batch_id == uuid.UUID(batch_id))
+        if ids is not None:
+            query = query.where(GenerationJob.id.in_([uuid.UUID(id) for id in ids]))
+
+        async with info.context.db_lock:
+            result = await db.execute(query)
+        return [GenerationJobGQL.from_db(job) for job in result.scalars()]
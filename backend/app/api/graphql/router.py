@@ -0,0 +1,95 @@
+import hashlib
+from typing import Any, Optional
+from fastapi import Request, Response
+from strawberry import UNSET
+from strawberry.fastapi import GraphQLRouter as BaseGraphQLRouter
+from strawberry.http import GraphQLHTTPResponse, GraphQLRequestData
+from strawberry.http.async_base_view import AsyncHTTPRequestAdapter
+from strawberry.types import ExecutionResult
+
+from app.config import settings
+from app.api.graphql.persisted_queries import PersistedQueryError, persisted_queries
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags
+
+
+class GraphQLRouter(BaseGraphQLRouter):
+    """
+    Adds automatic persisted queries (see PersistedQueryRegistry) and HTTP
+    caching of queries sent with GET: successful responses carry an ETag and
+    Cache-Control, and a request whose If-None-Match still matches gets a 304.
+    """
+
+    def should_render_graphql_ide(self, request: AsyncHTTPRequestAdapter) -> bool:
+        # A persisted query sent with GET has no query parameter either
+        return (
+            "extensions" not in request.query_params
+            and super().should_render_graphql_ide(request)
+        )
+
+    async def parse_http_body(
+        self, request: AsyncHTTPRequestAdapter
+    ) -> GraphQLRequestData:
+        content_type = request.content_type or ""
+        if "application/json" in content_type:
+            data = self.parse_json(await request.get_body())
+        elif request.method == "GET":
+            data = self.parse_query_params(request.query_params)
+        else:
+            # Multipart uploads don't use persisted queries
+            return await super().parse_http_body(request)
+
+        extensions = data.get("extensions")
+        if isinstance(extensions, str):
+            # GET requests send it JSON-encoded, like variables
+            extensions = self.parse_json(extensions)
+        return GraphQLRequestData(
+            query=persisted_queries.resolve(data.get("query"), extensions),
+            variables=data.get("variables"),
+            operation_name=data.get("operationName"),
+        )
+
+    async def execute_operation(
+        self, request: Request, context: Any, root_value: Any
+    ) -> ExecutionResult:
+        try:
+            return await super().execute_operation(request, context, root_value)
+        except PersistedQueryError as e:
+            return ExecutionResult(data=None, errors=[e.as_graphql_error()])
+
+    async def process_result(
+        self, request: Request, result: ExecutionResult
+    ) -> GraphQLHTTPResponse:
+        # Only error-free results are cacheable
+        request.state.graphql_cacheable = not result.errors
+        return await super().process_result(request, result)
+
+    async def run(
+        self, request: Request, context: Any = UNSET, root_value: Any = UNSET
+    ) -> Response:
+        response = await super().run(request, context, root_value)
+        # GET only ever runs queries; the GraphiQL page is served as HTML
+        if (
+            request.method != "GET"
+            or response.media_type != "application/json"
+            or response.status_code != 200
+        ):
+            return response
+        if not getattr(request.state, "graphql_cacheable", False):
+            response.headers["Cache-Control"] = "no-store"
+            return response
+
+        etag = '"' + hashlib.sha256(response.body).hexdigest()[:32] + '"'
+        headers = {
+            "ETag": etag,
+            "Cache-Control": f"public, max-age={settings.GRAPHQL_GET_MAX_AGE_SECONDS}",
+        }
+        if _etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers=headers)
+        response.headers.update(headers)
+        return response
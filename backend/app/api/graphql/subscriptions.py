@@ -0,0 +1,109 @@
+import asyncio
+from contextlib import aclosing
+from typing import Any, AsyncGenerator, Dict, List, Optional, Tuple
+import uuid
+import strawberry
+from strawberry.types import Info
+from sqlalchemy import select
+
+from app.config import settings
+from app.database import async_session_maker
+from app.database.changes import change_feed
+from app.models.job import GenerationJob, JobStatus
+from app.schemas.entity import (
+    EntityChangeEvent,
+    EntityChangeGQL,
+    EntityGenerationEvent,
+    EntityGQL,
+)
+from app.schemas.job import GenerationJobGQL
+from app.ai.entities import apply_generated_details, load_generation_input
+from app.ai.service import stream_details
+
+FINISHED_JOB_STATUSES = (JobStatus.SUCCEEDED, JobStatus.FAILED)
+
+
+@strawberry.type
+class Subscription:
+    @strawberry.subscription
+    async def entity_changed(
+        self, info: Info, world_id: str, type_ids: Optional[List[str]] = None
+    ) -> AsyncGenerator[EntityChangeEvent, None]:
+        """
+        Committed changes to a world's entities, optionally of some types only,
+        as they happen. Events carry IDs and versions, not the entities:
+        refetch the ones on display whose version is newer.
+        """
+        changes = change_feed.subscribe(
+            uuid.UUID(world_id),
+            [uuid.UUID(type_id) for type_id in type_ids] if type_ids else None,
+        )
+        # Unsubscribe as soon as the client does
+        async with aclosing(changes):
+            async for resync, batch in changes:
+                yield EntityChangeEvent(
+                    changes=[EntityChangeGQL.from_change(change) for change in batch],
+                    resync=resync,
+                )
+
+    @strawberry.subscription
+    async def generation_jobs(
+        self, info: Info, world_id: str, batch_id: str
+    ) -> AsyncGenerator[List[GenerationJobGQL], None]:
+        """Emit the jobs of a batch whenever any of them changes, until all finish"""
+        seen: Dict[uuid.UUID, Tuple] = {}
+        while True:
+            # A short-lived session per poll; jobs are updated by other sessions
+            async with async_session_maker() as db:
+                jobs = (
+                    await db.scalars(
+                        select(GenerationJob)
+                        .where(
+                            GenerationJob.world_id == uuid.UUID(world_id),
+                            GenerationJob.batch_id == uuid.UUID(batch_id),
+                        )
+                        .order_by(GenerationJob.created_at)
+                    )
+                ).all()
+
+            state = {job.id: (job.status, job.attempts) for job in jobs}
+            if state != seen:
+                seen = state
+                yield [GenerationJobGQL.from_db(job) for job in jobs]
+
+            if all(job.status in FINISHED_JOB_STATUSES for job in jobs):
+                return
+            await asyncio.sleep(settings.JOB_POLL_SECONDS)
+
+    @strawberry.subscription
+    async def generate_entity(
+        self, info: Info, world_id: str, entity_id: str, fresh: bool = False
+    ) -> AsyncGenerator[EntityGenerationEvent, None]:
+        """Stream generated details field by field, then save them to the entity"""
+        world, id = uuid.UUID(world_id), uuid.UUID(entity_id)
+        generation_input = await load_generation_input(world, id)
+
+        sent: Dict[str, Any] = {}
+        async for partial in stream_details(
+            entity_type=generation_input.entity_type,
+            entity_data=generation_input.entity_data,
+            prompt=generation_input.prompt,
+            world_setting=generation_input.world_setting,
+            use_cache=not fresh,
+            world_context=generation_input.world_context,
+        ):
+            delta = {
+                field: value
+                for field, value in partial.items()
+                if sent.get(field) != value
+            }
+            if delta:
+                sent.update(delta)
+                yield EntityGenerationEvent(entityId=entity_id, delta=delta, done=False)
+
+        entity = await apply_generated_details(
+            world, id, sent, expected_version=generation_input.version
+        )
+        yield EntityGenerationEvent(
+            entityId=entity_id, delta={}, done=True, entity=EntityGQL.from_db(entity)
+        )
@@ -0,0 +1,18 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from app.ai.clients import model_registry
+from app.database.cache import entity_cache
+from app.database.instrumentation import pool_metrics, query_metrics
+
+router = APIRouter()
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics() -> str:
+    """SQL, connection pool, cache and model call statistics in the Prometheus format"""
+    text = query_metrics.render_prometheus() + pool_metrics.render_prometheus()
+    text += model_registry.render_prometheus()
+    if entity_cache is not None:
+        text += entity_cache.render_prometheus()
+    return text
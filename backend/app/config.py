@@ -1,4 +1,4 @@
-from typing import Literal, Union
+from typing import Dict, Literal, Optional, Union
 import dotenv
 from pydantic_ai.models import KnownModelName
 from pydantic_settings import BaseSettings, SettingsConfigDict
@@ -18,11 +18,105 @@ class Settings(BaseSettings):
     model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf-8")
 
     DATABASE_URL: str = "sqlite:///./worldbuilding.db"
+    # Optional read replica; GraphQL queries and exports read from it when set
+    DATABASE_REPLICA_URL: Optional[str] = None
+    # Connection pool, per engine
+    DATABASE_POOL_SIZE: int = 10
+    DATABASE_MAX_OVERFLOW: int = 20
+    DATABASE_POOL_TIMEOUT_SECONDS: float = 30.0  # Wait for a free connection
+    DATABASE_POOL_RECYCLE_SECONDS: int = 30 * 60
+    DATABASE_CONNECT_TIMEOUT_SECONDS: float = 10.0
+    # Log every SQL statement; see /metrics for per-statement statistics instead
+    DATABASE_ECHO: bool = False
+    # Statements slower than this are logged
+    SQL_SLOW_QUERY_MS: float = 100.0
+    # A statement repeated this many times in one GraphQL operation is flagged
+    SQL_N_PLUS_ONE_THRESHOLD: int = 5
     USE_LOCAL_MODEL: bool = False
     AI_MODEL: KnownModelName | str = ""
     ANTHROPIC_API_KEY: str = ""
     OPENAI_API_KEY: str = ""
     TOGETHER_API_KEY: str = ""
+    # Max field generations in flight at once for generate_details_by_field
+    AI_FIELD_CONCURRENCY: int = 4
+    # LLM response cache; the persistent tier lives in the llm_cache table
+    AI_CACHE_ENABLED: bool = True
+    AI_CACHE_MEMORY_ENTRIES: int = 512
+    AI_CACHE_PERSISTENT: bool = True
+    AI_CACHE_TTL_SECONDS: int = 7 * 24 * 60 * 60
+    AI_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    # How often expired entries are deleted and the stored size recounted
+    AI_CACHE_SWEEP_SECONDS: int = 60
+    # Background generation jobs
+    JOB_WORKERS: int = 8
+    JOB_POLL_SECONDS: float = 2.0
+    JOB_MAX_ATTEMPTS: int = 3
+    # A running job's lease is renewed every JOB_HEARTBEAT_SECONDS, and as
+    # often jobs whose lease ran out (their process went away) are put back
+    JOB_LEASE_SECONDS: int = 60
+    JOB_HEARTBEAT_SECONDS: int = 15
+    # Failed attempts wait base * 2^(attempt - 1) seconds, up to max, to retry
+    JOB_RETRY_BASE_SECONDS: float = 10.0
+    JOB_RETRY_MAX_SECONDS: float = 10 * 60.0
+    # Generations in flight per provider, e.g. {"openai": 8, "local": 1}
+    AI_PROVIDER_CONCURRENCY: Dict[str, int] = {}
+    AI_DEFAULT_PROVIDER_CONCURRENCY: int = 4
+    # Provider quotas in requests and tokens per minute, e.g. {"openai": 500};
+    # calls wait for them. Unlisted providers are not limited
+    AI_PROVIDER_RPM: Dict[str, int] = {}
+    AI_PROVIDER_TPM: Dict[str, int] = {}
+    # Tokens a response is assumed to use until the provider reports usage
+    AI_RESPONSE_TOKENS_ESTIMATE: int = 500
+    # Rate limited, overloaded and failed model calls are retried with
+    # exponential backoff and full jitter, or after the provider's Retry-After
+    AI_MAX_ATTEMPTS: int = 4
+    AI_RETRY_BASE_SECONDS: float = 0.5
+    AI_RETRY_MAX_SECONDS: float = 30.0
+    AI_REQUEST_TIMEOUT_SECONDS: float = 120.0
+    # Model also sent a call once it outlasts AI_MODEL's p95 latency (measured
+    # over at least AI_HEDGE_MIN_SAMPLES calls), e.g. "openai:gpt-4o-mini"; the
+    # first answer wins
+    AI_HEDGE_MODEL: str = ""
+    AI_HEDGE_MIN_SAMPLES: int = 20
+    # OpenAI-compatible server used when USE_LOCAL_MODEL is set
+    AI_LOCAL_BASE_URL: str = "http://localhost:1234/v1"
+    # Entity embeddings: "hashing" for the built-in offline embedder, otherwise
+    # a sentence-transformers model name run locally on CPU
+    EMBEDDING_MODEL: str = "hashing"
+    EMBEDDING_DIMENSIONS: int = 256  # hashing embedder only
+    EMBEDDING_BATCH_SIZE: int = 256
+    EMBEDDING_REFRESH_SECONDS: float = 30.0
+    # Related entities shown to the model when generating details
+    AI_CONTEXT_TOKEN_BUDGET: int = 1500
+    AI_CONTEXT_RELATED_K: int = 5
+    AI_CONTEXT_CACHE_ENTRIES: int = 1024
+    AI_CONTEXT_CACHE_TTL_SECONDS: int = 60 * 60
+    # Read-through cache for entities and entity types. Without a shared tier
+    # (any Redis-compatible server) other processes see changes within the TTL
+    ENTITY_CACHE_ENABLED: bool = True
+    ENTITY_CACHE_ENTRIES: int = 10_000
+    ENTITY_CACHE_TTL_SECONDS: int = 5 * 60
+    ENTITY_CACHE_REDIS_URL: Optional[str] = None
+    # Entity history keeps a full snapshot every this many revisions and JSON
+    # patches in between, so any revision is at most this many patches away
+    ENTITY_REVISION_SNAPSHOT_INTERVAL: int = 32
+    # GraphQL endpoint: automatic persisted queries kept, parsed and validated
+    # documents kept, and how long clients may reuse a GET query's response
+    GRAPHQL_PERSISTED_QUERIES_ENTRIES: int = 1000
+    GRAPHQL_DOCUMENT_CACHE_ENTRIES: int = 1000
+    GRAPHQL_GET_MAX_AGE_SECONDS: int = 5
+    # Per-operation limits: estimated objects resolved, with list lengths taken
+    # from table statistics refreshed this often, and field nesting depth
+    GRAPHQL_MAX_COST: int = 100_000
+    GRAPHQL_MAX_DEPTH: int = 12
+    GRAPHQL_DEFAULT_LIST_SIZE: int = 10
+    GRAPHQL_COST_STATISTICS_SECONDS: float = 60.0
+    # entityChanged subscriptions: changes within this window go out as one
+    # event, and a subscriber this many entities behind is told to resync
+    CHANGE_FEED_COALESCE_SECONDS: float = 0.1
+    CHANGE_FEED_MAX_PENDING: int = 1000
+    # How often the Postgres LISTEN connection is checked, and retried
+    CHANGE_FEED_PING_SECONDS: float = 30.0
 
 
 settings = Settings()
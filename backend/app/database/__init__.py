@@ -1,21 +1,66 @@
-from typing import AsyncGenerator
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
+from typing import Any, AsyncGenerator, Dict
+from sqlalchemy import make_url
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
 from sqlalchemy.orm import declarative_base
 from app.config import settings
+from app.database.instrumentation import instrument_engine, instrument_pool
+
+
+def create_engine(url: str, name: str) -> AsyncEngine:
+    """Async engine with the pool configured from Settings and instrumented"""
+    url = make_url(url)
+    options: Dict[str, Any] = {
+        "echo": settings.DATABASE_ECHO,
+        "future": True,
+        "pool_pre_ping": True,
+    }
+    capacity = None
+    # In-memory SQLite shares one connection and has no pool to size
+    if url.database not in (None, "", ":memory:"):
+        options.update(
+            pool_size=settings.DATABASE_POOL_SIZE,
+            max_overflow=settings.DATABASE_MAX_OVERFLOW,
+            pool_timeout=settings.DATABASE_POOL_TIMEOUT_SECONDS,
+            pool_recycle=settings.DATABASE_POOL_RECYCLE_SECONDS,
+        )
+        capacity = settings.DATABASE_POOL_SIZE + settings.DATABASE_MAX_OVERFLOW
+    if url.get_backend_name() in ("postgresql", "sqlite"):
+        # asyncpg: connection timeout; sqlite: how long to wait on a locked db
+        options["connect_args"] = {"timeout": settings.DATABASE_CONNECT_TIMEOUT_SECONDS}
+
+    engine = create_async_engine(url, **options)
+    instrument_engine(engine.sync_engine)
+    instrument_pool(engine.sync_engine, name, capacity)
+    return engine
+
 
 # Create async engine
-engine = create_async_engine(
-    settings.DATABASE_URL,
-    echo=True,
-    future=True,
-    pool_pre_ping=True,
-)
+engine = create_engine(settings.DATABASE_URL, "primary")
 
 # Create async session maker
 async_session_maker = async_sessionmaker(
     engine, class_=AsyncSession, expire_on_commit=False, autoflush=False
 )
 
+# Sessions for read-only work: the replica when one is configured
+replica_engine = (
+    create_engine(settings.DATABASE_REPLICA_URL, "replica")
+    if settings.DATABASE_REPLICA_URL
+    else None
+)
+read_session_maker = (
+    async_sessionmaker(
+        replica_engine, class_=AsyncSession, expire_on_commit=False, autoflush=False
+    )
+    if replica_engine is not None
+    else async_session_maker
+)
+
 Base = declarative_base()
 
 
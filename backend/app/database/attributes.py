@@ -0,0 +1,273 @@
+import hashlib
+import json
+import re
+from typing import Any, Dict, Iterable, List, Tuple
+import uuid
+from sqlalchemy import (
+    Column,
+    ColumnElement,
+    Index,
+    MetaData,
+    Table,
+    Text,
+    case,
+    func,
+    literal,
+    type_coerce,
+)
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB, UUID
+from sqlalchemy.schema import CreateIndex, DropIndex
+
+from app.database import engine
+from app.models.entity import Entity
+from app.database.partitions import partition_name
+
+# Attribute paths are dot-separated keys, e.g. "profession" or "stats.strength"
+ATTRIBUTE_PATH_PATTERN = re.compile(r"^\w+(\.\w+)*$")
+
+
+def parse_attribute_path(path: str) -> Tuple[str, ...]:
+    if not ATTRIBUTE_PATH_PATTERN.match(path):
+        raise ValueError(f"Invalid attribute path: {path!r}")
+    return tuple(path.split("."))
+
+
+def attribute_text(
+    path: str, dialect: str, attributes: ColumnElement = Entity.attributes
+) -> ColumnElement:
+    """
+    Text value at ``path`` in Entity.attributes (or another ``attributes``
+    column of the same type).
+
+    The path is rendered inline rather than bound, so the expression matches
+    the per-type expression indexes built from it (and prepared statements
+    still get planned against them).
+    """
+    keys = parse_attribute_path(path)
+    if dialect == "postgresql":
+        if len(keys) == 1:
+            return attributes.op("->>")(literal(keys[0], literal_execute=True))
+        return attributes.op("#>>")(
+            literal("{" + ",".join(keys) + "}", literal_execute=True)
+        )
+    if dialect == "sqlite":
+        return func.json_extract(attributes, literal("$." + path, literal_execute=True))
+    raise NotImplementedError(f"Attribute filters are not supported on {dialect}")
+
+
+def attribute_equals(path: str, value: Any, dialect: str) -> ColumnElement:
+    """Predicate matching entities whose attribute at ``path`` equals ``value``"""
+    if isinstance(value, str):
+        # ->> / json_extract text comparison, served by expression indexes
+        return attribute_text(path, dialect) == value
+    if value is None:
+        # Missing or null
+        return attribute_text(path, dialect).is_(None)
+
+    if dialect == "postgresql":
+        # Containment, served by the GIN index on attributes
+        document = value
+        for key in reversed(parse_attribute_path(path)):
+            document = {key: document}
+        return type_coerce(Entity.attributes, JSONB).contains(document)
+
+    extracted = attribute_text(path, dialect)
+    if isinstance(value, (dict, list)):
+        return extracted == func.json(json.dumps(value, separators=(",", ":")))
+    return extracted == value
+
+
+def merged_attributes(patch: Dict[str, Any], dialect: str) -> ColumnElement:
+    """
+    Entity.attributes with the top-level keys of ``patch`` set, computed in
+    the UPDATE itself so no read is needed first
+    """
+    if dialect == "postgresql":
+        return type_coerce(Entity.attributes, JSONB).op("||", return_type=JSONB)(
+            literal(patch, JSONB)
+        )
+    if dialect == "sqlite":
+        arguments = []
+        for key, value in patch.items():
+            # Quoted path segments can't contain a double quote in SQLite
+            if '"' in key:
+                raise ValueError(f"Invalid attribute key: {key!r}")
+            arguments += [f'$."{key}"', func.json(json.dumps(value))]
+        if not arguments:
+            return Entity.attributes
+        return func.json_set(
+            Entity.attributes, *arguments, type_=Entity.attributes.type
+        )
+    raise NotImplementedError(f"Attribute updates are not supported on {dialect}")
+
+
+# The net change to one attribute key: ("set", value), ("delete", None), or
+# ("append", values) to add to the array at the key, starting one if needed
+AttributeChange = Tuple[str, Any]
+
+
+def fold_attribute_operations(
+    operations: Iterable[Tuple[str, str, Any]],
+) -> Dict[str, AttributeChange]:
+    """
+    The net change per key of ``(op, key, value)`` operations ("set",
+    "delete" or "append") applied in order, so patched_attributes touches
+    each key once
+    """
+    changes: Dict[str, AttributeChange] = {}
+    for op, key, value in operations:
+        if not key:
+            raise ValueError("Attribute keys can't be empty")
+        if op == "set":
+            changes[key] = ("set", value)
+        elif op == "delete":
+            changes[key] = ("delete", None)
+        elif op == "append":
+            kind, current = changes.get(key, (None, None))
+            if kind == "set":
+                current = current if isinstance(current, list) else []
+                changes[key] = ("set", current + [value])
+            elif kind == "delete":
+                changes[key] = ("set", [value])
+            elif kind == "append":
+                changes[key] = ("append", current + [value])
+            else:
+                changes[key] = ("append", [value])
+        else:
+            raise ValueError(f"Unknown attribute operation: {op!r}")
+    return changes
+
+
+def _keys_of(changes: Dict[str, AttributeChange], kind: str) -> List[str]:
+    return [key for key, (change, _) in changes.items() if change == kind]
+
+
+def patched_attributes(
+    changes: Dict[str, AttributeChange], dialect: str
+) -> ColumnElement:
+    """
+    Entity.attributes with ``changes`` from fold_attribute_operations
+    applied, computed in the UPDATE itself so concurrent writes to other keys
+    are kept. Appends read the stored array, which no other change touches.
+    """
+    if dialect == "postgresql":
+        attributes = type_coerce(Entity.attributes, JSONB)
+        patched = attributes
+        deleted = _keys_of(changes, "delete")
+        if deleted:
+            patched = patched.op("-", return_type=JSONB)(literal(deleted, ARRAY(Text)))
+        values = {key: changes[key][1] for key in _keys_of(changes, "set")}
+        if values:
+            patched = patched.op("||", return_type=JSONB)(literal(values, JSONB))
+        for key in _keys_of(changes, "append"):
+            current = attributes.op("->", return_type=JSONB)(literal(key))
+            array = case(
+                (func.jsonb_typeof(current) == "array", current),
+                else_=literal([], JSONB),
+            )
+            patched = func.jsonb_set(
+                patched,
+                literal([key], ARRAY(Text)),
+                array.op("||", return_type=JSONB)(literal(changes[key][1], JSONB)),
+                type_=JSONB,
+            )
+        return patched
+
+    if dialect == "sqlite":
+        paths = {}
+        for key in changes:
+            # Quoted path segments can't contain a double quote in SQLite
+            if '"' in key:
+                raise ValueError(f"Invalid attribute key: {key!r}")
+            paths[key] = f'$."{key}"'
+        patched = Entity.attributes
+        deleted = _keys_of(changes, "delete")
+        if deleted:
+            patched = func.json_remove(patched, *(paths[key] for key in deleted))
+        arguments = []
+        for key in _keys_of(changes, "set"):
+            arguments += [paths[key], func.json(json.dumps(changes[key][1]))]
+        for key in _keys_of(changes, "append"):
+            array = case(
+                (
+                    func.json_type(Entity.attributes, paths[key]) == "array",
+                    func.json_extract(Entity.attributes, paths[key]),
+                ),
+                else_="[]",
+            )
+            appended = []
+            for value in changes[key][1]:
+                appended += ["$[#]", func.json(json.dumps(value))]
+            arguments += [paths[key], func.json_insert(array, *appended)]
+        if arguments:
+            patched = func.json_set(patched, *arguments)
+        return type_coerce(patched, Entity.attributes.type)
+    raise NotImplementedError(f"Attribute updates are not supported on {dialect}")
+
+
+def _entities_partition(world_id: uuid.UUID) -> Table:
+    """The columns of a world's entities partition that indexes refer to"""
+    return Table(
+        partition_name(Entity.__tablename__, world_id),
+        MetaData(),
+        Column("type_id", UUID(as_uuid=True)),
+        Column("attributes", JSONB),
+    )
+
+
+def attribute_index(
+    world_id: uuid.UUID, type_id: uuid.UUID, path: str, dialect: str
+) -> Index:
+    """
+    Partial expression index on one attribute path for one entity type. On
+    Postgres it is built on the type's world partition: partitioned tables
+    can't be indexed concurrently, and queries scoped to the world are pruned
+    to that partition anyway.
+    """
+    digest = hashlib.sha256(f"{type_id}:{path}".encode()).hexdigest()[:16]
+    if dialect == "postgresql":
+        table = _entities_partition(world_id)
+        attributes, type_column = table.c.attributes, table.c.type_id
+    else:
+        table = Entity.__table__
+        attributes, type_column = Entity.attributes, Entity.type_id
+    index = Index(
+        f"ix_entities_attr_{digest}",
+        attribute_text(path, dialect, attributes),
+        postgresql_where=type_column == type_id,
+        postgresql_concurrently=True,
+        sqlite_where=type_column == type_id,
+    )
+    # Built on demand; keep it out of the model's metadata
+    table.indexes.discard(index)
+    return index
+
+
+async def sync_attribute_indexes(
+    world_id: uuid.UUID,
+    type_id: uuid.UUID,
+    old_paths: Iterable[str],
+    new_paths: Iterable[str],
+) -> None:
+    """
+    Create indexes for newly declared attribute paths of an entity type and
+    drop the ones no longer declared. Runs outside any transaction so Postgres
+    can build the indexes concurrently, without blocking writes.
+    """
+    old_paths, new_paths = set(old_paths), set(new_paths)
+    async with engine.connect() as connection:
+        connection = await connection.execution_options(isolation_level="AUTOCOMMIT")
+        dialect = connection.dialect.name
+        for path in sorted(old_paths - new_paths):
+            await connection.execute(
+                DropIndex(
+                    attribute_index(world_id, type_id, path, dialect), if_exists=True
+                )
+            )
+        for path in sorted(new_paths):
+            await connection.execute(
+                CreateIndex(
+                    attribute_index(world_id, type_id, path, dialect),
+                    if_not_exists=True,
+                )
+            )
@@ -0,0 +1,229 @@
+from collections import Counter
+import json
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Sequence
+import uuid
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.entity import Entity, EntityType, entity_relationships
+from app.database.changes import EntityChange
+from app.database.revisions import (
+    DOCUMENT_FIELDS,
+    current_documents,
+    diff_documents,
+    record_revisions,
+)
+
+# Rows per INSERT statement; keeps bound parameters well under driver limits
+BULK_CHUNK_SIZE = 1000
+
+# Transaction advisory lock held while checking client IDs, on Postgres
+CLIENT_ID_LOCK = 0x656E7469
+
+ENTITY_COLUMNS = (
+    "id",
+    "world_id",
+    "type_id",
+    "name",
+    "description",
+    "attributes",
+    "created_at",
+    "updated_at",
+    "version",
+)
+
+
+def _chunks(rows: Sequence, size: int = BULK_CHUNK_SIZE) -> Iterable[Sequence]:
+    for start in range(0, len(rows), size):
+        yield rows[start : start + size]
+
+
+def _dialect_insert(db: AsyncSession, table):
+    """INSERT construct that supports ON CONFLICT for the session's dialect"""
+    dialect = db.bind.dialect.name
+    if dialect == "postgresql":
+        return postgresql.insert(table)
+    if dialect == "sqlite":
+        return sqlite.insert(table)
+    raise NotImplementedError(f"Bulk upsert is not supported on {dialect}")
+
+
+async def validate_entity_types(
+    db: AsyncSession, world_id: uuid.UUID, type_ids: Iterable[uuid.UUID]
+):
+    type_ids = set(type_ids)
+    found = set(
+        await db.scalars(
+            select(EntityType.id).where(
+                EntityType.world_id == world_id, EntityType.id.in_(type_ids)
+            )
+        )
+    )
+    missing = type_ids - found
+    if missing:
+        raise ValueError(
+            f"Entity types not found: {', '.join(str(id) for id in missing)}"
+        )
+
+
+def validate_unique_ids(ids: Iterable[uuid.UUID]):
+    duplicates = [id for id, count in Counter(ids).items() if count > 1]
+    if duplicates:
+        raise ValueError(
+            "Entity IDs given more than once: "
+            + ", ".join(str(id) for id in duplicates)
+        )
+
+
+async def validate_ids_unused_elsewhere(
+    db: AsyncSession, world_id: uuid.UUID, ids: Sequence[uuid.UUID]
+):
+    """
+    Reject IDs taken by an entity of another world: IDs are unique on their
+    own, but the table's key, which Postgres partitions by world, includes
+    world_id, so nothing else enforces it.
+    """
+    if not ids:
+        return
+    if db.bind.dialect.name == "postgresql":
+        # Otherwise two worlds writing one new ID concurrently both pass
+        await db.execute(select(func.pg_advisory_xact_lock(CLIENT_ID_LOCK)))
+    taken = []
+    for chunk in _chunks(ids):
+        taken += await db.scalars(
+            select(Entity.id).where(Entity.id.in_(chunk), Entity.world_id != world_id)
+        )
+    if taken:
+        raise ValueError(
+            "Entity IDs already used in another world: "
+            + ", ".join(str(id) for id in taken)
+        )
+
+
+def _document(row: Dict[str, Any]) -> Dict[str, Any]:
+    return {field: row[field] for field in DOCUMENT_FIELDS}
+
+
+async def _copy_entities(db: AsyncSession, rows: List[Dict[str, Any]]) -> None:
+    """Stream new entity rows with asyncpg's COPY protocol"""
+    connection = await db.connection()
+    raw_connection = await connection.get_raw_connection()
+    await raw_connection.driver_connection.copy_records_to_table(
+        Entity.__tablename__,
+        columns=ENTITY_COLUMNS,
+        records=[
+            tuple(
+                json.dumps(row[column]) if column == "attributes" else row[column]
+                for column in ENTITY_COLUMNS
+            )
+            for row in rows
+        ],
+    )
+
+
+async def bulk_write_entities(
+    db: AsyncSession,
+    world_id: uuid.UUID,
+    rows: List[Dict[str, Any]],
+    upsert: bool = False,
+) -> List[EntityChange]:
+    """
+    Write many entities of one world and their parent relationships in one
+    transaction.
+
+    ``rows`` hold Entity column values plus a ``parent_ids`` list. New rows go
+    through COPY on asyncpg and multi-row INSERTs elsewhere; with ``upsert``,
+    existing IDs are updated with INSERT ... ON CONFLICT and their parent
+    relationships are replaced by the ones given. Every written entity gets a
+    revision. The caller commits, then publishes the returned changes.
+    """
+    client_ids = [row["id"] for row in rows if row.get("id")]
+    validate_unique_ids(client_ids)
+    now = datetime.utcnow()
+    entity_rows = [
+        {
+            "id": row.get("id") or uuid.uuid4(),
+            "world_id": world_id,
+            "type_id": row["type_id"],
+            "name": row["name"],
+            "description": row.get("description"),
+            "attributes": row.get("attributes") or {},
+            "created_at": now,
+            "updated_at": now,
+            "version": 1,
+        }
+        for row in rows
+    ]
+
+    # Validating first also opens the transaction COPY needs to join
+    await validate_entity_types(db, world_id, (row["type_id"] for row in entity_rows))
+    await validate_ids_unused_elsewhere(db, world_id, client_ids)
+
+    if upsert:
+        for chunk in _chunks(entity_rows):
+            previous = await current_documents(
+                db, world_id, [row["id"] for row in chunk]
+            )
+            statement = _dialect_insert(db, Entity.__table__).values(chunk)
+            statement = statement.on_conflict_do_update(
+                index_elements=[Entity.world_id, Entity.id],
+                set_={
+                    "type_id": statement.excluded.type_id,
+                    "name": statement.excluded.name,
+                    "description": statement.excluded.description,
+                    "attributes": statement.excluded.attributes,
+                    "updated_at": statement.excluded.updated_at,
+                    "version": Entity.version + 1,
+                },
+            )
+            versions = dict(
+                (await db.execute(statement.returning(Entity.id, Entity.version))).all()
+            )
+            writes = []
+            for row in chunk:
+                document, old = _document(row), previous.get(row["id"])
+                patch = None if old is None else diff_documents(old, document)
+                writes.append((row["id"], versions[row["id"]], document, patch))
+                row["version"] = versions[row["id"]]
+            await record_revisions(db, world_id, writes, source="bulk")
+    else:
+        if db.bind.dialect.driver == "asyncpg":
+            await _copy_entities(db, entity_rows)
+        else:
+            for chunk in _chunks(entity_rows):
+                await db.execute(insert(Entity.__table__).values(chunk))
+        for chunk in _chunks(entity_rows):
+            await record_revisions(
+                db,
+                world_id,
+                [(row["id"], 1, _document(row), None) for row in chunk],
+                source="bulk",
+            )
+
+    relationship_rows = [
+        {"world_id": world_id, "parent_id": parent_id, "child_id": entity_row["id"]}
+        for row, entity_row in zip(rows, entity_rows)
+        for parent_id in row.get("parent_ids") or ()
+    ]
+    if upsert:
+        replaced = [
+            entity_row["id"]
+            for row, entity_row in zip(rows, entity_rows)
+            if row.get("parent_ids") is not None
+        ]
+        for chunk in _chunks(replaced):
+            await db.execute(
+                delete(entity_relationships).where(
+                    entity_relationships.c.world_id == world_id,
+                    entity_relationships.c.child_id.in_(chunk),
+                )
+            )
+    for chunk in _chunks(relationship_rows):
+        await db.execute(insert(entity_relationships).values(chunk))
+
+    return [
+        EntityChange(world_id, row["id"], row["type_id"], row["version"], "bulk")
+        for row in entity_rows
+    ]
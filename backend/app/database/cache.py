@@ -0,0 +1,331 @@
+import asyncio
+from collections import OrderedDict
+from datetime import datetime, timedelta
+import json
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+import uuid
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+import logfire
+
+from app.config import settings
+from app.models.entity import Entity, EntityType
+
+_MISSING = object()
+
+_requests = logfire.metric_counter(
+    "entity_cache.requests", unit="1", description="Entity cache lookups"
+)
+
+
+def _new_version() -> str:
+    return uuid.uuid4().hex
+
+
+class SharedTier:
+    """
+    Cache shared by every process, on a Redis-compatible server (Redis,
+    Valkey, KeyDB, ...). Also holds the namespace versions, so an
+    invalidation in one process is seen by all of them.
+    """
+
+    def __init__(self, url: str, ttl: timedelta):
+        try:
+            import redis.asyncio as redis
+        except ImportError as e:
+            raise ImportError(
+                "ENTITY_CACHE_REDIS_URL needs the redis package; "
+                "unset it to use the in-process cache only"
+            ) from e
+        self._client = redis.from_url(url)
+        self.ttl = ttl
+
+    async def get(self, key: str) -> Optional[str]:
+        value = await self._client.get(key)
+        return value.decode() if value is not None else None
+
+    async def set(self, key: str, value: str) -> None:
+        await self._client.set(key, value, ex=int(self.ttl.total_seconds()))
+
+    async def bump(self, *keys: str) -> None:
+        """Give version keys new tokens, which expire two TTLs after the bump"""
+        async with self._client.pipeline(transaction=False) as pipeline:
+            for key in keys:
+                pipeline.set(key, _new_version(), ex=2 * int(self.ttl.total_seconds()))
+            await pipeline.execute()
+
+
+class VersionedCache:
+    """
+    Read-through cache with an in-process LRU tier and an optional shared
+    tier. Keys live in namespaces; invalidating a namespace gives it a new
+    version, a random token every later lookup includes in its key, so stale
+    entries are never read again and simply age out. Tokens are never reused.
+    A version is forgotten two TTLs after it was set, and the namespace goes
+    back to version "0": by then entries written before the bump, even by a
+    load that started before it, have expired, and entries under "0" can
+    only have been written since.
+
+    Values must be JSON serializable. Shared-tier failures are logged and
+    treated as misses, so the cache never fails a request.
+    """
+
+    def __init__(
+        self, max_entries: int, ttl: timedelta, shared: Optional[SharedTier] = None
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.shared = shared
+        self._entries: OrderedDict[str, Tuple[datetime, Any]] = OrderedDict()
+        # Namespace -> (version, when it was bumped), oldest bump first
+        self._versions: OrderedDict[str, Tuple[str, datetime]] = OrderedDict()
+        # Loads in flight, so concurrent misses on one key share a query
+        self._loading: Dict[str, asyncio.Future] = {}
+        # (tier, "hit" | "miss") -> count
+        self.requests: Dict[Tuple[str, str], int] = {}
+
+    def _count(self, tier: str, result: str) -> None:
+        self.requests[(tier, result)] = self.requests.get((tier, result), 0) + 1
+        _requests.add(1, {"tier": tier, "result": result})
+
+    async def _version(self, namespace: str) -> Optional[str]:
+        """Current version of ``namespace``; None if it can't be known"""
+        if self.shared is None:
+            version, bumped_at = self._versions.get(namespace, ("0", None))
+            if bumped_at is not None and bumped_at <= datetime.utcnow() - 2 * self.ttl:
+                return "0"
+            return version
+        try:
+            return await self.shared.get(f"version:{namespace}") or "0"
+        except Exception as e:
+            logfire.warn("Entity cache version read failed", error=str(e))
+            return None
+
+    def _memory_get(self, key: str) -> Any:
+        if key not in self._entries:
+            return _MISSING
+        expires_at, value = self._entries[key]
+        if expires_at <= datetime.utcnow():
+            del self._entries[key]
+            return _MISSING
+        self._entries.move_to_end(key)
+        return value
+
+    def _memory_set(self, key: str, value: Any) -> None:
+        self._entries[key] = (datetime.utcnow() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def get_or_load(
+        self, namespace: str, key: str, load: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        """Cached value of ``key``, or ``load()``'s result; None is not cached"""
+        version = await self._version(namespace)
+        if version is None:
+            self._count("memory", "miss")
+            return await load()
+        key = f"{namespace}:{version}:{key}"
+
+        value = self._memory_get(key)
+        if value is not _MISSING:
+            self._count("memory", "hit")
+            return value
+        self._count("memory", "miss")
+
+        if self.shared is not None:
+            try:
+                encoded = await self.shared.get(key)
+            except Exception as e:
+                logfire.warn("Entity cache read failed", error=str(e))
+                encoded = None
+            self._count("shared", "hit" if encoded is not None else "miss")
+            if encoded is not None:
+                value = json.loads(encoded)
+                self._memory_set(key, value)
+                return value
+
+        if key in self._loading:
+            return await asyncio.shield(self._loading[key])
+        self._loading[key] = asyncio.ensure_future(load())
+        try:
+            value = await asyncio.shield(self._loading[key])
+        finally:
+            del self._loading[key]
+        if value is None:
+            return None
+        self._memory_set(key, value)
+        if self.shared is not None:
+            try:
+                await self.shared.set(key, json.dumps(value, separators=(",", ":")))
+            except Exception as e:
+                logfire.warn("Entity cache write failed", error=str(e))
+        return value
+
+    async def invalidate(self, *namespaces: str) -> None:
+        if not namespaces:
+            return
+        if self.shared is not None:
+            try:
+                await self.shared.bump(
+                    *(f"version:{namespace}" for namespace in namespaces)
+                )
+            except Exception as e:
+                logfire.warn("Entity cache invalidation failed", error=str(e))
+            return
+
+        now = datetime.utcnow()
+        for namespace in namespaces:
+            self._versions[namespace] = (_new_version(), now)
+            self._versions.move_to_end(namespace)
+        while self._versions:
+            namespace, (_, bumped_at) = next(iter(self._versions.items()))
+            if bumped_at > now - 2 * self.ttl:
+                break
+            del self._versions[namespace]
+
+    def render_prometheus(self) -> str:
+        lines = [
+            "# HELP entity_cache_requests_total Entity cache lookups by tier",
+            "# TYPE entity_cache_requests_total counter",
+        ]
+        lines += [
+            f'entity_cache_requests_total{{tier="{tier}",result="{result}"}} {count}'
+            for (tier, result), count in sorted(self.requests.items())
+        ]
+        lines += [
+            "# HELP entity_cache_entries Entries in the in-process tier",
+            "# TYPE entity_cache_entries gauge",
+            f"entity_cache_entries {len(self._entries)}",
+        ]
+        return "\n".join(lines) + "\n"
+
+
+def build_entity_cache() -> Optional[VersionedCache]:
+    if not settings.ENTITY_CACHE_ENABLED:
+        return None
+
+    ttl = timedelta(seconds=settings.ENTITY_CACHE_TTL_SECONDS)
+    shared = (
+        SharedTier(settings.ENTITY_CACHE_REDIS_URL, ttl)
+        if settings.ENTITY_CACHE_REDIS_URL
+        else None
+    )
+    return VersionedCache(settings.ENTITY_CACHE_ENTRIES, ttl, shared)
+
+
+entity_cache = build_entity_cache()
+
+
+def _entity_type_row(entity_type: EntityType) -> Dict[str, Any]:
+    return {
+        "id": str(entity_type.id),
+        "world_id": str(entity_type.world_id),
+        "name": entity_type.name,
+        "default_fields": entity_type.default_fields,
+        "indexed_attributes": entity_type.indexed_attributes or [],
+    }
+
+
+def _entity_row(entity: Entity) -> Dict[str, Any]:
+    return {
+        "id": str(entity.id),
+        "world_id": str(entity.world_id),
+        "type_id": str(entity.type_id),
+        "name": entity.name,
+        "description": entity.description,
+        "attributes": entity.attributes,
+        "created_at": entity.created_at.isoformat(),
+        "updated_at": entity.updated_at.isoformat(),
+        "version": entity.version,
+    }
+
+
+# Cached rows come back as transient model instances, so callers treat them
+# like loaded ones (e.g. EntityGQL.from_db); they are not attached to a session.
+
+
+def _entity_type_from_row(row: Dict[str, Any]) -> EntityType:
+    return EntityType(
+        **{**row, "id": uuid.UUID(row["id"]), "world_id": uuid.UUID(row["world_id"])}
+    )
+
+
+def _entity_from_row(row: Dict[str, Any]) -> Entity:
+    return Entity(
+        **{
+            **row,
+            "id": uuid.UUID(row["id"]),
+            "world_id": uuid.UUID(row["world_id"]),
+            "type_id": uuid.UUID(row["type_id"]),
+            "created_at": datetime.fromisoformat(row["created_at"]),
+            "updated_at": datetime.fromisoformat(row["updated_at"]),
+        }
+    )
+
+
+# Namespaces are per world, so one world's writes never invalidate another's
+# cached reads.
+
+
+def _entity_types_namespace(world_id: uuid.UUID) -> str:
+    return f"entity_types:{world_id}"
+
+
+def _entity_namespace(world_id: uuid.UUID, id: uuid.UUID) -> str:
+    return f"entity:{world_id}:{id}"
+
+
+async def get_entity_types(
+    world_id: uuid.UUID, get_db: Callable[[], AsyncSession], lock: asyncio.Lock
+) -> List[EntityType]:
+    """All entity types of a world; sessions are only opened on a cache miss"""
+
+    async def load() -> List[Dict[str, Any]]:
+        async with lock:
+            result = await get_db().execute(
+                select(EntityType).where(EntityType.world_id == world_id)
+            )
+        return [_entity_type_row(entity_type) for entity_type in result.scalars()]
+
+    if entity_cache is None:
+        rows = await load()
+    else:
+        rows = await entity_cache.get_or_load(
+            _entity_types_namespace(world_id), "all", load
+        )
+    return [_entity_type_from_row(row) for row in rows]
+
+
+async def get_entity(
+    world_id: uuid.UUID,
+    id: uuid.UUID,
+    get_db: Callable[[], AsyncSession],
+    lock: asyncio.Lock,
+) -> Optional[Entity]:
+    """One entity of a world with every column loaded, or None"""
+
+    async def load() -> Optional[Dict[str, Any]]:
+        async with lock:
+            entity = await get_db().scalar(
+                select(Entity).where(Entity.world_id == world_id, Entity.id == id)
+            )
+        return _entity_row(entity) if entity is not None else None
+
+    if entity_cache is None:
+        row = await load()
+    else:
+        row = await entity_cache.get_or_load(
+            _entity_namespace(world_id, id), "row", load
+        )
+    return _entity_from_row(row) if row is not None else None
+
+
+async def invalidate_entity_types(world_id: uuid.UUID) -> None:
+    if entity_cache is not None:
+        await entity_cache.invalidate(_entity_types_namespace(world_id))
+
+
+async def invalidate_entities(world_id: uuid.UUID, ids: Iterable[uuid.UUID]) -> None:
+    if entity_cache is not None:
+        await entity_cache.invalidate(*(_entity_namespace(world_id, id) for id in ids))
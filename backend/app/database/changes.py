@@ -0,0 +1,221 @@
+import asyncio
+from dataclasses import dataclass
+import json
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Set, Tuple
+import uuid
+from sqlalchemy import func, select
+import logfire
+
+from app.config import settings
+from app.database import engine
+
+# Postgres NOTIFY channel carrying entity changes between API processes
+CHANGES_CHANNEL = "entity_changes"
+# NOTIFY payloads must stay under 8000 bytes
+_MAX_PAYLOAD_BYTES = 7900
+
+
+@dataclass(frozen=True)
+class EntityChange:
+    """A committed write to one entity: which one, and the version it is now at"""
+
+    world_id: uuid.UUID
+    entity_id: uuid.UUID
+    type_id: uuid.UUID
+    version: int
+    source: str  # The revision's source: "create", "update", "generate", ...
+
+    def to_json(self) -> List:
+        return [
+            str(self.world_id),
+            str(self.entity_id),
+            str(self.type_id),
+            self.version,
+            self.source,
+        ]
+
+    @classmethod
+    def from_json(cls, row: List) -> "EntityChange":
+        world_id, entity_id, type_id, version, source = row
+        return cls(
+            uuid.UUID(world_id),
+            uuid.UUID(entity_id),
+            uuid.UUID(type_id),
+            version,
+            source,
+        )
+
+
+def entity_changes(entities: Iterable[Any], source: str) -> List[EntityChange]:
+    """Changes for written Entity rows (or rows with the same columns)"""
+    return [
+        EntityChange(entity.world_id, entity.id, entity.type_id, entity.version, source)
+        for entity in entities
+    ]
+
+
+class _Subscriber:
+    """
+    Changes waiting to be sent to one subscription, at most one per entity:
+    a newer change to an entity replaces the pending one. A subscriber that
+    falls more than CHANGE_FEED_MAX_PENDING entities behind drops them and
+    is told to resync, so a slow client never holds up writers or grows
+    without bound.
+    """
+
+    def __init__(self, world_id: uuid.UUID, type_ids: Optional[Set[uuid.UUID]]):
+        self.world_id = world_id
+        self.type_ids = type_ids
+        self.pending: Dict[uuid.UUID, EntityChange] = {}
+        self.overflowed = False
+        self.wakeup = asyncio.Event()
+
+    def offer(self, change: EntityChange) -> None:
+        if change.world_id != self.world_id:
+            return
+        if self.type_ids is not None and change.type_id not in self.type_ids:
+            return
+        if self.overflowed:
+            return
+        pending = self.pending.get(change.entity_id)
+        if pending is not None and pending.version >= change.version:
+            return
+        self.pending[change.entity_id] = change
+        if len(self.pending) > settings.CHANGE_FEED_MAX_PENDING:
+            self.resync()
+        self.wakeup.set()
+
+    def resync(self) -> None:
+        self.pending.clear()
+        self.overflowed = True
+        self.wakeup.set()
+
+    def take(self) -> Tuple[bool, List[EntityChange]]:
+        overflowed, changes = self.overflowed, list(self.pending.values())
+        self.pending.clear()
+        self.overflowed = False
+        self.wakeup.clear()
+        return overflowed, changes
+
+
+class ChangeFeed:
+    """
+    Broadcasts committed entity changes to entityChanged subscriptions.
+
+    On Postgres changes are sent with NOTIFY, and every API process LISTENs
+    on a connection of its own and hands them to its subscribers, so a write
+    in any process reaches every client. Elsewhere (SQLite) there is only one
+    process, and changes are handed to subscribers directly.
+    """
+
+    def __init__(self):
+        self._subscribers: Set[_Subscriber] = set()
+        self._listening = engine.dialect.name == "postgresql"
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        if self._listening:
+            self._task = asyncio.create_task(self._listen(), name="change-feed")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def publish(self, changes: List[EntityChange]) -> None:
+        """
+        Send changes once their transaction has committed. Failures are
+        logged, not raised: the write itself has succeeded.
+        """
+        if not changes:
+            return
+        if not self._listening:
+            self._dispatch(changes)
+            return
+        try:
+            async with engine.connect() as connection:
+                for payload in _payloads(changes):
+                    await connection.execute(
+                        select(func.pg_notify(CHANGES_CHANNEL, payload))
+                    )
+                await connection.commit()
+        except Exception as e:
+            logfire.warn("Failed to publish entity changes", error=str(e))
+
+    async def subscribe(
+        self, world_id: uuid.UUID, type_ids: Optional[Iterable[uuid.UUID]] = None
+    ) -> AsyncIterator[Tuple[bool, List[EntityChange]]]:
+        """
+        Yield ``(resync, changes)`` batches of changes to a world's entities,
+        optionally only those of ``type_ids``. Changes arriving within
+        CHANGE_FEED_COALESCE_SECONDS of each other go out in one batch; when
+        ``resync`` is set, changes were dropped and the client should refetch.
+        """
+        subscriber = _Subscriber(
+            world_id, set(type_ids) if type_ids is not None else None
+        )
+        self._subscribers.add(subscriber)
+        try:
+            while True:
+                await subscriber.wakeup.wait()
+                await asyncio.sleep(settings.CHANGE_FEED_COALESCE_SECONDS)
+                yield subscriber.take()
+        finally:
+            self._subscribers.discard(subscriber)
+
+    def _dispatch(self, changes: Iterable[EntityChange]) -> None:
+        for change in changes:
+            for subscriber in self._subscribers:
+                subscriber.offer(change)
+
+    def _on_notification(self, connection, pid, channel, payload: str) -> None:
+        try:
+            changes = [EntityChange.from_json(row) for row in json.loads(payload)]
+        except (ValueError, TypeError) as e:
+            logfire.warn("Ignoring malformed entity change", error=str(e))
+            return
+        self._dispatch(changes)
+
+    async def _listen(self) -> None:
+        """LISTEN on a dedicated connection, reconnecting if it is lost"""
+        while True:
+            try:
+                async with engine.connect() as connection:
+                    raw_connection = await connection.get_raw_connection()
+                    listener = raw_connection.driver_connection
+                    await listener.add_listener(CHANGES_CHANNEL, self._on_notification)
+                    try:
+                        while True:
+                            await asyncio.sleep(settings.CHANGE_FEED_PING_SECONDS)
+                            await listener.execute("SELECT 1")
+                    finally:
+                        await listener.remove_listener(
+                            CHANGES_CHANNEL, self._on_notification
+                        )
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logfire.error("Entity change listener failed", error=str(e))
+            # Changes may have been missed while not listening
+            for subscriber in self._subscribers:
+                subscriber.resync()
+            await asyncio.sleep(settings.CHANGE_FEED_PING_SECONDS)
+
+
+def _payloads(changes: List[EntityChange]) -> Iterable[str]:
+    """JSON arrays of changes, split to fit NOTIFY's payload limit"""
+    batch: List[str] = []
+    size = 2
+    for change in changes:
+        encoded = json.dumps(change.to_json(), separators=(",", ":"))
+        if batch and size + len(encoded) + 1 > _MAX_PAYLOAD_BYTES:
+            yield "[" + ",".join(batch) + "]"
+            batch, size = [], 2
+        batch.append(encoded)
+        size += len(encoded) + 1
+    if batch:
+        yield "[" + ",".join(batch) + "]"
+
+
+change_feed = ChangeFeed()
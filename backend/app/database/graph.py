@@ -0,0 +1,79 @@
+from typing import Iterable, List, Literal, Optional, Set, Tuple
+import uuid
+from sqlalchemy import literal, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.entity import entity_relationships
+
+# Hard cap on traversal depth, whatever the client asks for
+MAX_GRAPH_DEPTH = 50
+
+Direction = Literal["descendants", "ancestors"]
+
+
+def traversal_query(
+    world_id: uuid.UUID,
+    root_ids: Iterable[uuid.UUID],
+    direction: Direction,
+    max_depth: Optional[int] = None,
+):
+    """
+    WITH RECURSIVE query returning the distinct (parent_id, child_id) edges
+    reachable from ``root_ids``, walking towards children or parents. Every
+    step stays within one world, so only its partition is scanned.
+
+    Cycles terminate because UNION discards rows it has already produced:
+    without a depth limit each row is just an edge, and there are finitely
+    many; with one, rows carry their depth, which is bounded.
+    """
+    relationships = entity_relationships.c
+    if direction == "descendants":
+        start_column, next_column = relationships.parent_id, relationships.child_id
+    else:
+        start_column, next_column = relationships.child_id, relationships.parent_id
+
+    root_ids = list(root_ids)
+    depth_limited = max_depth is not None
+    depth_columns = [literal(1).label("depth")] if depth_limited else []
+
+    traversal = (
+        select(relationships.parent_id, relationships.child_id, *depth_columns)
+        .where(relationships.world_id == world_id, start_column.in_(root_ids))
+        .cte("traversal", recursive=True)
+    )
+    # Continue from the far end of each edge found so far
+    frontier = (
+        traversal.c.child_id if direction == "descendants" else traversal.c.parent_id
+    )
+    step = select(
+        relationships.parent_id,
+        relationships.child_id,
+        *([(traversal.c.depth + 1).label("depth")] if depth_limited else []),
+    ).join(traversal, start_column == frontier)
+    step = step.where(relationships.world_id == world_id)
+    if depth_limited:
+        step = step.where(traversal.c.depth < min(max_depth, MAX_GRAPH_DEPTH))
+    traversal = traversal.union(step)
+
+    return select(traversal.c.parent_id, traversal.c.child_id).distinct()
+
+
+async def traverse(
+    db: AsyncSession,
+    world_id: uuid.UUID,
+    root_ids: Iterable[uuid.UUID],
+    direction: Direction,
+    max_depth: Optional[int] = None,
+) -> Tuple[Set[uuid.UUID], List[Tuple[uuid.UUID, uuid.UUID]]]:
+    """IDs of every entity reached, roots included, and the edges between them"""
+    root_ids = set(root_ids)
+    if max_depth is not None and max_depth < 1:
+        return root_ids, []
+
+    result = await db.execute(traversal_query(world_id, root_ids, direction, max_depth))
+    edges = [(parent_id, child_id) for parent_id, child_id in result]
+
+    node_ids = set(root_ids)
+    for parent_id, child_id in edges:
+        node_ids.update((parent_id, child_id))
+    return node_ids, edges
@@ -0,0 +1,309 @@
+import bisect
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+import hashlib
+import re
+import threading
+import time
+from typing import Dict, List, Optional
+from sqlalchemy import Engine, event
+import logfire
+
+from app.config import settings
+
+# Share of a pool's connections in use at which it counts as saturated
+POOL_SATURATION_THRESHOLD = 0.9
+
+# Upper bounds of the statement latency histogram buckets, in milliseconds
+LATENCY_BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+_LITERAL_PATTERNS = [
+    (re.compile(r"'(?:[^']|'')*'"), "?"),  # String literals
+    (re.compile(r"\$\d+|%\(\w+\)s|%s|:\w+"), "?"),  # Driver parameters
+    (re.compile(r"\b\d+(\.\d+)?\b"), "?"),  # Numbers
+    (re.compile(r"\(\s*\?(\s*,\s*\?)*\s*\)"), "(?)"),  # IN lists of any length
+    (re.compile(r"(\(\?\)\s*,\s*)+\(\?\)"), "(?)"),  # Multi-row VALUES
+    (re.compile(r"\s+"), " "),
+]
+
+
+def normalize_statement(statement: str) -> str:
+    """SQL with literals and parameters replaced, so similar queries group"""
+    for pattern, replacement in _LITERAL_PATTERNS:
+        statement = pattern.sub(replacement, statement)
+    return statement.strip()
+
+
+def fingerprint(normalized: str) -> str:
+    return hashlib.sha1(normalized.encode()).hexdigest()[:16]
+
+
+@dataclass
+class StatementStats:
+    statement: str  # Normalized SQL
+    count: int = 0
+    total_ms: float = 0.0
+    rows: int = 0
+    buckets: List[int] = field(default_factory=lambda: [0] * len(LATENCY_BUCKETS_MS))
+
+    def record(self, elapsed_ms: float, rows: Optional[int]) -> None:
+        self.count += 1
+        self.total_ms += elapsed_ms
+        self.rows += rows or 0
+        index = bisect.bisect_left(LATENCY_BUCKETS_MS, elapsed_ms)
+        if index < len(self.buckets):
+            self.buckets[index] += 1
+
+
+@dataclass
+class OperationStats:
+    """Statements run on behalf of one GraphQL operation"""
+
+    name: str
+    counts: Dict[str, int] = field(default_factory=dict)
+    statements: Dict[str, str] = field(default_factory=dict)
+
+    def record(self, key: str, statement: str) -> None:
+        self.counts[key] = self.counts.get(key, 0) + 1
+        self.statements.setdefault(key, statement)
+
+    def repeated_statements(self, threshold: int) -> Dict[str, int]:
+        """Fingerprints run at least ``threshold`` times: likely N+1 queries"""
+        return {key: count for key, count in self.counts.items() if count >= threshold}
+
+
+class QueryMetrics:
+    """Process-wide statement statistics, keyed by fingerprint"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.statements: Dict[str, StatementStats] = {}
+        self.n_plus_one: Dict[str, int] = {}  # Flagged operations by name
+
+    def record(
+        self, key: str, statement: str, elapsed_ms: float, rows: Optional[int]
+    ) -> None:
+        with self._lock:
+            if key not in self.statements:
+                self.statements[key] = StatementStats(statement)
+            self.statements[key].record(elapsed_ms, rows)
+
+    def flag_n_plus_one(self, operation: str) -> None:
+        with self._lock:
+            self.n_plus_one[operation] = self.n_plus_one.get(operation, 0) + 1
+
+    def render_prometheus(self) -> str:
+        """Statistics in the Prometheus text exposition format"""
+        lines = [
+            "# HELP sql_statement_duration_ms Statement latency by fingerprint",
+            "# TYPE sql_statement_duration_ms histogram",
+        ]
+        with self._lock:
+            statements = dict(self.statements)
+            n_plus_one = dict(self.n_plus_one)
+        for key, stats in sorted(statements.items()):
+            label = f'fingerprint="{key}"'
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS_MS, stats.buckets):
+                cumulative += count
+                lines.append(
+                    f'sql_statement_duration_ms_bucket{{{label},le="{bound}"}} '
+                    f"{cumulative}"
+                )
+            lines.append(
+                f'sql_statement_duration_ms_bucket{{{label},le="+Inf"}} {stats.count}'
+            )
+            lines.append(f"sql_statement_duration_ms_sum{{{label}}} {stats.total_ms}")
+            lines.append(f"sql_statement_duration_ms_count{{{label}}} {stats.count}")
+
+        lines += [
+            "# HELP sql_statement_rows_total Rows returned or affected by fingerprint",
+            "# TYPE sql_statement_rows_total counter",
+        ]
+        lines += [
+            f'sql_statement_rows_total{{fingerprint="{key}"}} {stats.rows}'
+            for key, stats in sorted(statements.items())
+        ]
+
+        lines += [
+            "# HELP sql_statement_info Normalized SQL for each fingerprint",
+            "# TYPE sql_statement_info gauge",
+        ]
+        for key, stats in sorted(statements.items()):
+            statement = stats.statement.replace("\\", "\\\\").replace('"', '\\"')
+            lines.append(
+                f'sql_statement_info{{fingerprint="{key}",statement="{statement}"}} 1'
+            )
+
+        lines += [
+            "# HELP graphql_n_plus_one_total Operations flagged for repeated queries",
+            "# TYPE graphql_n_plus_one_total counter",
+        ]
+        lines += [
+            f'graphql_n_plus_one_total{{operation="{name}"}} {count}'
+            for name, count in sorted(n_plus_one.items())
+        ]
+        return "\n".join(lines) + "\n"
+
+
+@dataclass
+class PoolStats:
+    capacity: Optional[int]  # pool_size + max_overflow; None when unbounded
+    checked_out: int = 0
+    peak_checked_out: int = 0
+    checkouts: int = 0
+    saturated_checkouts: int = 0
+
+    @property
+    def saturated(self) -> bool:
+        return bool(self.capacity) and (
+            self.checked_out >= self.capacity * POOL_SATURATION_THRESHOLD
+        )
+
+
+class PoolMetrics:
+    """Connection pool usage, per engine"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.pools: Dict[str, PoolStats] = {}
+
+    def add(self, engine: str, capacity: Optional[int]) -> PoolStats:
+        self.pools[engine] = PoolStats(capacity)
+        return self.pools[engine]
+
+    def checkout(self, engine: str) -> bool:
+        """Count a checkout; True if it just made the pool saturated"""
+        with self._lock:
+            stats = self.pools[engine]
+            was_saturated = stats.saturated
+            stats.checked_out += 1
+            stats.checkouts += 1
+            stats.peak_checked_out = max(stats.peak_checked_out, stats.checked_out)
+            if stats.saturated:
+                stats.saturated_checkouts += 1
+            return stats.saturated and not was_saturated
+
+    def checkin(self, engine: str) -> None:
+        with self._lock:
+            self.pools[engine].checked_out -= 1
+
+    def render_prometheus(self) -> str:
+        with self._lock:
+            pools = {
+                name: PoolStats(**vars(stats)) for name, stats in self.pools.items()
+            }
+        metrics = [
+            ("db_pool_checked_out", "gauge", "Connections in use", "checked_out"),
+            (
+                "db_pool_peak_checked_out",
+                "gauge",
+                "Most connections in use at once",
+                "peak_checked_out",
+            ),
+            ("db_pool_capacity", "gauge", "Pool size plus max overflow", "capacity"),
+            ("db_pool_checkouts_total", "counter", "Connection checkouts", "checkouts"),
+            (
+                "db_pool_saturated_checkouts_total",
+                "counter",
+                "Checkouts that left the pool saturated",
+                "saturated_checkouts",
+            ),
+        ]
+        lines = []
+        for metric, kind, help, attribute in metrics:
+            lines += [f"# HELP {metric} {help}", f"# TYPE {metric} {kind}"]
+            for name, stats in sorted(pools.items()):
+                value = getattr(stats, attribute)
+                if value is not None:
+                    lines.append(f'{metric}{{engine="{name}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+
+query_metrics = QueryMetrics()
+pool_metrics = PoolMetrics()
+
+# Set while a GraphQL operation runs, see QueryInstrumentation
+current_operation: ContextVar[Optional[OperationStats]] = ContextVar(
+    "current_operation", default=None
+)
+
+_statement_duration = logfire.metric_histogram(
+    "sql.statement.duration", unit="ms", description="SQL statement latency"
+)
+_statement_rows = logfire.metric_histogram(
+    "sql.statement.rows", unit="1", description="Rows returned or affected"
+)
+_pool_checked_out = logfire.metric_up_down_counter(
+    "db.pool.checked_out", unit="1", description="Connections in use"
+)
+
+
+def _row_count(cursor) -> Optional[int]:
+    # The async drivers' adapters buffer result rows, where rowcount is -1
+    rows = getattr(cursor, "_rows", None)
+    if cursor.description is not None and rows is not None:
+        return len(rows)
+    return cursor.rowcount if cursor.rowcount >= 0 else None
+
+
+def instrument_engine(engine: Engine) -> None:
+    """Record latency, rows and fingerprint of every statement ``engine`` runs"""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, many):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, many):
+        elapsed_ms = (time.perf_counter() - conn.info["query_start"].pop()) * 1000
+        normalized = normalize_statement(statement)
+        key = fingerprint(normalized)
+        rows = _row_count(cursor)
+
+        query_metrics.record(key, normalized, elapsed_ms, rows)
+        attributes = {"fingerprint": key}
+        _statement_duration.record(elapsed_ms, attributes)
+        if rows is not None:
+            _statement_rows.record(rows, attributes)
+        if elapsed_ms >= settings.SQL_SLOW_QUERY_MS:
+            logfire.warn(
+                "Slow SQL statement",
+                fingerprint=key,
+                statement=normalized,
+                duration_ms=elapsed_ms,
+                rows=rows,
+            )
+
+        operation = current_operation.get()
+        if operation is not None:
+            operation.record(key, normalized)
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(exception_context):
+        # Keep the timing stack balanced when a statement fails
+        connection = exception_context.connection
+        if connection is not None and connection.info.get("query_start"):
+            connection.info["query_start"].pop()
+
+
+def instrument_pool(engine: Engine, name: str, capacity: Optional[int]) -> None:
+    """Track connections checked out of ``engine``'s pool"""
+    pool_metrics.add(name, capacity)
+    attributes = {"engine": name}
+
+    @event.listens_for(engine, "checkout")
+    def checkout(dbapi_connection, connection_record, connection_proxy):
+        _pool_checked_out.add(1, attributes)
+        if pool_metrics.checkout(name):
+            logfire.warn(
+                "Database connection pool {engine} is saturated",
+                engine=name,
+                checked_out=pool_metrics.pools[name].checked_out,
+                capacity=capacity,
+            )
+
+    @event.listens_for(engine, "checkin")
+    def checkin(dbapi_connection, connection_record):
+        _pool_checked_out.add(-1, attributes)
+        pool_metrics.checkin(name)
@@ -0,0 +1,41 @@
+import uuid
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# Tables with one LIST partition per world on Postgres, referenced tables first
+PARTITIONED_TABLES = ("entities", "entity_relationships")
+
+
+def partition_name(table: str, world_id: uuid.UUID) -> str:
+    return f"{table}_{world_id.hex}"
+
+
+async def create_world_partitions(db: AsyncSession, world_id: uuid.UUID) -> None:
+    """
+    Create a world's partitions in the session's transaction. They inherit
+    the parent tables' columns, indexes and foreign keys. A no-op on databases
+    without partitioning, where every world shares the plain tables.
+    """
+    if db.bind.dialect.name != "postgresql":
+        return
+    for table in PARTITIONED_TABLES:
+        await db.execute(
+            text(
+                f"CREATE TABLE IF NOT EXISTS {partition_name(table, world_id)} "
+                f"PARTITION OF {table} FOR VALUES IN ('{world_id}')"
+            )
+        )
+
+
+async def drop_world_partitions(db: AsyncSession, world_id: uuid.UUID) -> None:
+    """
+    Drop a world's partitions, and with them all of its entities and
+    relationships, without scanning any other world's rows. Rows referencing
+    those entities from unpartitioned tables must be deleted first.
+    """
+    if db.bind.dialect.name != "postgresql":
+        return
+    for table in reversed(PARTITIONED_TABLES):
+        await db.execute(
+            text(f"DROP TABLE IF EXISTS {partition_name(table, world_id)}")
+        )
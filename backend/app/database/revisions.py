@@ -0,0 +1,258 @@
+import copy
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+import uuid
+from sqlalchemy import Update, func, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.database.attributes import AttributeChange
+from app.models.entity import Entity
+from app.models.revision import EntityRevision
+
+# The versioned content of an entity: these Entity columns
+DOCUMENT_FIELDS = ("name", "description", "attributes")
+Document = Dict[str, Any]
+
+
+class VersionConflict(ValueError):
+    """An entity was written by someone else since the version expected"""
+
+
+def entity_document(entity: Any) -> Document:
+    """Versioned content of an Entity (or a row with the same columns)"""
+    return {field: getattr(entity, field) for field in DOCUMENT_FIELDS}
+
+
+def entity_update(
+    world_id: uuid.UUID, entity_id: uuid.UUID, expected_version: Optional[int] = None
+) -> Update:
+    """
+    UPDATE of one entity that bumps its version, and with ``expected_version``
+    only matches while the entity is still at that version. Add the values
+    and RETURNING; no row back means the entity is missing or was changed,
+    see write_conflict.
+    """
+    statement = (
+        update(Entity)
+        .where(Entity.world_id == world_id, Entity.id == entity_id)
+        .values(version=Entity.version + 1, updated_at=datetime.utcnow())
+    )
+    if expected_version is not None:
+        statement = statement.where(Entity.version == expected_version)
+    return statement
+
+
+async def write_conflict(
+    db: AsyncSession,
+    world_id: uuid.UUID,
+    entity_id: uuid.UUID,
+    expected_version: Optional[int],
+) -> ValueError:
+    """The error for an entity_update that matched no row"""
+    version = await db.scalar(
+        select(Entity.version).where(
+            Entity.world_id == world_id, Entity.id == entity_id
+        )
+    )
+    if version is None:
+        return ValueError(f"Entity with ID {entity_id} not found")
+    return VersionConflict(
+        f"Entity {entity_id} is at version {version}, not {expected_version}"
+    )
+
+
+def _pointer(path: str, key: str) -> str:
+    return path + "/" + key.replace("~", "~0").replace("/", "~1")
+
+
+def _keys(pointer: str) -> List[str]:
+    return [key.replace("~1", "/").replace("~0", "~") for key in pointer.split("/")[1:]]
+
+
+def _same(old: Any, new: Any) -> bool:
+    # 1 == True in Python, but not in JSON
+    return type(old) is type(new) and old == new
+
+
+def diff_documents(old: Dict[str, Any], new: Dict[str, Any], path: str = "") -> List:
+    """
+    JSON patch (RFC 6902) turning ``old`` into ``new``. Objects are diffed
+    key by key, so regenerating a few attributes only stores those; any
+    other changed value is replaced whole.
+    """
+    patch = []
+    for key in old:
+        if key not in new:
+            patch.append({"op": "remove", "path": _pointer(path, key)})
+    for key, value in new.items():
+        pointer = _pointer(path, key)
+        if key not in old:
+            patch.append({"op": "add", "path": pointer, "value": value})
+        elif isinstance(old[key], dict) and isinstance(value, dict):
+            patch += diff_documents(old[key], value, pointer)
+        elif not _same(old[key], value):
+            patch.append({"op": "replace", "path": pointer, "value": value})
+    return patch
+
+
+def write_patch(
+    document: Document,
+    fields: Iterable[str] = (),
+    attribute_changes: Optional[Dict[str, AttributeChange]] = None,
+) -> List:
+    """
+    JSON patch for a write that set ``fields`` and made ``attribute_changes``
+    (see fold_attribute_operations), given the ``document`` it returned. No
+    read of the previous document is needed.
+    """
+    patch = [
+        {"op": "replace", "path": _pointer("", field), "value": document[field]}
+        for field in fields
+    ]
+    attributes = document["attributes"]
+    for key, (kind, value) in (attribute_changes or {}).items():
+        pointer = _pointer("/attributes", key)
+        if kind == "delete":
+            patch.append({"op": "remove", "path": pointer})
+        elif kind == "append" and len(attributes[key]) > len(value):
+            # Appended to an existing array
+            patch += [{"op": "add", "path": pointer + "/-", "value": v} for v in value]
+        else:
+            patch.append({"op": "add", "path": pointer, "value": attributes[key]})
+    return patch
+
+
+def apply_patch(document: Dict[str, Any], patch: Sequence[Dict]) -> Dict[str, Any]:
+    """
+    Apply a patch from diff_documents or write_patch to a copy of
+    ``document``. Removing a missing key does nothing, like deleting one does.
+    """
+    document = copy.deepcopy(document)
+    for operation in patch:
+        *parents, key = _keys(operation["path"])
+        target = document
+        for parent in parents:
+            target = target[parent]
+        if operation["op"] in ("add", "replace"):
+            value = copy.deepcopy(operation["value"])
+            if key == "-" and isinstance(target, list):
+                target.append(value)
+            else:
+                target[key] = value
+        elif operation["op"] == "remove":
+            target.pop(key, None)
+        else:
+            raise ValueError(f"Unsupported patch operation: {operation['op']!r}")
+    return document
+
+
+async def current_documents(
+    db: AsyncSession, world_id: uuid.UUID, ids: Sequence[uuid.UUID]
+) -> Dict[uuid.UUID, Document]:
+    """
+    Current document of each existing entity in ``ids``, for writes that
+    replace documents whole and diff them. The rows are locked until the
+    transaction ends on databases that support it.
+    """
+    rows = await db.execute(
+        select(Entity.id, Entity.name, Entity.description, Entity.attributes)
+        .where(Entity.world_id == world_id, Entity.id.in_(ids))
+        .with_for_update()
+    )
+    return {row.id: entity_document(row) for row in rows}
+
+
+async def record_revisions(
+    db: AsyncSession,
+    world_id: uuid.UUID,
+    writes: Iterable[Tuple[uuid.UUID, int, Document, Optional[List]]],
+    source: str,
+) -> None:
+    """
+    Append a revision for each ``(entity_id, version, document, patch)``
+    written: the entity's new version and document, and a patch from the
+    previous version, or None for new entities.
+
+    Revision numbers are versions minus one. Every
+    ENTITY_REVISION_SNAPSHOT_INTERVAL-th revision (and the first) holds the
+    full document, the others their patch, so load_revision never applies
+    more than the interval's worth of patches.
+    """
+    interval = settings.ENTITY_REVISION_SNAPSHOT_INTERVAL
+    now = datetime.utcnow()
+    rows = []
+    for entity_id, version, document, patch in writes:
+        revision = version - 1
+        snapshot = patch is None or revision % interval == 0
+        rows.append(
+            {
+                "world_id": world_id,
+                "entity_id": entity_id,
+                "revision": revision,
+                "snapshot": snapshot,
+                "data": document if snapshot else patch,
+                "source": source,
+                "created_at": now,
+            }
+        )
+    if rows:
+        await db.execute(insert(EntityRevision).values(rows))
+
+
+def _replay(
+    revisions: Iterable[EntityRevision],
+) -> Iterable[Tuple[EntityRevision, Document]]:
+    document = None
+    for revision in revisions:
+        document = (
+            revision.data if revision.snapshot else apply_patch(document, revision.data)
+        )
+        yield revision, document
+
+
+async def load_revision(
+    db: AsyncSession, world_id: uuid.UUID, entity_id: uuid.UUID, revision: int
+) -> Optional[Document]:
+    """An entity's document as of ``revision``, rebuilt from the nearest snapshot"""
+    of_entity = (
+        EntityRevision.world_id == world_id,
+        EntityRevision.entity_id == entity_id,
+    )
+    snapshot = (
+        select(func.max(EntityRevision.revision))
+        .where(
+            *of_entity,
+            EntityRevision.snapshot.is_(True),
+            EntityRevision.revision <= revision,
+        )
+        .scalar_subquery()
+    )
+    revisions = await db.scalars(
+        select(EntityRevision)
+        .where(
+            *of_entity,
+            EntityRevision.revision >= snapshot,
+            EntityRevision.revision <= revision,
+        )
+        .order_by(EntityRevision.revision)
+    )
+    replayed = list(_replay(revisions))
+    if not replayed or replayed[-1][0].revision != revision:
+        return None
+    return replayed[-1][1]
+
+
+async def entity_history(
+    db: AsyncSession, world_id: uuid.UUID, entity_id: uuid.UUID
+) -> List[Tuple[EntityRevision, Document]]:
+    """Every revision of an entity, oldest first, with its full document"""
+    revisions = await db.scalars(
+        select(EntityRevision)
+        .where(
+            EntityRevision.world_id == world_id,
+            EntityRevision.entity_id == entity_id,
+        )
+        .order_by(EntityRevision.revision)
+    )
+    return list(_replay(revisions))
@@ -0,0 +1,142 @@
+import re
+from typing import List, Optional, Tuple
+import uuid
+from sqlalchemy import column, func, literal_column, select, table
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Load
+
+from app.models.entity import Entity
+
+# Full-text index maintenance lives in the database, so every write path (ORM,
+# bulk INSERT, COPY) keeps it current:
+# - Postgres: entities.search_vector, a generated tsvector column with a GIN
+#   index, weighting name > description > string values in attributes.
+# - SQLite: the entities_fts FTS5 table, keyed by entities.rowid and kept in
+#   sync by triggers on entities.
+# Both are created by the full-text search migration.
+
+POSTGRES_SEARCH_CONFIG = "english"
+
+# bm25 weights for the entities_fts columns: name, description, attributes
+SQLITE_COLUMN_WEIGHTS = (10.0, 5.0, 1.0)
+
+entities_fts = table("entities_fts", column("rowid"))
+
+SQLITE_SEARCH_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS entities_fts USING fts5(
+        name, description, attributes, tokenize = 'porter unicode61'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS entities_fts_insert AFTER INSERT ON entities
+    BEGIN
+        INSERT INTO entities_fts (rowid, name, description, attributes)
+        VALUES (
+            new.rowid,
+            new.name,
+            coalesce(new.description, ''),
+            (SELECT coalesce(group_concat(value, ' '), '')
+             FROM json_tree(new.attributes) WHERE type = 'text')
+        );
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS entities_fts_update AFTER UPDATE ON entities
+    BEGIN
+        DELETE FROM entities_fts WHERE rowid = old.rowid;
+        INSERT INTO entities_fts (rowid, name, description, attributes)
+        VALUES (
+            new.rowid,
+            new.name,
+            coalesce(new.description, ''),
+            (SELECT coalesce(group_concat(value, ' '), '')
+             FROM json_tree(new.attributes) WHERE type = 'text')
+        );
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS entities_fts_delete AFTER DELETE ON entities
+    BEGIN
+        DELETE FROM entities_fts WHERE rowid = old.rowid;
+    END
+    """,
+    # Index rows written before the triggers existed
+    """
+    INSERT INTO entities_fts (rowid, name, description, attributes)
+    SELECT
+        entities.rowid,
+        entities.name,
+        coalesce(entities.description, ''),
+        (SELECT coalesce(group_concat(value, ' '), '')
+         FROM json_tree(entities.attributes) WHERE type = 'text')
+    FROM entities
+    WHERE entities.rowid NOT IN (SELECT rowid FROM entities_fts)
+    """,
+]
+
+SQLITE_SEARCH_TEARDOWN = [
+    "DROP TRIGGER IF EXISTS entities_fts_delete",
+    "DROP TRIGGER IF EXISTS entities_fts_update",
+    "DROP TRIGGER IF EXISTS entities_fts_insert",
+    "DROP TABLE IF EXISTS entities_fts",
+]
+
+
+def _fts5_query(query: str) -> str:
+    """
+    Turn free text into an FTS5 query matching all of its words, so user
+    input can never be parsed as FTS5 syntax. The last word also matches as a
+    prefix, for search-as-you-type.
+    """
+    words = re.findall(r"\w+", query)
+    terms = [f'"{word}"' for word in words]
+    if terms:
+        terms[-1] += "*"
+    return " ".join(terms)
+
+
+async def search_entities(
+    db: AsyncSession,
+    world_id: uuid.UUID,
+    query: str,
+    type_id: Optional[uuid.UUID] = None,
+    limit: int = 50,
+    load_options: Optional[Load] = None,
+) -> List[Tuple[Entity, float]]:
+    """Entities of a world matching ``query`` with their rank, best match first"""
+    dialect = db.bind.dialect.name
+    if dialect == "postgresql":
+        tsquery = func.websearch_to_tsquery(POSTGRES_SEARCH_CONFIG, query)
+        search_vector = literal_column("entities.search_vector")
+        rank = func.ts_rank_cd(search_vector, tsquery)
+        statement = (
+            select(Entity, rank.label("rank"))
+            .where(search_vector.op("@@")(tsquery))
+            .order_by(rank.desc(), Entity.id)
+        )
+    elif dialect == "sqlite":
+        fts_query = _fts5_query(query)
+        if not fts_query:
+            return []
+        # bm25 scores better matches lower; negate so higher ranks are better
+        rank = -func.bm25(literal_column("entities_fts"), *SQLITE_COLUMN_WEIGHTS)
+        statement = (
+            select(Entity, rank.label("rank"))
+            .join(
+                entities_fts, entities_fts.c.rowid == literal_column("entities.rowid")
+            )
+            .where(literal_column("entities_fts").op("MATCH")(fts_query))
+            .order_by(rank.desc(), Entity.id)
+        )
+    else:
+        raise NotImplementedError(f"Full-text search is not supported on {dialect}")
+
+    statement = statement.where(Entity.world_id == world_id)
+    if type_id is not None:
+        statement = statement.where(Entity.type_id == type_id)
+    if load_options is not None:
+        statement = statement.options(load_options)
+
+    result = await db.execute(statement.limit(limit))
+    return [(entity, rank) for entity, rank in result]
@@ -1,8 +1,9 @@
-from typing import TypeVar, Callable, Awaitable, Any
+from typing import TypeVar, Callable, Awaitable, Any, List, Optional
 from functools import wraps
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import SQLAlchemyError
 from fastapi import HTTPException
+import logfire
 
 T = TypeVar("T")
 
@@ -13,6 +14,51 @@ class TransactionError(Exception):
     pass
 
 
+class UnitOfWork:
+    """
+    The writes of one GraphQL operation. Every mutation in the document runs
+    in the same transaction on the primary session, which is committed once
+    when the operation finishes, or rolled back if any mutation failed. Once
+    one has failed the rest are not run.
+    """
+
+    def __init__(self, get_session: Callable[[], AsyncSession]):
+        self._get_session = get_session
+        self.dirty = False
+        self.failed = False
+        # Response keys of the mutations that wrote to the transaction
+        self.written: List[str] = []
+        self._after_commit: List[Callable[[], Awaitable[None]]] = []
+
+    @property
+    def session(self) -> AsyncSession:
+        return self._get_session()
+
+    def after_commit(self, callback: Callable[[], Awaitable[None]]) -> None:
+        """Run ``callback`` once the transaction has been committed"""
+        self._after_commit.append(callback)
+
+    async def complete(self) -> None:
+        if not self.dirty:
+            return
+        session = self.session
+        if self.failed:
+            await session.rollback()
+            return
+        try:
+            await session.commit()
+        except Exception:
+            await session.rollback()
+            raise
+        # The writes are saved whatever happens here: one failing callback
+        # must neither fail the operation nor skip the others
+        for callback in self._after_commit:
+            try:
+                await callback()
+            except Exception:
+                logfire.exception("After-commit callback failed")
+
+
 def handle_transaction_error(error: Exception) -> None:
     """Convert database errors to appropriate HTTP responses"""
     if isinstance(error, SQLAlchemyError):
@@ -24,26 +70,54 @@ def handle_transaction_error(error: Exception) -> None:
     raise error
 
 
+def _find_argument(args, kwargs, predicate) -> Optional[Any]:
+    for arg in (*args, *kwargs.values()):
+        if predicate(arg):
+            return arg
+    return None
+
+
 def transactional(func: Callable[..., Awaitable[T]]) -> Callable[..., Awaitable[T]]:
     """
     Decorator to handle database transactions.
     Ensures that database operations are atomic and properly rolled back on error.
+
+    On a GraphQL resolver (an ``info`` argument whose context has a
+    ``unit_of_work``), changes are flushed so errors surface on the mutation
+    that caused them, and committed with the rest of the operation. Otherwise
+    the AsyncSession argument is committed as soon as the function returns.
     """
 
     @wraps(func)
     async def wrapper(*args: Any, **kwargs: Any) -> T:
-        # Find the session in the arguments
-        session = None
-        for arg in args:
-            if isinstance(arg, AsyncSession):
-                session = arg
-                break
-        if session is None:
-            for arg in kwargs.values():
-                if isinstance(arg, AsyncSession):
-                    session = arg
-                    break
+        info = _find_argument(
+            args,
+            kwargs,
+            lambda arg: hasattr(getattr(arg, "context", None), "unit_of_work"),
+        )
+        if info is not None:
+            unit_of_work: UnitOfWork = info.context.unit_of_work
+            if unit_of_work.failed:
+                raise TransactionError(
+                    "Not run: an earlier mutation in this operation failed"
+                )
+            unit_of_work.dirty = True
+            try:
+                result = await func(*args, **kwargs)
+                await unit_of_work.session.flush()
+                unit_of_work.written.append(info.path.key)
+                return result
+            except Exception as e:
+                unit_of_work.failed = True
+                await unit_of_work.session.rollback()
+                if isinstance(e, SQLAlchemyError):
+                    raise TransactionError("Database error occurred") from e
+                raise
 
+        # Find the session in the arguments
+        session = _find_argument(
+            args, kwargs, lambda arg: isinstance(arg, AsyncSession)
+        )
         if session is None:
             raise ValueError("No database session found in arguments")
 
@@ -1,17 +1,31 @@
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from strawberry.fastapi import GraphQLRouter
 from app.api.graphql import schema
 from app.api.graphql.context import get_context
+from app.api.graphql.router import GraphQLRouter
+from app.api.export import router as export_router
+from app.api.metrics import router as metrics_router
 from app.database import init_db_async
+from app.database.changes import change_feed
+from app.ai.clients import model_registry
+from app.ai.embeddings import embedding_pipeline
+from app.ai.jobs import job_pool
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Initialize database with default data
     await init_db_async()
+    model_registry.start()
+    await job_pool.start()
+    await embedding_pipeline.start()
+    await change_feed.start()
     yield
+    await change_feed.stop()
+    await embedding_pipeline.stop()
+    await job_pool.stop()
+    await model_registry.stop()
 
 
 app = FastAPI(title="LLM World Builder API", lifespan=lifespan)
@@ -32,6 +46,8 @@ graphql_app = GraphQLRouter(
 )
 
 app.include_router(graphql_app, prefix="/graphql")
+app.include_router(export_router, prefix="/export")
+app.include_router(metrics_router)
 
 if __name__ == "__main__":
     import uvicorn
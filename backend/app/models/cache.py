@@ -0,0 +1,18 @@
+from typing import Any
+from datetime import datetime
+from sqlalchemy import String, DateTime, Integer, JSON
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.models.entity import Base
+
+
+class LLMCacheEntry(Base):
+    __tablename__ = "llm_cache"
+
+    key: Mapped[str] = mapped_column(String(64), primary_key=True)
+    value: Mapped[Any] = mapped_column(JSON)
+    size: Mapped[int] = mapped_column(Integer)  # Serialized value size in bytes
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime, default=lambda: datetime.utcnow(), index=True
+    )
+    expires_at: Mapped[datetime] = mapped_column(DateTime, index=True)
@@ -0,0 +1,37 @@
+from datetime import datetime
+import uuid
+from sqlalchemy import (
+    String,
+    DateTime,
+    ForeignKeyConstraint,
+    Integer,
+    LargeBinary,
+)
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.models.entity import Base
+
+
+class EntityEmbedding(Base):
+    __tablename__ = "entity_embeddings"
+    __table_args__ = (
+        ForeignKeyConstraint(
+            ["world_id", "entity_id"],
+            ["entities.world_id", "entities.id"],
+            ondelete="CASCADE",
+        ),
+    )
+
+    entity_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True)
+    world_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True))
+    model: Mapped[str] = mapped_column(String)
+    dimensions: Mapped[int] = mapped_column(Integer)
+    vector: Mapped[bytes] = mapped_column(LargeBinary)  # Little-endian float32
+    # Hash of the embedded text, so unchanged entities are not re-embedded
+    content_hash: Mapped[str] = mapped_column(String(64))
+    # Entity.updated_at when embedded; a newer entity means the vector is stale
+    source_updated_at: Mapped[datetime] = mapped_column(DateTime)
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime, default=lambda: datetime.utcnow(), index=True
+    )
@@ -1,8 +1,21 @@
 from typing import Dict, List, Optional
 from datetime import datetime, timezone
 import uuid
-from sqlalchemy import Column, String, DateTime, ForeignKey, JSON, Table
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy import (
+    Column,
+    String,
+    DateTime,
+    ForeignKey,
+    ForeignKeyConstraint,
+    Index,
+    Integer,
+    JSON,
+    PrimaryKeyConstraint,
+    Table,
+    UniqueConstraint,
+    and_,
+)
+from sqlalchemy.dialects.postgresql import JSONB, UUID
 from sqlalchemy.orm import relationship, Mapped, mapped_column, DeclarativeBase
 from sqlalchemy.ext.asyncio import AsyncAttrs
 
@@ -11,54 +24,136 @@ class Base(AsyncAttrs, DeclarativeBase):
     pass
 
 
+# JSONB on Postgres so documents can be indexed and queried; JSON elsewhere
+JSONDocument = JSON().with_variant(JSONB(), "postgresql")
+
+
+# Entities and their relationships are partitioned by world on Postgres, one
+# LIST partition per world (see app.database.partitions), so a world's queries
+# only ever touch that world's partitions. Keys and foreign keys between them
+# lead with world_id, as partitioned tables require.
+PARTITION_BY_WORLD = "LIST (world_id)"
+
+
+class World(Base):
+    __tablename__ = "worlds"
+
+    id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True), primary_key=True, default=uuid.uuid4
+    )
+    name: Mapped[str] = mapped_column(String, unique=True)
+    # Shown to the model with every generation for this world
+    setting: Mapped[str] = mapped_column(String, default="")
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime, default=lambda: datetime.utcnow()
+    )
+
+    entity_types: Mapped[List["EntityType"]] = relationship(
+        back_populates="world", passive_deletes=True
+    )
+
+
 # Association table for entity relationships
 entity_relationships = Table(
     "entity_relationships",
     Base.metadata,
-    Column(
-        "parent_id", UUID(as_uuid=True), ForeignKey("entities.id", ondelete="CASCADE")
+    Column("world_id", UUID(as_uuid=True), nullable=False),
+    Column("parent_id", UUID(as_uuid=True), index=True),
+    Column("child_id", UUID(as_uuid=True), index=True),
+    ForeignKeyConstraint(
+        ["world_id", "parent_id"],
+        ["entities.world_id", "entities.id"],
+        ondelete="CASCADE",
     ),
-    Column(
-        "child_id", UUID(as_uuid=True), ForeignKey("entities.id", ondelete="CASCADE")
+    ForeignKeyConstraint(
+        ["world_id", "child_id"],
+        ["entities.world_id", "entities.id"],
+        ondelete="CASCADE",
     ),
+    postgresql_partition_by=PARTITION_BY_WORLD,
 )
 
 
 class EntityType(Base):
     __tablename__ = "entity_types"
+    __table_args__ = (
+        UniqueConstraint("world_id", "name"),
+        # Target of the entities (world_id, type_id) foreign key, which keeps
+        # an entity in the same world as its type
+        UniqueConstraint("world_id", "id"),
+    )
 
     id: Mapped[uuid.UUID] = mapped_column(
         UUID(as_uuid=True), primary_key=True, default=uuid.uuid4
     )
-    name: Mapped[str] = mapped_column(String, unique=True)
-    default_fields: Mapped[List[str]] = mapped_column(JSON, default=list)
+    world_id: Mapped[uuid.UUID] = mapped_column(
+        ForeignKey("worlds.id", ondelete="CASCADE")
+    )
+    name: Mapped[str] = mapped_column(String)
+    default_fields: Mapped[List[str]] = mapped_column(JSONDocument, default=list)
+    # Attribute paths that get an expression index for entities of this type
+    indexed_attributes: Mapped[List[str]] = mapped_column(
+        JSONDocument, default=list, server_default="[]"
+    )
 
-    # Relationship
+    # Relationships
+    world: Mapped[World] = relationship(back_populates="entity_types")
     entities: Mapped[List["Entity"]] = relationship(back_populates="type_def")
 
 
 class Entity(Base):
     __tablename__ = "entities"
+    __table_args__ = (
+        PrimaryKeyConstraint("world_id", "id"),
+        ForeignKeyConstraint(
+            ["world_id", "type_id"], ["entity_types.world_id", "entity_types.id"]
+        ),
+        # Keyset pagination over (created_at, id), within a world or a type
+        Index("ix_entities_world_id_created_at_id", "world_id", "created_at", "id"),
+        Index("ix_entities_type_id_created_at_id", "type_id", "created_at", "id"),
+        # Containment (@>) filters on attributes
+        Index(
+            "ix_entities_attributes",
+            "attributes",
+            postgresql_using="gin",
+            postgresql_ops={"attributes": "jsonb_path_ops"},
+        ).ddl_if(dialect="postgresql"),
+        {"postgresql_partition_by": PARTITION_BY_WORLD},
+    )
 
-    id: Mapped[uuid.UUID] = mapped_column(
-        UUID(as_uuid=True), primary_key=True, default=uuid.uuid4
+    id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), default=uuid.uuid4)
+    world_id: Mapped[uuid.UUID] = mapped_column(
+        ForeignKey("worlds.id", ondelete="CASCADE")
     )
-    type_id: Mapped[uuid.UUID] = mapped_column(ForeignKey("entity_types.id"))
+    type_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True))
     name: Mapped[str] = mapped_column(String)
     description: Mapped[Optional[str]] = mapped_column(String, nullable=True)
-    attributes: Mapped[Dict] = mapped_column(JSON, default=dict)
+    attributes: Mapped[Dict] = mapped_column(JSONDocument, default=dict)
     created_at: Mapped[datetime] = mapped_column(
         DateTime, default=lambda: datetime.utcnow()
     )
     updated_at: Mapped[datetime] = mapped_column(
         DateTime, default=lambda: datetime.utcnow(), onupdate=lambda: datetime.utcnow()
     )
+    # Bumped by every write, for compare-and-swap updates; revision version - 1
+    # of the entity's history holds this version
+    version: Mapped[int] = mapped_column(Integer, default=1, server_default="1")
+
+    # IDs are unique on their own; world_id is only in the table's key for
+    # partitioning. Bulk writes, the only ones taking client IDs, check it.
+    __mapper_args__ = {"primary_key": [id]}
 
     # Relationships
     type_def: Mapped[EntityType] = relationship("EntityType", back_populates="entities")
     children: Mapped[List["Entity"]] = relationship(
         secondary=entity_relationships,
-        primaryjoin=id == entity_relationships.c.parent_id,
-        secondaryjoin=id == entity_relationships.c.child_id,
+        primaryjoin=and_(
+            id == entity_relationships.c.parent_id,
+            world_id == entity_relationships.c.world_id,
+        ),
+        secondaryjoin=and_(
+            id == entity_relationships.c.child_id,
+            world_id == entity_relationships.c.world_id,
+        ),
         backref="parents",
     )
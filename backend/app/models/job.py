@@ -0,0 +1,60 @@
+from typing import Optional
+from datetime import datetime
+import enum
+import uuid
+from sqlalchemy import (
+    String,
+    DateTime,
+    Enum,
+    ForeignKeyConstraint,
+    Integer,
+    Boolean,
+)
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.models.entity import Base
+
+
+class JobStatus(str, enum.Enum):
+    PENDING = "pending"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+
+class GenerationJob(Base):
+    __tablename__ = "generation_jobs"
+    __table_args__ = (
+        ForeignKeyConstraint(
+            ["world_id", "entity_id"],
+            ["entities.world_id", "entities.id"],
+            ondelete="CASCADE",
+        ),
+    )
+
+    id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True), primary_key=True, default=uuid.uuid4
+    )
+    # Jobs enqueued by the same generateEntities call
+    batch_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), index=True)
+    world_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), index=True)
+    entity_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True))
+    provider: Mapped[str] = mapped_column(String)
+    status: Mapped[JobStatus] = mapped_column(
+        Enum(JobStatus, native_enum=False), default=JobStatus.PENDING, index=True
+    )
+    fresh: Mapped[bool] = mapped_column(Boolean, default=False)
+    attempts: Mapped[int] = mapped_column(Integer, default=0)
+    error: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime, default=lambda: datetime.utcnow()
+    )
+    started_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    finished_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    # While running: when the job is given up on unless its worker renews it
+    lease_expires_at: Mapped[Optional[datetime]] = mapped_column(
+        DateTime, nullable=True
+    )
+    # While pending: not to be claimed before this (retry backoff)
+    run_after: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
@@ -0,0 +1,43 @@
+from datetime import datetime
+from typing import Any
+import uuid
+from sqlalchemy import (
+    Boolean,
+    DateTime,
+    ForeignKeyConstraint,
+    Integer,
+    PrimaryKeyConstraint,
+    String,
+)
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.models.entity import Base, JSONDocument
+
+
+class EntityRevision(Base):
+    """
+    One version of an entity's content (name, description and attributes).
+    Revisions are only ever appended; see app.database.revisions.
+    """
+
+    __tablename__ = "entity_revisions"
+    __table_args__ = (
+        PrimaryKeyConstraint("world_id", "entity_id", "revision"),
+        ForeignKeyConstraint(
+            ["world_id", "entity_id"],
+            ["entities.world_id", "entities.id"],
+            ondelete="CASCADE",
+        ),
+    )
+
+    world_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True))
+    entity_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True))
+    revision: Mapped[int] = mapped_column(Integer)  # 0, 1, 2, ... per entity
+    # The full document when true, else a JSON patch from the previous revision
+    snapshot: Mapped[bool] = mapped_column(Boolean)
+    data: Mapped[Any] = mapped_column(JSONDocument)
+    source: Mapped[str] = mapped_column(String)  # create, update, patch, ...
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime, default=lambda: datetime.utcnow()
+    )
@@ -1,8 +1,13 @@
 from typing import List, Optional, Dict, Any
 from datetime import datetime
+import enum
 import uuid
 import strawberry
-from app.models.entity import Entity, EntityType
+from strawberry.types import Info
+from sqlalchemy import inspect
+from app.models.entity import Entity, EntityType, World
+from app.schemas.pagination import PageInfo
+from app.schemas.selection import selected_entity_columns
 
 
 @strawberry.type
@@ -11,55 +16,194 @@ class GenerationTemplate:
     systemPrompt: str
 
 
+@strawberry.type
+class WorldGQL:
+    id: str  # UUID as string
+    name: str
+    setting: str
+    createdAt: datetime
+
+    @classmethod
+    def from_db(cls, db_world: World) -> "WorldGQL":
+        return cls(
+            id=str(db_world.id),
+            name=db_world.name,
+            setting=db_world.setting,
+            createdAt=db_world.created_at,
+        )
+
+
 @strawberry.type
 class EntityTypeGQL:
     id: str  # UUID as string
+    worldId: str  # UUID as string
     name: str
     defaultFields: List[str]
+    indexedAttributes: List[str]
 
     @classmethod
     def from_db(cls, db_type: EntityType) -> "EntityTypeGQL":
         return cls(
-            id=str(db_type.id), name=db_type.name, defaultFields=db_type.default_fields
+            id=str(db_type.id),
+            worldId=str(db_type.world_id),
+            name=db_type.name,
+            defaultFields=db_type.default_fields,
+            indexedAttributes=db_type.indexed_attributes or [],
         )
 
 
 @strawberry.type
 class EntityGQL:
     id: str  # UUID as string
+    worldId: str  # UUID as string
     name: str
     description: Optional[str]
     attributes: strawberry.scalars.JSON
-    typeDef: EntityTypeGQL
     createdAt: datetime
     updatedAt: datetime
-    children: List["EntityGQL"]
-    parents: List["EntityGQL"]
+    version: int  # Pass as expectedVersion to only write over this version
+
+    db_id: strawberry.Private[uuid.UUID]
+    world_id: strawberry.Private[uuid.UUID]
+    type_id: strawberry.Private[uuid.UUID]
+
+    @strawberry.field
+    async def typeDef(self, info: Info) -> EntityTypeGQL:
+        entity_type = await info.context.loaders.entity_type.load(
+            (self.world_id, self.type_id)
+        )
+        return EntityTypeGQL.from_db(entity_type)
+
+    @strawberry.field
+    async def children(self, info: Info) -> List["EntityGQL"]:
+        children = await info.context.loaders.children.load(
+            (self.world_id, self.db_id, selected_entity_columns(info))
+        )
+        return [EntityGQL.from_db(child) for child in children]
+
+    @strawberry.field
+    async def parents(self, info: Info) -> List["EntityGQL"]:
+        parents = await info.context.loaders.parents.load(
+            (self.world_id, self.db_id, selected_entity_columns(info))
+        )
+        return [EntityGQL.from_db(parent) for parent in parents]
 
     @classmethod
-    async def from_db(cls, db_entity: Entity) -> "EntityGQL":
+    def from_db(cls, db_entity: Entity) -> "EntityGQL":
+        # Only read columns that were loaded; the rest were not selected and
+        # touching them would trigger a lazy load.
+        loaded = inspect(db_entity).dict
         return cls(
             id=str(db_entity.id),
-            name=db_entity.name,
-            description=db_entity.description,
-            attributes=db_entity.attributes,
-            typeDef=EntityTypeGQL.from_db(await db_entity.awaitable_attrs.type_def),
-            createdAt=db_entity.created_at,
-            updatedAt=db_entity.updated_at,
-            children=[
-                cls.from_db(child) for child in await db_entity.awaitable_attrs.children
-            ],
-            parents=[
-                cls.from_db(parent)
-                for parent in await db_entity.awaitable_attrs.parents
-            ],
+            worldId=str(db_entity.world_id),
+            name=loaded.get("name"),
+            description=loaded.get("description"),
+            attributes=loaded.get("attributes"),
+            createdAt=loaded.get("created_at"),
+            updatedAt=loaded.get("updated_at"),
+            version=loaded.get("version"),
+            db_id=db_entity.id,
+            world_id=db_entity.world_id,
+            type_id=db_entity.type_id,
         )
 
 
+@strawberry.type
+class EntityEdge:
+    cursor: str
+    node: EntityGQL
+
+
+@strawberry.type
+class EntityConnection:
+    edges: List[EntityEdge]
+    pageInfo: PageInfo
+
+
+@strawberry.type
+class EntityRelationshipGQL:
+    parentId: str  # UUID as string
+    childId: str  # UUID as string
+
+
+@strawberry.type
+class EntityGraphGQL:
+    """Adjacency list of an entity hierarchy; each node appears once"""
+
+    nodes: List[EntityGQL]
+    relationships: List[EntityRelationshipGQL]
+
+
+@strawberry.type
+class EntitySearchResult:
+    entity: EntityGQL
+    rank: float  # Higher is a better match
+
+
+@strawberry.type
+class SimilarEntity:
+    entity: EntityGQL
+    score: float  # Cosine similarity, 1 is identical
+
+
+@strawberry.type
+class NearDuplicate:
+    entity: EntityGQL
+    duplicate: EntityGQL
+    score: float  # Cosine similarity, 1 is identical
+
+
+@strawberry.type
+class EntityGenerationEvent:
+    entityId: str  # UUID as string
+    delta: strawberry.scalars.JSON  # Generated fields that changed since the last event
+    done: bool
+    entity: Optional[EntityGQL] = None  # Saved entity, set on the final event
+
+
+@strawberry.type
+class EntityChangeGQL:
+    entityId: str  # UUID as string
+    typeId: str  # UUID as string
+    version: int  # The entity's version after the change
+    source: str  # As in entityHistory: "create", "update", "generate", ...
+
+    @classmethod
+    def from_change(cls, change: Any) -> "EntityChangeGQL":
+        return cls(
+            entityId=str(change.entity_id),
+            typeId=str(change.type_id),
+            version=change.version,
+            source=change.source,
+        )
+
+
+@strawberry.type
+class EntityChangeEvent:
+    # Latest change per entity since the last event
+    changes: List[EntityChangeGQL]
+    # Changes were dropped (the subscriber fell behind, or the feed
+    # reconnected); refetch anything on display
+    resync: bool
+
+
+@strawberry.input
+class WorldInput:
+    name: str
+    setting: str = ""
+
+
+@strawberry.input
+class WorldUpdateInput:
+    name: Optional[str] = None
+    setting: Optional[str] = None
+
+
 @strawberry.input
 class EntityTypeInput:
     name: str
     defaultFields: List[str]
+    indexedAttributes: Optional[List[str]] = None  # Attribute paths to index
 
 
 @strawberry.input
@@ -68,6 +212,26 @@ class EntityTypeUpdateInput:
     defaultFields: Optional[List[str]] = None
 
 
+@strawberry.input
+class AttributeFilter:
+    path: str  # Dot-separated attribute keys, e.g. "stats.strength"
+    eq: Optional[strawberry.scalars.JSON] = None  # null matches missing keys too
+
+
+@strawberry.enum
+class AttributeOperationKind(enum.Enum):
+    SET = "set"  # Set key to value
+    DELETE = "delete"  # Remove key, if present
+    APPEND = "append"  # Append value to the array at key, or start one
+
+
+@strawberry.input
+class AttributeOperation:
+    op: AttributeOperationKind
+    key: str  # Top-level attribute key
+    value: Optional[strawberry.scalars.JSON] = None
+
+
 @strawberry.input
 class EntityInput:
     name: str
@@ -83,3 +247,33 @@ class EntityUpdateInput:
     description: Optional[str] = None
     attributes: Optional[strawberry.scalars.JSON] = None
     parentIds: Optional[List[str]] = None  # UUIDs as strings
+
+
+@strawberry.input
+class EntityBulkInput:
+    id: Optional[str] = None  # UUID as string, generated if not provided
+    name: str
+    typeId: str  # UUID as string
+    description: Optional[str] = None
+    attributes: Optional[strawberry.scalars.JSON] = None
+    parentIds: Optional[List[str]] = None  # UUIDs as strings
+
+    def to_row(self) -> Dict[str, Any]:
+        return {
+            "id": uuid.UUID(self.id) if self.id else None,
+            "type_id": uuid.UUID(self.typeId),
+            "name": self.name,
+            "description": self.description,
+            "attributes": self.attributes,
+            "parent_ids": (
+                [uuid.UUID(id) for id in self.parentIds]
+                if self.parentIds is not None
+                else None
+            ),
+        }
+
+
+@strawberry.type
+class BulkEntityResult:
+    count: int
+    ids: List[str]  # UUIDs as strings
@@ -0,0 +1,31 @@
+from typing import Optional
+from datetime import datetime
+import strawberry
+from app.models.job import GenerationJob
+
+
+@strawberry.type
+class GenerationJobGQL:
+    id: str  # UUID as string
+    batchId: str  # UUID as string
+    entityId: str  # UUID as string
+    status: str
+    attempts: int
+    error: Optional[str]
+    createdAt: datetime
+    startedAt: Optional[datetime]
+    finishedAt: Optional[datetime]
+
+    @classmethod
+    def from_db(cls, db_job: GenerationJob) -> "GenerationJobGQL":
+        return cls(
+            id=str(db_job.id),
+            batchId=str(db_job.batch_id),
+            entityId=str(db_job.entity_id),
+            status=db_job.status.value,
+            attempts=db_job.attempts,
+            error=db_job.error,
+            createdAt=db_job.created_at,
+            startedAt=db_job.started_at,
+            finishedAt=db_job.finished_at,
+        )
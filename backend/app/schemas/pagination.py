@@ -0,0 +1,36 @@
+import base64
+from datetime import datetime
+from typing import Optional, Tuple
+import uuid
+import strawberry
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+
+@strawberry.type
+class PageInfo:
+    hasNextPage: bool
+    endCursor: Optional[str]
+
+
+def encode_cursor(created_at: datetime, id: uuid.UUID) -> str:
+    """Opaque cursor for the (created_at, id) keyset"""
+    raw = f"{created_at.isoformat()}|{id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, uuid.UUID]:
+    try:
+        created_at, id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), uuid.UUID(id)
+    except ValueError as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+def clamp_page_size(first: Optional[int]) -> int:
+    if first is None:
+        return DEFAULT_PAGE_SIZE
+    if first < 0:
+        raise ValueError("first must not be negative")
+    return min(first, MAX_PAGE_SIZE)
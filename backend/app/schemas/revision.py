@@ -0,0 +1,31 @@
+from typing import Any, Dict, Optional
+from datetime import datetime
+import strawberry
+from app.models.revision import EntityRevision
+
+
+@strawberry.type
+class EntityRevisionGQL:
+    revision: int
+    source: str  # create, update, patch, generate, bulk, revert or initial
+    createdAt: datetime
+    # The entity as of this revision
+    name: str
+    description: Optional[str]
+    attributes: strawberry.scalars.JSON
+    # JSON patch from the previous revision; null where a snapshot is stored
+    changes: Optional[strawberry.scalars.JSON]
+
+    @classmethod
+    def from_db(
+        cls, db_revision: EntityRevision, document: Dict[str, Any]
+    ) -> "EntityRevisionGQL":
+        return cls(
+            revision=db_revision.revision,
+            source=db_revision.source,
+            createdAt=db_revision.created_at,
+            name=document["name"],
+            description=document["description"],
+            attributes=document["attributes"],
+            changes=None if db_revision.snapshot else db_revision.data,
+        )
@@ -0,0 +1,63 @@
+from typing import Iterable, List, Sequence, Set, Tuple
+from strawberry.types import Info
+from strawberry.types.nodes import FragmentSpread, InlineFragment, SelectedField
+from sqlalchemy.orm import load_only
+
+from app.models.entity import Entity
+
+# EntityGQL fields backed by a column on the entities table
+ENTITY_FIELD_COLUMNS = {
+    "id": "id",
+    "worldId": "world_id",
+    "name": "name",
+    "description": "description",
+    "attributes": "attributes",
+    "createdAt": "created_at",
+    "updatedAt": "updated_at",
+    "version": "version",
+}
+
+# Columns needed to resolve EntityGQL no matter what was selected
+ENTITY_KEY_COLUMNS = ("id", "world_id", "type_id")
+
+
+def _collect_fields(selections: Iterable) -> List[SelectedField]:
+    fields: List[SelectedField] = []
+    for selection in selections:
+        if isinstance(selection, SelectedField):
+            fields.append(selection)
+        elif isinstance(selection, (FragmentSpread, InlineFragment)):
+            fields.extend(_collect_fields(selection.selections))
+    return fields
+
+
+def selected_field_names(info: Info, path: Sequence[str] = ()) -> Set[str]:
+    """
+    Names of the fields requested under the field currently being resolved,
+    or under the nested field reached by following ``path`` from it.
+    """
+    fields = list(info.selected_fields)
+    for name in path:
+        fields = [
+            child
+            for field in fields
+            for child in _collect_fields(field.selections)
+            if child.name == name
+        ]
+    return {
+        child.name for field in fields for child in _collect_fields(field.selections)
+    }
+
+
+def selected_entity_columns(info: Info, path: Sequence[str] = ()) -> Tuple[str, ...]:
+    """Entity column names needed to resolve the current EntityGQL selection"""
+    columns = set(ENTITY_KEY_COLUMNS)
+    for name in selected_field_names(info, path):
+        if name in ENTITY_FIELD_COLUMNS:
+            columns.add(ENTITY_FIELD_COLUMNS[name])
+    return tuple(sorted(columns))
+
+
+def entity_load_options(columns: Iterable[str]):
+    """Restrict an Entity query to the given columns"""
+    return load_only(*(getattr(Entity, column) for column in columns))
@@ -0,0 +1,7 @@
+import os
+
+# Read when app.config is first imported: keep test runs from trying to send
+# traces to Logfire, and give app.database an async driver (nothing here
+# connects to it)
+os.environ.setdefault("LOGFIRE_SEND_TO_LOGFIRE", "false")
+os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite://")
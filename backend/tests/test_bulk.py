@@ -0,0 +1,62 @@
+import asyncio
+from contextlib import asynccontextmanager
+import uuid
+import pytest
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+import app.models.revision  # noqa: F401 - registers entity_revisions
+from app.database.bulk import bulk_write_entities
+from app.models.entity import Base, EntityType, World
+
+
+@asynccontextmanager
+async def _session():
+    engine = create_async_engine("sqlite+aiosqlite://")
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+    try:
+        async with async_sessionmaker(engine, expire_on_commit=False)() as db:
+            yield db
+    finally:
+        await engine.dispose()
+
+
+async def _world(db, name: str):
+    world = World(name=name, setting="A drowned world")
+    db.add(world)
+    await db.flush()
+    entity_type = EntityType(world_id=world.id, name="character")
+    db.add(entity_type)
+    await db.flush()
+    return world.id, entity_type.id
+
+
+def _row(id: uuid.UUID, type_id: uuid.UUID, name: str = "a"):
+    return {"id": id, "type_id": type_id, "name": name}
+
+
+def test_duplicate_ids_in_one_input_are_rejected():
+    async def run():
+        async with _session() as db:
+            world_id, type_id = await _world(db, "w")
+            id = uuid.uuid4()
+            rows = [_row(id, type_id, name) for name in "ab"]
+            with pytest.raises(ValueError, match=f"more than once: {id}"):
+                await bulk_write_entities(db, world_id, rows, upsert=True)
+
+    asyncio.run(run())
+
+
+def test_ids_of_another_world_are_rejected():
+    async def run():
+        async with _session() as db:
+            world_a, type_a = await _world(db, "a")
+            world_b, type_b = await _world(db, "b")
+            id = uuid.uuid4()
+            await bulk_write_entities(db, world_a, [_row(id, type_a)])
+            # Writing it again in its own world is an update
+            await bulk_write_entities(db, world_a, [_row(id, type_a)], upsert=True)
+            with pytest.raises(ValueError, match=f"another world: {id}"):
+                await bulk_write_entities(db, world_b, [_row(id, type_b)], upsert=True)
+
+    asyncio.run(run())
@@ -0,0 +1,94 @@
+import asyncio
+from datetime import timedelta
+import time
+from typing import Dict, Optional, Tuple
+import pytest
+
+from app.database.cache import SharedTier, VersionedCache
+
+
+class FakeRedis:
+    """The part of the redis client SharedTier uses, with key expiry"""
+
+    def __init__(self):
+        self._values: Dict[str, Tuple[float, bytes]] = {}
+
+    async def get(self, key: str) -> Optional[bytes]:
+        expires_at, value = self._values.get(key, (0, None))
+        return value if expires_at > time.monotonic() else None
+
+    async def set(self, key: str, value: str, ex: float) -> None:
+        self._values[key] = (time.monotonic() + ex, value.encode())
+
+    def pipeline(self, transaction: bool = True) -> "FakePipeline":
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, client: FakeRedis):
+        self._client = client
+        self._commands = []
+
+    async def __aenter__(self) -> "FakePipeline":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        pass
+
+    def set(self, key: str, value: str, ex: float) -> None:
+        self._commands.append((key, value, ex))
+
+    async def execute(self) -> None:
+        for command in self._commands:
+            await self._client.set(*command)
+
+
+class FakeSharedTier(SharedTier):
+    def __init__(self, ttl: timedelta):
+        self._client = FakeRedis()
+        self.ttl = ttl
+
+
+@pytest.fixture(params=["memory", "shared"])
+def cache(request) -> VersionedCache:
+    if request.param == "memory":
+        return VersionedCache(100, timedelta(seconds=0.2))
+    # Redis expiries are whole seconds
+    ttl = timedelta(seconds=1)
+    return VersionedCache(100, ttl, FakeSharedTier(ttl))
+
+
+def test_invalidation_after_a_version_would_have_expired(cache):
+    ttl = cache.ttl.total_seconds()
+    stored = {"value": "old"}
+
+    async def load():
+        return stored["value"]
+
+    async def scenario():
+        await cache.invalidate("entity")
+        await asyncio.sleep(0.75 * ttl)
+        assert await cache.get_or_load("entity", "row", load) == "old"
+        # The bump is now over a TTL old, the cached read is not
+        await asyncio.sleep(0.5 * ttl)
+        stored["value"] = "new"
+        await cache.invalidate("entity")
+        return await cache.get_or_load("entity", "row", load)
+
+    assert asyncio.run(scenario()) == "new"
+
+
+def test_invalidation_is_seen_by_the_next_read(cache):
+    stored = {"value": "old"}
+
+    async def load():
+        return stored["value"]
+
+    async def scenario():
+        assert await cache.get_or_load("entity", "row", load) == "old"
+        stored["value"] = "new"
+        assert await cache.get_or_load("entity", "row", load) == "old"
+        await cache.invalidate("entity")
+        return await cache.get_or_load("entity", "row", load)
+
+    assert asyncio.run(scenario()) == "new"
@@ -0,0 +1,213 @@
+import asyncio
+import json
+import time
+from typing import Awaitable, Callable, List, Tuple
+import httpx
+import pytest
+from pydantic_ai.messages import ModelRequest, ModelResponse, UserPromptPart
+from pydantic_ai.models import ModelRequestParameters
+
+from app.ai.clients import ManagedModel, ModelRegistry, ModelUnavailable
+from app.config import settings
+
+
+def completion(model: str, content: str = "ok", total_tokens: int = 10):
+    """An OpenAI chat completion response"""
+    return httpx.Response(
+        200,
+        json={
+            "id": "chatcmpl-test",
+            "object": "chat.completion",
+            "created": 0,
+            "model": model,
+            "choices": [
+                {
+                    "index": 0,
+                    "finish_reason": "stop",
+                    "message": {"role": "assistant", "content": content},
+                }
+            ],
+            "usage": {
+                "prompt_tokens": total_tokens // 2,
+                "completion_tokens": total_tokens - total_tokens // 2,
+                "total_tokens": total_tokens,
+            },
+        },
+    )
+
+
+def error(status_code: int, **headers: str) -> httpx.Response:
+    return httpx.Response(
+        status_code, headers=headers, json={"error": {"message": "Try again"}}
+    )
+
+
+class FakeOpenAI:
+    """
+    OpenAI-compatible chat completions endpoint, answering with ``respond``
+    for the model named in each request. Requests are recorded as (arrival
+    time, model).
+    """
+
+    def __init__(self):
+        self.requests: List[Tuple[float, str]] = []
+        self.respond: Callable[[str], Awaitable[httpx.Response]] = self._complete
+
+    async def _complete(self, model: str) -> httpx.Response:
+        return completion(model)
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        model = json.loads(request.content)["model"]
+        self.requests.append((time.monotonic(), model))
+        return await self.respond(model)
+
+
+@pytest.fixture
+def fake() -> FakeOpenAI:
+    return FakeOpenAI()
+
+
+@pytest.fixture
+def registry(fake, monkeypatch) -> ModelRegistry:
+    monkeypatch.setattr(settings, "USE_LOCAL_MODEL", True)
+    monkeypatch.setattr(settings, "AI_MODEL", "primary")
+    monkeypatch.setattr(settings, "AI_LOCAL_BASE_URL", "http://llm.test/v1")
+    monkeypatch.setattr(settings, "AI_HEDGE_MODEL", "")
+    monkeypatch.setattr(settings, "AI_PROVIDER_RPM", {})
+    monkeypatch.setattr(settings, "AI_PROVIDER_TPM", {})
+    # Keep backoff jitter well below the Retry-After values used here
+    monkeypatch.setattr(settings, "AI_RETRY_BASE_SECONDS", 0.01)
+    return ModelRegistry(transport=httpx.MockTransport(fake.handle))
+
+
+def call(model: ManagedModel) -> Awaitable[Tuple[ModelResponse, object]]:
+    return model.request(
+        [ModelRequest(parts=[UserPromptPart("Hello")])],
+        None,
+        ModelRequestParameters(
+            function_tools=[], allow_text_result=True, result_tools=[]
+        ),
+    )
+
+
+def run(registry: ModelRegistry, calls: Callable[[ManagedModel], Awaitable]):
+    """Run ``calls`` against the registry's model in a fresh event loop"""
+
+    async def main():
+        try:
+            return await calls(registry.model())
+        finally:
+            await registry.stop()
+
+    return asyncio.run(main())
+
+
+def test_rate_limited_call_is_retried_after_retry_after(fake, registry):
+    responses = [error(429, **{"retry-after": "0.3"}), completion("primary")]
+
+    async def respond(model: str) -> httpx.Response:
+        return responses.pop(0)
+
+    fake.respond = respond
+
+    response, _ = run(registry, call)
+
+    assert response.parts[0].content == "ok"
+    (first, _), (second, _) = fake.requests
+    assert second - first >= 0.3
+    assert registry.requests == {("local", "retried"): 1, ("local", "succeeded"): 1}
+
+
+def test_exhausted_retries_raise_model_unavailable(fake, registry, monkeypatch):
+    monkeypatch.setattr(settings, "AI_MAX_ATTEMPTS", 3)
+
+    async def respond(model: str) -> httpx.Response:
+        return error(503)
+
+    fake.respond = respond
+
+    with pytest.raises(ModelUnavailable):
+        run(registry, call)
+
+    assert len(fake.requests) == 3
+    assert registry.requests == {("local", "retried"): 2, ("local", "failed"): 1}
+
+
+def test_client_errors_are_not_retried(fake, registry):
+    async def respond(model: str) -> httpx.Response:
+        return error(400)
+
+    fake.respond = respond
+
+    with pytest.raises(Exception) as raised:
+        run(registry, call)
+
+    assert not isinstance(raised.value, ModelUnavailable)
+    assert len(fake.requests) == 1
+
+
+def test_requests_wait_once_rpm_is_used_up(fake, registry, monkeypatch):
+    monkeypatch.setattr(settings, "AI_PROVIDER_RPM", {"local": 3})
+
+    async def calls(model: ManagedModel) -> None:
+        for _ in range(3):
+            await call(model)
+        # The next request is a minute / 3 away
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(call(model), timeout=0.3)
+
+    run(registry, calls)
+
+    assert len(fake.requests) == 3
+
+
+def test_requests_wait_once_tpm_is_used_up(fake, registry, monkeypatch):
+    monkeypatch.setattr(settings, "AI_PROVIDER_TPM", {"local": 1000})
+    monkeypatch.setattr(settings, "AI_RESPONSE_TOKENS_ESTIMATE", 400)
+
+    async def respond(model: str) -> httpx.Response:
+        return completion(model, total_tokens=400)
+
+    fake.respond = respond
+
+    async def calls(model: ManagedModel) -> None:
+        # About 400 tokens each, leaving too few for a third
+        for _ in range(2):
+            await call(model)
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(call(model), timeout=0.3)
+
+    run(registry, calls)
+
+    assert len(fake.requests) == 2
+
+
+def test_slow_call_is_hedged_after_p95_latency(fake, registry, monkeypatch):
+    monkeypatch.setattr(settings, "AI_HEDGE_MODEL", "local:hedge")
+    monkeypatch.setattr(settings, "AI_HEDGE_MIN_SAMPLES", 5)
+    delays = {"primary": 0.05, "hedge": 0.0}
+
+    async def respond(model: str) -> httpx.Response:
+        await asyncio.sleep(delays[model])
+        return completion(model, content=model)
+
+    fake.respond = respond
+
+    async def calls(model: ManagedModel) -> Tuple[ModelResponse, float]:
+        for _ in range(settings.AI_HEDGE_MIN_SAMPLES):
+            await call(model)
+        delays["primary"] = 5.0
+        started = time.monotonic()
+        response, _ = await call(model)
+        return response, time.monotonic() - started
+
+    response, elapsed = run(registry, calls)
+
+    assert response.parts[0].content == "hedge"
+    assert elapsed < 1
+    (primary_at, primary), (hedge_at, hedge) = fake.requests[-2:]
+    assert (primary, hedge) == ("primary", "hedge")
+    # Not before the primary had taken as long as its usual slowest calls
+    assert hedge_at - primary_at >= 0.05
+    assert registry.requests[("local", "hedged")] == 1
+    assert registry.requests[("local", "hedge_won")] == 1
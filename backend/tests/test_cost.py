@@ -0,0 +1,20 @@
+from app.api.graphql.cost import CostStatistics, _graph_size
+from app.database.graph import MAX_GRAPH_DEPTH
+
+
+def test_graph_size_is_capped_at_the_world_size():
+    statistics = CostStatistics(entities=1_000_000, relationships=2_000_000)
+    assert _graph_size({"maxDepth": 200_000}, statistics) == 1_000_000
+
+
+def test_graph_size_stops_at_the_traversal_depth_cap():
+    # One child per entity: each level adds one node, so the estimate grows
+    # with the depth until the cap, far below the world size
+    statistics = CostStatistics(entities=10**9, relationships=10**9)
+    arguments = {"rootIds": ["a", "b"], "maxDepth": 200_000}
+    assert _graph_size(arguments, statistics) == 2 * (MAX_GRAPH_DEPTH + 1)
+
+
+def test_graph_size_of_a_shallow_traversal():
+    statistics = CostStatistics(entities=1_000, relationships=3_000)
+    assert _graph_size({"maxDepth": 2}, statistics) == 1 + 3 + 9
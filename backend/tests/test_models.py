@@ -0,0 +1,121 @@
+import asyncio
+import json
+import anthropic
+import httpx
+from pydantic_ai.messages import ModelRequest, SystemPromptPart, UserPromptPart
+from pydantic_ai.models import ModelRequestParameters
+
+from app.ai.models import CachingAnthropicModel
+from app.ai.service import record_usage, token_usage
+
+USAGE = {
+    "input_tokens": 12,
+    "output_tokens": 5,
+    "cache_read_input_tokens": 1000,
+    "cache_creation_input_tokens": 200,
+}
+
+
+def message(content: list, usage: dict) -> dict:
+    return {
+        "id": "msg_test",
+        "type": "message",
+        "role": "assistant",
+        "model": "claude-test",
+        "content": content,
+        "stop_reason": "end_turn",
+        "stop_sequence": None,
+        "usage": usage,
+    }
+
+
+def server_sent_events(*events: dict) -> bytes:
+    return "".join(
+        f"event: {event['type']}\ndata: {json.dumps(event)}\n\n" for event in events
+    ).encode()
+
+
+STREAM = server_sent_events(
+    {"type": "message_start", "message": message([], {**USAGE, "output_tokens": 1})},
+    {
+        "type": "content_block_start",
+        "index": 0,
+        "content_block": {"type": "text", "text": ""},
+    },
+    {
+        "type": "content_block_delta",
+        "index": 0,
+        "delta": {"type": "text_delta", "text": "Hello"},
+    },
+    {"type": "content_block_stop", "index": 0},
+    {
+        "type": "message_delta",
+        "delta": {"stop_reason": "end_turn", "stop_sequence": None},
+        "usage": {"output_tokens": 5},
+    },
+    {"type": "message_stop"},
+)
+
+
+async def handle(request: httpx.Request) -> httpx.Response:
+    body = json.loads(request.content)
+    # The system prompt is sent as a cacheable prefix
+    assert body["system"][0]["cache_control"] == {"type": "ephemeral"}
+    if body.get("stream"):
+        return httpx.Response(
+            200, headers={"content-type": "text/event-stream"}, content=STREAM
+        )
+    return httpx.Response(200, json=message([{"type": "text", "text": "Hello"}], USAGE))
+
+
+def model() -> CachingAnthropicModel:
+    client = anthropic.AsyncAnthropic(
+        api_key="test",
+        max_retries=0,
+        http_client=httpx.AsyncClient(transport=httpx.MockTransport(handle)),
+    )
+    return CachingAnthropicModel("claude-test", anthropic_client=client)
+
+
+MESSAGES = [
+    ModelRequest(parts=[SystemPromptPart("You are a writer"), UserPromptPart("Hi")])
+]
+PARAMETERS = ModelRequestParameters(
+    function_tools=[], allow_text_result=True, result_tools=[]
+)
+
+
+def test_request_reports_cache_tokens():
+    response, usage = asyncio.run(model().request(MESSAGES, None, PARAMETERS))
+
+    assert response.parts[0].content == "Hello"
+    assert usage.request_tokens == 12
+    assert usage.details == {
+        "cache_read_input_tokens": 1000,
+        "cache_creation_input_tokens": 200,
+    }
+
+
+def test_stream_reports_cache_tokens():
+    async def stream():
+        async with model().request_stream(MESSAGES, None, PARAMETERS) as streamed:
+            async for _ in streamed:
+                pass
+            return streamed.usage()
+
+    usage = asyncio.run(stream())
+
+    assert usage.request_tokens == 12
+    assert usage.details == {
+        "cache_read_input_tokens": 1000,
+        "cache_creation_input_tokens": 200,
+    }
+
+
+def test_record_usage_counts_cache_reads():
+    _, usage = asyncio.run(model().request(MESSAGES, None, PARAMETERS))
+    before = token_usage["test.cached"]
+
+    record_usage("test", "claude-test", usage)
+
+    assert token_usage["test.cached"] - before == 1000
@@ -1,11 +1,14 @@
 interface Config {
     apiUrl: string;
     graphqlEndpoint: string;
+    worldId: string;
 }
 
 const config: Config = {
     apiUrl: import.meta.env.VITE_API_URL || 'http://localhost:8000',
     graphqlEndpoint: import.meta.env.VITE_GRAPHQL_ENDPOINT || '/graphql',
+    // The world created by the migration that introduced worlds
+    worldId: import.meta.env.VITE_WORLD_ID || '3829d8aa-a63f-401f-9031-e003abd672d6',
 }
 
 export const getGraphqlUrl = () => `${config.apiUrl}${config.graphqlEndpoint}`;
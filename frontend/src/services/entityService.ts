@@ -1,3 +1,4 @@
+import config from "../config";
 import { graphqlRequest } from "../lib/graphql-client";
 import type {
   Entity,
@@ -6,77 +7,104 @@ import type {
   EntityTypeInput,
   EntityUpdateInput,
   GetEntitiesData,
+  GetEntitiesPageData,
   GetEntityTypesData,
 } from "../types/graphql";
 
 export const entityService = {
-  async getEntities() {
-    return graphqlRequest<GetEntitiesData>(`
-      query GetEntities {
-        entities {
-          id
-          name
-          description
-          attributes
-          typeDef {
-            id
-            name
-            defaultFields
+  // Pages through entitiesConnection: a world can hold far more entities
+  // than one page
+  async getEntities(): Promise<GetEntitiesData> {
+    const entities: Entity[] = [];
+    let after: string | null = null;
+    for (;;) {
+      const data: GetEntitiesPageData = await graphqlRequest<GetEntitiesPageData>(
+        `
+        query GetEntities($worldId: String!, $after: String) {
+          entitiesConnection(worldId: $worldId, first: 1000, after: $after) {
+            edges {
+              node {
+                id
+                name
+                description
+                attributes
+                typeDef {
+                  id
+                  name
+                  defaultFields
+                }
+                createdAt
+                updatedAt
+              }
+            }
+            pageInfo {
+              hasNextPage
+              endCursor
+            }
           }
-          createdAt
-          updatedAt
         }
+      `,
+        { worldId: config.worldId, after }
+      );
+      const { edges, pageInfo } = data.entitiesConnection;
+      entities.push(...edges.map((edge) => edge.node));
+      if (!pageInfo.hasNextPage || !pageInfo.endCursor) {
+        return { entities };
       }
-    `);
+      after = pageInfo.endCursor;
+    }
   },
 
   async getEntityTypes() {
-    return graphqlRequest<GetEntityTypesData>(`
-      query GetEntityTypes {
-        entityTypes {
+    return graphqlRequest<GetEntityTypesData>(
+      `
+      query GetEntityTypes($worldId: String!) {
+        entityTypes(worldId: $worldId) {
           id
           name
           defaultFields
         }
       }
-    `);
+    `,
+      { worldId: config.worldId }
+    );
   },
 
-  async createEntityType(input: EntityTypeInput) {
+  async createEntityType(worldId: $worldId, input: EntityTypeInput) {
     return graphqlRequest<{ createEntityType: EntityType }>(
       `
-      mutation CreateEntityType($input: EntityTypeInput!) {
-        createEntityType(input: $input) {
+      mutation CreateEntityType($worldId: String!, $input: EntityTypeInput!) {
+        createEntityType(worldId: $worldId, input: $input) {
           id
           name
           defaultFields
         }
       }
     `,
-      { input }
+      { worldId: config.worldId, input }
     );
   },
 
-  async updateEntityType(id: string, input: Partial<EntityTypeInput>) {
+  async updateEntityType(worldId: $worldId, id: string, input: Partial<EntityTypeInput>) {
     return graphqlRequest<{ updateEntityType: EntityType }>(
       `
-      mutation UpdateEntityType($id: String!, $input: EntityTypeUpdateInput!) {
-        updateEntityType(id: $id, input: $input) {
+      mutation UpdateEntityType($worldId: String!, $id: String!, $input: EntityTypeUpdateInput!) {
+        updateEntityType(worldId: $worldId, id: $id, input: $input) {
           id
           name
           defaultFields
         }
       }
     `,
-      { id, input }
+      { worldId: config.worldId, id, input }
     );
   },
 
-  async createEntity(input: EntityInput) {
+  async createEntity(worldId: $worldId, input: EntityInput) {
     return graphqlRequest<{ createEntity: Entity }>(
       `
-      mutation CreateEntity($input: EntityInput!) {
-        createEntity(input: $input) {
+      mutation CreateEntity($worldId: String!, $input: EntityInput!) {
+        createEntity(worldId: $worldId, input: $input) {
           id
           name
           description
@@ -89,15 +117,15 @@ export const entityService = {
         }
       }
     `,
-      { input }
+      { worldId: config.worldId, input }
     );
   },
 
-  async updateEntity(id: string, input: EntityUpdateInput) {
+  async updateEntity(worldId: $worldId, id: string, input: EntityUpdateInput) {
     return graphqlRequest<{ updateEntity: Entity }>(
       `
-      mutation UpdateEntity($id: String!, $input: EntityUpdateInput!) {
-        updateEntity(id: $id, input: $input) {
+      mutation UpdateEntity($worldId: String!, $id: String!, $input: EntityUpdateInput!) {
+        updateEntity(worldId: $worldId, id: $id, input: $input) {
           id
           name
           description
@@ -110,21 +138,21 @@ export const entityService = {
         }
       }
     `,
-      { id, input }
+      { worldId: config.worldId, id, input }
     );
   },
 
   async generateDetails(id: string) {
     return graphqlRequest<{ generateAndUpdateEntity: Entity }>(
       `
-      mutation GenerateDetails($id: String!) {
-        generateAndUpdateEntity(entityId: $id) {
+      mutation GenerateDetails($worldId: String!, $id: String!) {
+        generateAndUpdateEntity(worldId: $worldId, entityId: $id) {
           id
           attributes
         }
       }
     `,
-      { id }
+      { worldId: config.worldId, id }
     );
   },
 };
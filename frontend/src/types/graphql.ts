@@ -38,6 +38,18 @@ export interface GetEntitiesData {
   entities: Entity[];
 }
 
+export interface PageInfo {
+  hasNextPage: boolean;
+  endCursor: string | null;
+}
+
+export interface GetEntitiesPageData {
+  entitiesConnection: {
+    edges: { node: Entity }[];
+    pageInfo: PageInfo;
+  };
+}
+
 export interface GetEntityTypesData {
   entityTypes: EntityType[];
 }